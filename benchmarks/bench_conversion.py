@@ -0,0 +1,150 @@
+"""
+Benchmarks de convertir_word_vers_html_complet sur des documents synthétiques.
+
+Usage :
+    python -m benchmarks.bench_conversion --serie rapide -o resultats.json
+    python -m benchmarks.bench_conversion --serie echelle --comparer reference.json
+    python -m benchmarks.bench_conversion --paragraphes 5000 --images 50
+
+Les résultats (médiane du temps total et de chaque étape) sont écrits en JSON avec
+le commit courant, pour être comparés d'un commit à l'autre avec --comparer.
+"""
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from conversion_word import convertir_word_vers_html_complet
+from benchmarks.document_synthetique import ajouter_arguments, generer_document, parametres_depuis_arguments
+
+# Séries de scénarios : chaque scénario fait varier un paramètre de taille
+SERIES = {
+    'rapide': [
+        {'nom': 'texte_500', 'paragraphes': 500},
+        {'nom': 'images_20', 'paragraphes': 500, 'images': 20},
+        {'nom': 'tableaux_5x50', 'paragraphes': 500, 'tableaux': 5, 'lignes_tableau': 50},
+    ],
+    'echelle': [
+        {'nom': 'texte_500', 'paragraphes': 500},
+        {'nom': 'texte_2000', 'paragraphes': 2000},
+        {'nom': 'texte_8000', 'paragraphes': 8000},
+        {'nom': 'tirets_0', 'paragraphes': 2000, 'densite_tirets': 0.0},
+        {'nom': 'tirets_30', 'paragraphes': 2000, 'densite_tirets': 0.3},
+        {'nom': 'images_50', 'paragraphes': 2000, 'images': 50},
+        {'nom': 'images_200_grandes', 'paragraphes': 2000, 'images': 200, 'taille_image': 600},
+        {'nom': 'tableau_1000_lignes', 'paragraphes': 500, 'tableaux': 1, 'lignes_tableau': 1000, 'colonnes_tableau': 8},
+        {'nom': 'tableaux_50x20', 'paragraphes': 2000, 'tableaux': 50, 'lignes_tableau': 20},
+        {'nom': 'toc_profondeur_3', 'paragraphes': 2000, 'profondeur_toc': 3},
+    ],
+}
+
+def commit_courant():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def mesurer_scenario(scenario, repetitions=3, mesurer_memoire=False):
+    """Génère le document du scénario et mesure sa conversion"""
+    parametres = {cle: valeur for cle, valeur in scenario.items() if cle != 'nom'}
+    donnees = generer_document(**parametres)
+
+    totaux = []
+    durees_etapes = {}
+    memoire_etapes = {}
+    stats = None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        html, stats = convertir_word_vers_html_complet(donnees, 'benchmark.docx', mesurer_memoire=mesurer_memoire)
+        totaux.append(time.perf_counter() - debut)
+        if not html:
+            raise RuntimeError(f"Échec de la conversion du scénario {scenario['nom']}")
+
+        for mesure in stats['etapes']:
+            durees_etapes.setdefault(mesure['etape'], []).append(mesure['duree'])
+            if mesure['memoire_pic'] is not None:
+                memoire_etapes.setdefault(mesure['etape'], []).append(mesure['memoire_pic'])
+
+    return {
+        'nom': scenario['nom'],
+        'parametres': parametres,
+        'taille_docx': len(donnees),
+        'taille_html': len(html),
+        'total': statistics.median(totaux),
+        'etapes': {etape: statistics.median(durees) for etape, durees in durees_etapes.items()},
+        'memoire_pic': {etape: max(pics) for etape, pics in memoire_etapes.items()},
+        'nb_paragraphes': stats['nb_paragraphes'],
+        'nb_images': stats['nb_images'],
+    }
+
+def executer(scenarios, repetitions=3, mesurer_memoire=False):
+    resultats = []
+    for scenario in scenarios:
+        resultat = mesurer_scenario(scenario, repetitions, mesurer_memoire)
+        print(f"{resultat['nom']:<24} {resultat['total'] * 1000:>10.1f} ms  "
+              f"({resultat['taille_docx'] / 1024:.0f} Ko docx, {resultat['nb_paragraphes']} paragraphes)")
+        resultats.append(resultat)
+
+    return {
+        'commit': commit_courant(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'repetitions': repetitions,
+        'resultats': resultats,
+    }
+
+def comparer(reference, courant):
+    """Affiche le rapport de temps (courant / référence) de chaque scénario et de chaque étape"""
+    resultats_reference = {resultat['nom']: resultat for resultat in reference['resultats']}
+    print(f"\nComparaison avec {reference.get('commit') or 'la référence'} (rapport courant / référence)")
+
+    for resultat in courant['resultats']:
+        ancien = resultats_reference.get(resultat['nom'])
+        if not ancien:
+            continue
+        print(f"{resultat['nom']:<24} total {resultat['total'] / ancien['total']:.2f}x")
+        for etape, duree in resultat['etapes'].items():
+            if ancien['etapes'].get(etape):
+                print(f"    {etape:<22} {ancien['etapes'][etape] * 1000:>9.1f} ms -> "
+                      f"{duree * 1000:>9.1f} ms  {duree / ancien['etapes'][etape]:.2f}x")
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de la conversion Word vers HTML")
+    parser.add_argument('--serie', choices=sorted(SERIES), help="Série de scénarios prédéfinis")
+    parser.add_argument('-n', '--repetitions', type=int, default=3)
+    parser.add_argument('--mesurer-memoire', action='store_true', help="Mesurer le pic mémoire de chaque étape")
+    parser.add_argument('-o', '--sortie', help="Fichier JSON des résultats")
+    parser.add_argument('--comparer', metavar='REFERENCE.json', help="Résultats d'un autre commit à comparer")
+    ajouter_arguments(parser)
+    args = parser.parse_args(arguments)
+
+    # Les messages de conversion ne font pas partie des mesures
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.serie:
+        scenarios = SERIES[args.serie]
+    else:
+        scenarios = [dict(nom='personnalise', **parametres_depuis_arguments(args))]
+
+    courant = executer(scenarios, args.repetitions, args.mesurer_memoire)
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump(courant, fichier, indent=2, ensure_ascii=False)
+
+    if args.comparer:
+        with open(args.comparer, 'r', encoding='utf-8') as fichier:
+            comparer(json.load(fichier), courant)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Vérifie que le parseur HTML par défaut (lxml) produit exactement le même HTML que html.parser.
+
+Usage :
+    python -m benchmarks.conformite_parseurs                  # documents .docx du dépôt et documents synthétiques
+    python -m benchmarks.conformite_parseurs document.docx ...
+
+Le code de sortie vaut 1 si un document donne un résultat différent.
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+
+from conversion_word import PARSEURS_HTML, PARSEUR_HTML_DEFAUT, appliquer_classes_personnalisees, convertir_word_vers_html_complet
+from benchmarks.document_synthetique import generer_document
+
+# Parseur de référence : celui utilisé historiquement par la conversion
+PARSEUR_REFERENCE = 'html.parser'
+
+# Documents synthétiques couvrant les tirets, les images, les tableaux et la table des matières
+DOCUMENTS_SYNTHETIQUES = [
+    {'paragraphes': 300, 'densite_tirets': 0.3},
+    {'paragraphes': 300, 'images': 10, 'taille_image': 50},
+    {'paragraphes': 200, 'tableaux': 5, 'lignes_tableau': 20, 'colonnes_tableau': 5},
+    {'paragraphes': 500, 'profondeur_toc': 3},
+]
+
+# Classes personnalisées appliquées pour comparer aussi le passage des classes
+CLASSES_TEST = {'p': 'texte', 'h2': 'titre', 'table': 'table-striped', 'li': 'element'}
+
+def premiere_difference(attendu, obtenu, contexte=80):
+    for position, (a, b) in enumerate(zip(attendu, obtenu)):
+        if a != b:
+            break
+    else:
+        position = min(len(attendu), len(obtenu))
+    debut = max(0, position - contexte)
+    return position, attendu[debut:position + contexte], obtenu[debut:position + contexte]
+
+def comparer_document(nom, fichier_word_bytes, parseur):
+    """Retourne la liste des différences entre le parseur testé et le parseur de référence"""
+    differences = []
+    html_reference, stats_reference = convertir_word_vers_html_complet(fichier_word_bytes, nom, parseur=PARSEUR_REFERENCE)
+    html, stats = convertir_word_vers_html_complet(fichier_word_bytes, nom, parseur=parseur)
+
+    if html != html_reference:
+        differences.append(('conversion', html_reference or '', html or ''))
+    else:
+        for cle in stats_reference:
+            if cle != 'etapes' and stats[cle] != stats_reference[cle]:
+                differences.append((f'stats[{cle}]', str(stats_reference[cle]), str(stats[cle])))
+
+        classes_reference = appliquer_classes_personnalisees(html_reference, CLASSES_TEST, parseur=PARSEUR_REFERENCE)
+        classes = appliquer_classes_personnalisees(html, CLASSES_TEST, parseur=parseur)
+        if classes != classes_reference:
+            differences.append(('classes personnalisées', classes_reference, classes))
+
+    return differences
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Conformité des parseurs HTML de la conversion")
+    parser.add_argument('documents', nargs='*', help="Documents .docx (par défaut, ceux du dépôt)")
+    parser.add_argument('--parseur', choices=PARSEURS_HTML, default=PARSEUR_HTML_DEFAUT)
+    args = parser.parse_args(arguments)
+
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.documents:
+        chemins = args.documents
+    else:
+        racine = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        chemins = sorted(glob.glob(os.path.join(racine, '*.docx')))
+
+    documents = []
+    for chemin in chemins:
+        with open(chemin, 'rb') as fichier:
+            documents.append((os.path.basename(chemin), fichier.read()))
+    if not args.documents:
+        for i, parametres in enumerate(DOCUMENTS_SYNTHETIQUES):
+            documents.append((f'synthetique_{i + 1}.docx', generer_document(**parametres)))
+
+    nb_echecs = 0
+    for nom, fichier_word_bytes in documents:
+        differences = comparer_document(nom, fichier_word_bytes, args.parseur)
+        if not differences:
+            print(f"✅ {nom}")
+            continue
+
+        nb_echecs += 1
+        print(f"❌ {nom}")
+        for sortie, attendu, obtenu in differences:
+            position, extrait_attendu, extrait_obtenu = premiere_difference(attendu, obtenu)
+            print(f"    {sortie} diffère au caractère {position}")
+            print(f"    {PARSEUR_REFERENCE}: {extrait_attendu!r}")
+            print(f"    {args.parseur}: {extrait_obtenu!r}")
+
+    print(f"{len(documents) - nb_echecs}/{len(documents)} document(s) conforme(s) ({args.parseur} / {PARSEUR_REFERENCE})")
+    return 1 if nb_echecs else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
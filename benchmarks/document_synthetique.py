@@ -0,0 +1,156 @@
+"""
+Générateur de documents Word synthétiques de taille contrôlée pour les benchmarks.
+
+Usage :
+    python -m benchmarks.document_synthetique sortie.docx --paragraphes 2000 --images 20
+"""
+import argparse
+import random
+import struct
+import zlib
+from io import BytesIO
+
+from docx import Document
+from docx.shared import Inches
+
+VOCABULAIRE = [
+    'document', 'conversion', 'utilisateur', 'formulaire', 'brevet', 'demande', 'dossier',
+    'section', 'paragraphe', 'écran', 'bouton', 'champ', 'valeur', 'fichier', 'menu',
+    'données', 'résultat', 'option', 'étape', 'client', 'système', 'page', 'liste',
+]
+MOTS_TIRETS = [
+    'peut-être', 'porte-monnaie', 'arc-en-ciel', 'rendez-vous', 'grand-père', 'c\'est-à-dire',
+    'vis-à-vis', 'au-delà', 'sous-section', 'mise-à-jour', 'est-ce', 'lui-même',
+]
+
+def generer_png(largeur, hauteur, graine=0):
+    """PNG RGB de bruit aléatoire (incompressible), sans dépendance à Pillow"""
+    aleatoire = random.Random(graine)
+    lignes = b''.join(
+        b'\x00' + aleatoire.randbytes(largeur * 3)
+        for _ in range(hauteur)
+    )
+
+    def bloc(type_bloc, donnees):
+        return (struct.pack('>I', len(donnees)) + type_bloc + donnees
+                + struct.pack('>I', zlib.crc32(type_bloc + donnees) & 0xffffffff))
+
+    entete = struct.pack('>IIBBBBB', largeur, hauteur, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + bloc(b'IHDR', entete)
+            + bloc(b'IDAT', zlib.compress(lignes, 1)) + bloc(b'IEND', b''))
+
+def phrase(aleatoire, nb_mots, densite_tirets):
+    mots = []
+    for _ in range(nb_mots):
+        if aleatoire.random() < densite_tirets:
+            mots.append(aleatoire.choice(MOTS_TIRETS))
+        else:
+            mots.append(aleatoire.choice(VOCABULAIRE))
+    return ' '.join(mots).capitalize() + '.'
+
+def ajouter_table_matieres(document, profondeur, nb_sections):
+    """Titre « Table des matières » suivi d'une liste numérotée imbriquée"""
+    titre = document.add_paragraph()
+    titre.add_run('Table des matières').bold = True
+
+    styles = ['List Number', 'List Number 2', 'List Number 3']
+    for i in range(nb_sections):
+        document.add_paragraph(f'Chapitre {i + 1}', style=styles[0])
+        for niveau in range(1, profondeur):
+            for j in range(2):
+                document.add_paragraph(f'Section {i + 1}.{niveau}.{j + 1}', style=styles[niveau])
+
+def generer_document(paragraphes=1000, densite_tirets=0.05, images=0, taille_image=200,
+                     tableaux=0, lignes_tableau=10, colonnes_tableau=4, profondeur_toc=2,
+                     mots_par_paragraphe=40, graine=1):
+    """
+    Génère un document .docx synthétique.
+
+    Args:
+        paragraphes (int): Nombre de paragraphes de texte
+        densite_tirets (float): Proportion de mots composés avec tirets (0 à 1)
+        images (int): Nombre d'images, réparties dans le document
+        taille_image (int): Côté des images en pixels (bruit aléatoire, environ 3 octets par pixel)
+        tableaux (int): Nombre de tableaux, répartis dans le document
+        lignes_tableau (int): Nombre de lignes de chaque tableau, en-tête compris
+        colonnes_tableau (int): Nombre de colonnes de chaque tableau
+        profondeur_toc (int): Profondeur de la table des matières (0 pour aucune, 3 au plus)
+        mots_par_paragraphe (int): Nombre de mots par paragraphe
+        graine (int): Graine aléatoire, pour des documents reproductibles
+
+    Returns:
+        bytes: Le contenu du fichier .docx
+    """
+    aleatoire = random.Random(graine)
+    document = Document()
+
+    nb_sections = max(1, paragraphes // 50)
+    if profondeur_toc:
+        ajouter_table_matieres(document, min(profondeur_toc, 3), min(nb_sections, 20))
+
+    positions_images = {int(i * paragraphes / images) for i in range(images)} if images else set()
+    positions_tableaux = {int(i * paragraphes / tableaux) + 1 for i in range(tableaux)} if tableaux else set()
+    image = generer_png(taille_image, taille_image, graine) if images else None
+
+    for i in range(paragraphes):
+        if i % 50 == 0:
+            # Titre en gras, détecté comme <h2> par la conversion
+            titre = document.add_paragraph()
+            titre.add_run(f'Chapitre {i // 50 + 1} du guide').bold = True
+
+        document.add_paragraph(phrase(aleatoire, mots_par_paragraphe, densite_tirets))
+
+        if i in positions_images:
+            paragraphe = document.add_paragraph(f"Figure {i} : capture de l'écran principal")
+            paragraphe.add_run().add_picture(BytesIO(image), width=Inches(2))
+
+        if i in positions_tableaux:
+            document.add_paragraph(f'Tableau {i} : récapitulatif des valeurs')
+            table = document.add_table(rows=lignes_tableau, cols=colonnes_tableau)
+            for ligne in range(lignes_tableau):
+                cellules = table.rows[ligne].cells
+                for colonne in range(colonnes_tableau):
+                    cellules[colonne].text = f'Valeur {ligne}-{colonne}'
+
+    sortie = BytesIO()
+    document.save(sortie)
+    return sortie.getvalue()
+
+def ajouter_arguments(parser):
+    """Arguments communs de taille du document synthétique"""
+    parser.add_argument('--paragraphes', type=int, default=1000)
+    parser.add_argument('--densite-tirets', type=float, default=0.05)
+    parser.add_argument('--images', type=int, default=0)
+    parser.add_argument('--taille-image', type=int, default=200)
+    parser.add_argument('--tableaux', type=int, default=0)
+    parser.add_argument('--lignes-tableau', type=int, default=10)
+    parser.add_argument('--colonnes-tableau', type=int, default=4)
+    parser.add_argument('--profondeur-toc', type=int, default=2)
+    parser.add_argument('--graine', type=int, default=1)
+
+def parametres_depuis_arguments(args):
+    return {
+        'paragraphes': args.paragraphes,
+        'densite_tirets': args.densite_tirets,
+        'images': args.images,
+        'taille_image': args.taille_image,
+        'tableaux': args.tableaux,
+        'lignes_tableau': args.lignes_tableau,
+        'colonnes_tableau': args.colonnes_tableau,
+        'profondeur_toc': args.profondeur_toc,
+        'graine': args.graine,
+    }
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Génère un document Word synthétique")
+    parser.add_argument('sortie', help="Fichier .docx à créer")
+    ajouter_arguments(parser)
+    args = parser.parse_args(arguments)
+
+    donnees = generer_document(**parametres_depuis_arguments(args))
+    with open(args.sortie, 'wb') as fichier:
+        fichier.write(donnees)
+    print(f"{args.sortie} : {len(donnees) / 1024:.1f} Ko")
+
+if __name__ == '__main__':
+    main()
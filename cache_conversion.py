@@ -0,0 +1,162 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from ecriture_fichiers import ecrire_fichier_atomique
+
+logger = logging.getLogger(__name__)
+
+# Version du pipeline de conversion : à incrémenter quand la sortie change,
+# pour invalider les résultats déjà enregistrés sur disque
+VERSION_CONVERSION = 5
+
+def cle_conversion(fichier_word_bytes, options=None):
+    """
+    Calcule la clé de cache d'une conversion à partir du contenu du document
+    et des options de conversion.
+    """
+    empreinte = hashlib.sha256()
+    empreinte.update(fichier_word_bytes)
+    empreinte.update(json.dumps(
+        {'version': VERSION_CONVERSION, 'options': options or {}},
+        sort_keys=True
+    ).encode('utf-8'))
+    return empreinte.hexdigest()
+
+class CacheConversion:
+    """
+    Cache des résultats de conversion (html, stats) indexé par clé de contenu.
+
+    - Niveau mémoire : LRU borné en nombre d'entrées, propre au processus.
+    - Niveau disque (optionnel) : un fichier JSON par résultat dans un dossier partagé
+      par tous les processus de l'hôte, avec éviction des plus anciens au-delà d'une
+      taille maximale. Les écritures sont atomiques (fichier temporaire puis renommage).
+    """
+
+    def __init__(self, taille_memoire=32, dossier=None, taille_max_disque=500 * 1024 * 1024):
+        self.taille_memoire = taille_memoire
+        self.dossier = dossier
+        self.taille_max_disque = taille_max_disque
+        self._memoire = OrderedDict()
+        self._verrou = threading.Lock()
+
+        if self.dossier:
+            os.makedirs(self.dossier, exist_ok=True)
+
+    def obtenir(self, cle):
+        """Retourne le résultat (html, stats) en cache, ou None"""
+        with self._verrou:
+            if cle in self._memoire:
+                self._memoire.move_to_end(cle)
+                return self._memoire[cle]
+
+        resultat = self._lire_disque(cle)
+        if resultat is not None:
+            self._enregistrer_memoire(cle, resultat)
+        return resultat
+
+    def enregistrer(self, cle, html, stats):
+        """Enregistre un résultat de conversion dans les deux niveaux du cache"""
+        resultat = (html, stats)
+        self._enregistrer_memoire(cle, resultat)
+        self._ecrire_disque(cle, resultat)
+
+    def vider(self):
+        """Vide le niveau mémoire (le niveau disque est partagé et n'est pas touché)"""
+        with self._verrou:
+            self._memoire.clear()
+
+    def _enregistrer_memoire(self, cle, resultat):
+        if self.taille_memoire <= 0:
+            return
+        with self._verrou:
+            self._memoire[cle] = resultat
+            self._memoire.move_to_end(cle)
+            while len(self._memoire) > self.taille_memoire:
+                self._memoire.popitem(last=False)
+
+    def _chemin(self, cle):
+        return os.path.join(self.dossier, f"{cle}.json")
+
+    def _lire_disque(self, cle):
+        if not self.dossier:
+            return None
+
+        chemin = self._chemin(cle)
+        try:
+            with open(chemin, 'r', encoding='utf-8') as fichier:
+                donnees = json.load(fichier)
+            resultat = donnees['html'], donnees['stats']
+            # Marquer l'entrée comme récemment utilisée pour l'éviction
+            os.utime(chemin)
+        except OSError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            # Entrée illisible ou incomplète : la supprimer et reconvertir
+            logger.warning(f"Entrée du cache de conversion invalide, supprimée: {e!r}")
+            try:
+                os.remove(chemin)
+            except OSError:
+                pass
+            return None
+
+        return resultat
+
+    def _ecrire_disque(self, cle, resultat):
+        if not self.dossier:
+            return
+
+        html, stats = resultat
+        try:
+            ecrire_fichier_atomique(self._chemin(cle), json.dumps({'html': html, 'stats': stats}, ensure_ascii=False))
+        except OSError as e:
+            logger.error(f"Erreur lors de l'écriture du cache de conversion: {e}")
+            return
+
+        self._evincer_disque()
+
+    def _evincer_disque(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de la taille maximale"""
+        entrees = []
+        taille_totale = 0
+        for entree in os.scandir(self.dossier):
+            if not entree.name.endswith('.json'):
+                continue
+            try:
+                infos = entree.stat()
+            except OSError:
+                continue
+            entrees.append((infos.st_mtime, infos.st_size, entree.path))
+            taille_totale += infos.st_size
+
+        entrees.sort()
+        for _, taille, chemin in entrees:
+            if taille_totale <= self.taille_max_disque:
+                break
+            try:
+                os.remove(chemin)
+            except OSError:
+                # Déjà supprimée par un autre processus
+                pass
+            taille_totale -= taille
+
+def convertir_avec_cache(cache, fonction_conversion, fichier_word_bytes, nom_fichier, **options):
+    """
+    Retourne le résultat en cache pour ce document et ces options, ou lance la
+    conversion et enregistre son résultat s'il est valide.
+
+    Returns:
+        tuple: (html, stats), (None, None) si la conversion a échoué
+    """
+    cle = cle_conversion(fichier_word_bytes, options)
+    resultat = cache.obtenir(cle)
+    if resultat is not None:
+        return resultat
+
+    html, stats = fonction_conversion(fichier_word_bytes, nom_fichier, **options)
+    if html and stats:
+        cache.enregistrer(cle, html, stats)
+    return html, stats
@@ -0,0 +1,363 @@
+"""
+Reconversion incrémentale d'un document Word par segments de paragraphes.
+
+Le corps de word/document.xml est découpé en segments de blocs de premier niveau
+(paragraphes, tableaux) dont les frontières dépendent du contenu des blocs : une
+modification locale ne change que le segment qui la contient. Le HTML de chaque segment
+est gardé en cache sous l'empreinte de ses octets XML ; à la version suivante du document,
+seuls les segments nouveaux ou modifiés passent par mammoth et les étapes de la
+conversion, en un seul appel, puis le HTML est réassemblé dans l'ordre du document.
+
+Une première conversion produit le même HTML que convertir_word_vers_html_complet.
+Ensuite, les heuristiques qui regardent tout le document (récupération des images
+manquantes, table des matières, nombre de paragraphes de style titre en mode_titres='styles')
+ne voient que les segments reconvertis ensemble. Les
+tableaux et les listes ne sont jamais séparés du bloc qui les précède, pour que les
+titres de tableaux et les tables des matières restent détectés.
+
+Usage :
+    python conversion_incrementale.py document.docx --cache dossier_cache
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+from io import BytesIO
+from xml.parsers import expat
+
+from cache_conversion import VERSION_CONVERSION, CacheConversion
+from conversion_word import (
+    MODES_TITRES, W_NS, ConversionAnnulee, MesureEtapes, convertir_word_vers_html_complet, fin_element_vide,
+    nom_sortie_html
+)
+
+logger = logging.getLogger(__name__)
+
+# Nombre moyen de blocs par segment : un bloc termine un segment quand son empreinte
+# est un multiple de cette valeur
+TAILLE_MOYENNE_SEGMENT = 16
+
+# Nombre maximal de blocs par segment, pour borner le travail d'une modification
+TAILLE_MAX_SEGMENT = 128
+
+# Texte des paragraphes séparant les segments reconvertis ensemble (sans tiret ni apostrophe,
+# pour traverser les améliorations typographiques sans modification)
+MARQUEUR_SEGMENT = 'WTHSEGMENT'
+MOTIF_MARQUEUR = re.compile(r'<p[^>]*>' + MARQUEUR_SEGMENT + r'(\d+)</p>')
+TEXTE_MARQUEUR = re.compile(MARQUEUR_SEGMENT + r'\d+')
+
+# Images numérotées par mammoth, puis images réinsérées par recuperer_images_manquantes
+# (reconnaissables à leur attribut class_), numérotées à la suite comme dans la conversion complète
+MOTIF_IMAGE_CONVERTIE = re.compile(r'<img alt="Image \d+"(?= class=)')
+MOTIF_IMAGE_RECUPEREE = re.compile(r'<img alt="Image \d+"(?= class_=)')
+
+class _Bloc:
+    __slots__ = ('xml', 'nom')
+
+    def __init__(self, xml, nom):
+        self.xml = xml
+        self.nom = nom
+
+def decouper_document_xml(document_xml):
+    """
+    Découpe word/document.xml en trois parties, au niveau des octets.
+
+    Returns:
+        tuple: (en-tête jusqu'à <w:body> inclus, liste des blocs de premier niveau,
+        fin du document à partir du w:sectPr final), et le préfixe de l'espace de noms du corps
+    """
+    analyseur = expat.ParserCreate()
+    etat = {'profondeur': 0, 'debut_bloc': None, 'fin_vide': None, 'fin_entete': None, 'debut_fin': None, 'prefixe': ''}
+    blocs = []
+
+    def debut_element(nom, attributs):
+        etat['profondeur'] += 1
+        if etat['profondeur'] == 2:
+            etat['prefixe'] = nom.rpartition(':')[0]
+            etat['fin_entete'] = document_xml.index(b'>', analyseur.CurrentByteIndex) + 1
+        elif etat['profondeur'] == 3:
+            etat['debut_bloc'] = analyseur.CurrentByteIndex
+            etat['fin_vide'] = fin_element_vide(document_xml, analyseur.CurrentByteIndex)
+
+    def fin_element(nom):
+        if etat['profondeur'] == 3:
+            fin = etat['fin_vide'] or document_xml.index(b'>', analyseur.CurrentByteIndex) + 1
+            blocs.append(_Bloc(document_xml[etat['debut_bloc']:fin], nom.rpartition(':')[2]))
+        elif etat['profondeur'] == 2:
+            etat['debut_fin'] = analyseur.CurrentByteIndex
+        etat['profondeur'] -= 1
+
+    analyseur.StartElementHandler = debut_element
+    analyseur.EndElementHandler = fin_element
+    analyseur.Parse(document_xml, True)
+
+    fin = document_xml[etat['debut_fin']:]
+    # Les propriétés de section du document restent à la fin de chaque document reconstruit
+    if blocs and blocs[-1].nom == 'sectPr':
+        fin = blocs.pop().xml + fin
+    return document_xml[:etat['fin_entete']], blocs, fin, etat['prefixe']
+
+def styles_de_liste(archive):
+    """Identifiants des styles de paragraphe numérotés (directement ou par leur style parent)"""
+    try:
+        racine = ET.fromstring(archive.read('word/styles.xml'))
+    except (KeyError, ET.ParseError):
+        return set()
+
+    parents = {}
+    numerotes = set()
+    for style in racine.iter(W_NS + 'style'):
+        identifiant = style.get(W_NS + 'styleId')
+        parent = style.find(W_NS + 'basedOn')
+        if parent is not None:
+            parents[identifiant] = parent.get(W_NS + 'val')
+        if style.find(f'{W_NS}pPr/{W_NS}numPr') is not None:
+            numerotes.add(identifiant)
+
+    def est_numerote(identifiant, vus=()):
+        if identifiant in numerotes:
+            return True
+        parent = parents.get(identifiant)
+        return parent is not None and parent not in vus and est_numerote(parent, vus + (identifiant,))
+
+    return {identifiant for identifiant in parents.keys() | numerotes if est_numerote(identifiant)}
+
+def est_sans_texte(bloc, prefixe):
+    """Bloc sans élément w:t : paragraphe vide, ignoré par mammoth entre deux éléments de liste"""
+    balise = ('<' + prefixe + ':t').encode('utf-8')
+    return balise + b'>' not in bloc.xml and balise + b' ' not in bloc.xml
+
+def est_paragraphe_de_liste(bloc, prefixe, styles_liste):
+    if bloc.nom != 'p':
+        return False
+    if (prefixe + ':numPr').encode('utf-8') in bloc.xml:
+        return True
+    style = re.search(rb':pStyle [^>]*?val="([^"]*)"', bloc.xml)
+    return style is not None and style.group(1).decode('utf-8') in styles_liste
+
+def segmenter_blocs(blocs, prefixe, styles_liste=frozenset()):
+    """
+    Regroupe les blocs en segments dont les frontières dépendent du contenu des blocs.
+
+    Un segment ne se termine jamais avant un tableau (son titre est le paragraphe
+    précédent), ni avant ou après un paragraphe de liste ou un bloc sans texte
+    (mammoth regroupe en une seule liste les paragraphes de liste qui ne sont séparés
+    que par des paragraphes vides).
+
+    Returns:
+        list: Listes de blocs consécutifs
+    """
+    segments = []
+    courant = []
+    for position, bloc in enumerate(blocs):
+        courant.append(bloc)
+        suivant = blocs[position + 1] if position + 1 < len(blocs) else None
+        if (suivant is None or suivant.nom == 'tbl' or
+                est_sans_texte(bloc, prefixe) or est_sans_texte(suivant, prefixe) or
+                est_paragraphe_de_liste(bloc, prefixe, styles_liste) or
+                est_paragraphe_de_liste(suivant, prefixe, styles_liste)):
+            continue
+        empreinte = int.from_bytes(hashlib.blake2b(bloc.xml, digest_size=8).digest(), 'big')
+        if empreinte % TAILLE_MOYENNE_SEGMENT == 0 or len(courant) >= TAILLE_MAX_SEGMENT:
+            segments.append(courant)
+            courant = []
+    if courant:
+        segments.append(courant)
+    return segments
+
+def empreinte_contexte(archive, entete, fin, options):
+    """
+    Empreinte de tout ce qui, hors des blocs du corps, influence la conversion :
+    en-tête et fin de document.xml, autres parties de l'archive (styles, numérotation,
+    relations, images : via leur CRC, sans les décompresser) et options de conversion.
+    """
+    empreinte = hashlib.sha256()
+    empreinte.update(json.dumps(
+        {'version': VERSION_CONVERSION, 'options': options},
+        sort_keys=True
+    ).encode('utf-8'))
+    empreinte.update(entete)
+    empreinte.update(fin)
+    for info in sorted(archive.infolist(), key=lambda info: info.filename):
+        if info.filename != 'word/document.xml':
+            empreinte.update(f"{info.filename}:{info.CRC}:{info.file_size};".encode('utf-8'))
+    return empreinte.digest()
+
+def cle_segment(contexte, segment):
+    empreinte = hashlib.sha256(contexte)
+    for bloc in segment:
+        empreinte.update(hashlib.sha256(bloc.xml).digest())
+    return 'segment-' + empreinte.hexdigest()
+
+def reconstruire_docx(archive, document_xml):
+    """Archive identique à l'originale, avec un autre word/document.xml (sans recompression)"""
+    sortie = BytesIO()
+    with zipfile.ZipFile(sortie, 'w', zipfile.ZIP_STORED) as nouvelle:
+        for info in archive.infolist():
+            if info.filename == 'word/document.xml':
+                nouvelle.writestr(info.filename, document_xml)
+            else:
+                nouvelle.writestr(info.filename, archive.read(info))
+    return sortie.getvalue()
+
+def convertir_segments(archive, entete, fin, prefixe, segments, nom_fichier, options, mesure):
+    """
+    Convertit plusieurs segments en un seul appel, séparés par des paragraphes marqueurs.
+
+    Les statistiques de chaque segment sont les compteurs des étapes de la conversion,
+    séparés aux marqueurs (stats['compteurs_segments']) : additionnées, elles donnent
+    celles de la conversion complète.
+
+    Returns:
+        list: Couples (HTML, statistiques) de chaque segment, ou None si le résultat ne peut
+        pas être redécoupé
+    """
+    p = prefixe + ':' if prefixe else ''
+    morceaux = [entete]
+    for numero, segment in enumerate(segments):
+        morceaux.append(
+            f'<{p}p><{p}r><{p}t>{MARQUEUR_SEGMENT}{numero}</{p}t></{p}r></{p}p>'.encode('utf-8')
+        )
+        morceaux.extend(bloc.xml for bloc in segment)
+    morceaux.append(fin)
+
+    with mesure.etape('reconstruction'):
+        donnees = reconstruire_docx(archive, b''.join(morceaux))
+
+    html, stats = convertir_word_vers_html_complet(donnees, nom_fichier, marqueur_segments=TEXTE_MARQUEUR, **options)
+    if not html:
+        return None
+    for etape in stats['etapes']:
+        mesure.etapes.append(etape)
+
+    # Découper le HTML aux marqueurs, qui doivent apparaître une fois chacun et dans l'ordre
+    parties = MOTIF_MARQUEUR.split(html)
+    numeros = parties[1::2]
+    if (parties[0].strip() or numeros != [str(numero) for numero in range(len(segments))] or
+            len(stats['compteurs_segments']) != len(segments)):
+        logger.warning("Marqueurs de segments introuvables, reconversion complète")
+        return None
+    return list(zip(parties[2::2], stats['compteurs_segments']))
+
+def convertir_incremental(fichier_word_bytes, nom_fichier, cache_segments, mode_images='placeholder',
+                          custom_classes=None, parseur=None, mesurer_memoire=False, suivre_etape=None,
+                          mode_titres='heuristique'):
+    """
+    Convertit un document en ne reconvertissant que les segments absents du cache.
+
+    Args:
+        fichier_word_bytes (bytes): Contenu du document
+        nom_fichier (str): Nom du document
+        cache_segments (CacheConversion): Cache des segments déjà convertis, partagé
+            entre les versions successives des documents
+        mode_images, custom_classes, parseur, mesurer_memoire, suivre_etape, mode_titres:
+            Options de convertir_word_vers_html_complet
+
+    Returns:
+        tuple: (html, stats) ; stats contient aussi 'segments' et 'segments_convertis'.
+        Les statistiques sont la somme de celles des segments, comptées par les étapes de
+        la conversion comme pour le document entier.
+    """
+    mesure = MesureEtapes(memoire=mesurer_memoire, suivre_etape=suivre_etape)
+    options = {'mode_images': mode_images, 'custom_classes': custom_classes, 'parseur': parseur, 'mode_titres': mode_titres}
+    options_conversion = dict(options, mesurer_memoire=mesurer_memoire, suivre_etape=suivre_etape)
+
+    try:
+        with zipfile.ZipFile(BytesIO(fichier_word_bytes), 'r') as archive:
+            with mesure.etape('decoupage'):
+                entete, blocs, fin, prefixe = decouper_document_xml(archive.read('word/document.xml'))
+                segments = segmenter_blocs(blocs, prefixe, styles_de_liste(archive))
+                contexte = empreinte_contexte(archive, entete, fin, options)
+                cles = [cle_segment(contexte, segment) for segment in segments]
+
+            resultats = [cache_segments.obtenir(cle) for cle in cles]
+            a_convertir = [position for position, resultat in enumerate(resultats) if resultat is None]
+
+            if a_convertir:
+                resultats_segments = convertir_segments(
+                    archive, entete, fin, prefixe, [segments[position] for position in a_convertir],
+                    nom_fichier, options_conversion, mesure
+                )
+                if resultats_segments is None:
+                    return convertir_word_vers_html_complet(fichier_word_bytes, nom_fichier, **options_conversion)
+
+                for position, (html_segment, stats_segment) in zip(a_convertir, resultats_segments):
+                    cache_segments.enregistrer(cles[position], html_segment, stats_segment)
+                    resultats[position] = (html_segment, stats_segment)
+
+        with mesure.etape('assemblage'):
+            html = ''.join(html_segment for html_segment, _ in resultats)
+
+            # Numéroter les images sur le document entier
+            compteur = [0]
+
+            def numeroter(match):
+                compteur[0] += 1
+                return f'<img alt="Image {compteur[0]}"'
+            html = MOTIF_IMAGE_CONVERTIE.sub(numeroter, html)
+            html = MOTIF_IMAGE_RECUPEREE.sub(numeroter, html)
+
+        stats = {
+            'nb_images': html.count('<img'),
+            'titres_convertis': sum(stats_segment['titres_convertis'] for _, stats_segment in resultats),
+            'apostrophes_changees': sum(stats_segment['apostrophes_changees'] for _, stats_segment in resultats),
+            'mots_wrapes': sum(stats_segment['mots_wrapes'] for _, stats_segment in resultats),
+            'toc_convertie': any(stats_segment['toc_convertie'] for _, stats_segment in resultats),
+            'nb_paragraphes': sum(stats_segment['nb_paragraphes'] for _, stats_segment in resultats),
+            'segments': len(segments),
+            'segments_convertis': len(a_convertir),
+            'etapes': mesure.etapes
+        }
+        return html, stats
+
+    except ConversionAnnulee:
+        raise
+
+    except Exception as e:
+        logger.exception(f"Erreur lors de la conversion incrémentale: {e}")
+        return None, None
+
+    finally:
+        mesure.terminer()
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Reconversion incrémentale d'un document Word (.docx) en HTML")
+    parser.add_argument('entree', help="Fichier .docx à convertir")
+    parser.add_argument('--cache', required=True, help="Dossier du cache des segments, conservé entre les versions du document")
+    parser.add_argument('-o', '--sortie', help="Fichier HTML produit (par défaut, <nom>_converted.html à côté du document)")
+    parser.add_argument('--mode-images', choices=['placeholder', 'inline'], default='placeholder', help="Gestion des images")
+    parser.add_argument('--mode-titres', choices=MODES_TITRES, default='heuristique',
+                        help="Titres devinés d'après les paragraphes en gras, ou repris des styles de titre Word")
+    args = parser.parse_args(arguments)
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+    try:
+        with open(args.entree, 'rb') as fichier:
+            fichier_word_bytes = fichier.read()
+    except OSError as e:
+        logger.error(f"Impossible de lire le document: {e}")
+        return 1
+
+    cache_segments = CacheConversion(taille_memoire=0, dossier=args.cache)
+    nom_fichier = os.path.basename(args.entree)
+    html, stats = convertir_incremental(
+        fichier_word_bytes, nom_fichier, cache_segments, mode_images=args.mode_images, mode_titres=args.mode_titres
+    )
+    if not html:
+        return 1
+
+    sortie = args.sortie or nom_sortie_html(args.entree)
+    with open(sortie, 'w', encoding='utf-8') as fichier:
+        fichier.write(html)
+
+    logger.info(f"{nom_fichier} -> {sortie} ({stats.get('segments_convertis', '?')}/{stats.get('segments', '?')} segments reconvertis)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from conversion_word import MODES_IMAGES, convertir_word_vers_html_complet, nom_sortie_html
+from export_images import DepotImages, ecrire_html_et_images
+
+logger = logging.getLogger(__name__)
+
+def _convertir_document(nom, source, options):
+    """
+    Tâche exécutée dans un processus du pool.
+
+    source est soit le contenu du document (bytes), soit le chemin du fichier à lire :
+    pour un dossier, seuls les chemins transitent entre processus.
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as fichier:
+            source = fichier.read()
+
+    html, stats = convertir_word_vers_html_complet(source, nom, **options)
+    return nom, html, stats
+
+def convertir_lot(documents, nb_workers=None, **options):
+    """
+    Convertit plusieurs documents en parallèle sur un pool de processus.
+
+    Args:
+        documents (iterable): Couples (nom, bytes ou chemin du fichier)
+        nb_workers (int): Nombre de processus (par défaut, le nombre de cœurs)
+        **options: Options passées à convertir_word_vers_html_complet ; en mode d'images
+            'export', tous les processus partagent le dépôt dossier_images, où une image
+            présente dans plusieurs documents n'est écrite qu'une fois
+
+    Yields:
+        tuple: (nom, html, stats) au fur et à mesure que les conversions se terminent ;
+        html et stats valent None si la conversion a échoué
+    """
+    contexte = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=nb_workers, mp_context=contexte) as pool:
+        taches = {
+            pool.submit(_convertir_document, nom, source, options): nom
+            for nom, source in documents
+        }
+        for tache in as_completed(taches):
+            try:
+                yield tache.result()
+            except Exception as e:
+                logger.error(f"Erreur lors de la conversion de {taches[tache]}: {e}")
+                yield taches[tache], None, None
+
+def ecrire_resultats_zip(resultats, fichier_zip, dossier_images=None):
+    """
+    Écrit chaque résultat dans l'archive dès qu'il arrive, puis le transmet à l'appelant.
+
+    Args:
+        resultats (iterable): Résultats (nom, html, stats) de convertir_lot
+        fichier_zip: Chemin ou fichier ouvert en écriture binaire
+        dossier_images (str): Dépôt des images exportées (mode d'images 'export') : chaque
+            image référencée est ajoutée une seule fois, dans le dossier images/ de l'archive
+
+    Yields:
+        tuple: (nom, html, stats) pour suivre la progression
+    """
+    depot = DepotImages(dossier_images) if dossier_images else None
+    images_ecrites = set()
+    with zipfile.ZipFile(fichier_zip, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for nom, html, stats in resultats:
+            if html and depot:
+                ecrire_html_et_images(archive, nom_sortie_html(nom), html, depot, images_ecrites)
+            elif html:
+                archive.writestr(nom_sortie_html(nom), html)
+            yield nom, html, stats
+
+def lister_documents(dossier, recursif=False):
+    """Liste les fichiers .docx d'un dossier sous forme de couples (nom relatif, chemin)"""
+    documents = []
+    for racine, sous_dossiers, fichiers in os.walk(dossier):
+        for nom in sorted(fichiers):
+            # Ignorer les fichiers temporaires de Word (~$document.docx)
+            if nom.endswith('.docx') and not nom.startswith('~$'):
+                chemin = os.path.join(racine, nom)
+                documents.append((os.path.relpath(chemin, dossier), chemin))
+        if not recursif:
+            break
+    return documents
+
+def convertir_dossier(dossier, fichier_zip, nb_workers=None, recursif=False, **options):
+    """
+    Convertit tous les .docx d'un dossier et écrit les HTML dans une archive zip.
+
+    Returns:
+        tuple: (nombre de documents convertis, liste des documents en échec)
+    """
+    documents = lister_documents(dossier, recursif)
+    total = len(documents)
+    convertis = 0
+    echecs = []
+
+    with tempfile.TemporaryDirectory() as dossier_images:
+        if options.get('mode_images') == 'export':
+            options['dossier_images'] = dossier_images
+        resultats = ecrire_resultats_zip(
+            convertir_lot(documents, nb_workers, **options), fichier_zip, options.get('dossier_images')
+        )
+        for position, (nom, html, stats) in enumerate(resultats, start=1):
+            if html:
+                convertis += 1
+                print(f"[{position}/{total}] {nom} ✅")
+            else:
+                echecs.append(nom)
+                print(f"[{position}/{total}] {nom} ❌")
+
+    return convertis, echecs
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Conversion par lot de documents Word (.docx) en HTML")
+    parser.add_argument('dossier', help="Dossier contenant les fichiers .docx")
+    parser.add_argument('-o', '--sortie', default='conversion_lot.zip', help="Archive zip des fichiers HTML produits")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Nombre de processus (par défaut, le nombre de cœurs)")
+    parser.add_argument('-r', '--recursif', action='store_true', help="Inclure les sous-dossiers")
+    parser.add_argument('--mode-images', choices=MODES_IMAGES, default='placeholder',
+                        help="Gestion des images ('export' : images réelles dans le dossier images/ de l'archive)")
+    args = parser.parse_args(arguments)
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s')
+    convertis, echecs = convertir_dossier(args.dossier, args.sortie, args.workers, args.recursif, mode_images=args.mode_images)
+    print(f"{convertis} document(s) converti(s), {len(echecs)} échec(s) -> {args.sortie}")
+    return 1 if echecs else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1609 @@
+import argparse
+import bisect
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from contextlib import contextmanager
+from functools import partial
+from datetime import datetime
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+from io import BytesIO
+from export_images import DepotImages, ExportImages, ecrire_html_et_images
+from modele_document import Element, analyser_modele, morceau_texte, serialiser
+
+logger = logging.getLogger(__name__)
+
+# Parseur HTML du modèle de document : lxml, bien plus rapide que html.parser, s'il est installé
+try:
+    import lxml  # noqa: F401
+    PARSEUR_HTML_DEFAUT = 'lxml'
+except ImportError:
+    PARSEUR_HTML_DEFAUT = 'html.parser'
+
+PARSEURS_HTML = ('lxml', 'html.parser')
+
+# Mots composés avec tirets à protéger contre la coupure de ligne
+MOTIF_MOTS_TIRETS = re.compile(r'\b([a-zA-ZÀ-ÿ]+(?:-[a-zA-ZÀ-ÿ]+)+)\b')
+
+def decouper_mots_tirets(texte):
+    """
+    Découpe un texte en morceaux de texte et en <span class="nowrap"> pour chaque mot à tirets.
+    
+    Returns:
+        list: Les morceaux (vide si le texte ne contient aucun mot à tirets)
+    """
+    morceaux = []
+    position = 0
+    for match in MOTIF_MOTS_TIRETS.finditer(texte):
+        if match.start() > position:
+            morceaux.append(morceau_texte(texte[position:match.start()]))
+        morceaux.append(Element('span', {'class': ['nowrap']}, match.group(1)))
+        position = match.end()
+    
+    if morceaux and position < len(texte):
+        morceaux.append(morceau_texte(texte[position:]))
+    return morceaux
+
+def ameliorations_typographiques(document):
+    """
+    Applique des améliorations typographiques au contenu HTML.
+    
+    Chaque texte est découpé directement en texte et en spans, sans analyser
+    de fragment HTML : le texte d'origine n'est jamais interprété comme du balisage.
+    """
+    apostrophes_changees = 0
+    mots_tirets_wrapes = 0
+    
+    # Parcourir les textes de chaque élément
+    for element in [document] + document.trouver_tous():
+        if element.nom in ('script', 'style'):
+            continue
+        
+        enfants = []
+        modifie = False
+        for texte_original in element.enfants:
+            if texte_original.__class__ is not str:
+                enfants.append(texte_original)
+                continue
+            
+            texte_modifie = texte_original
+            
+            # 1. Remplacer les apostrophes droites par des apostrophes courbes
+            apostrophes_changees += texte_modifie.count("'")
+            texte_modifie = texte_modifie.replace("'", "'")
+            
+            # 2. Identifier et protéger les mots avec tirets
+            morceaux = decouper_mots_tirets(texte_modifie) if '-' in texte_modifie else []
+            
+            # Remplacer le texte si il y a eu des modifications
+            if morceaux:
+                mots_tirets_wrapes += sum(1 for morceau in morceaux if morceau.__class__ is Element)
+                enfants.extend(morceaux)
+                modifie = True
+            else:
+                enfants.append(texte_modifie)
+                modifie = modifie or texte_modifie != texte_original
+        
+        if modifie:
+            element.remplacer_enfants(enfants)
+    
+    return apostrophes_changees, mots_tirets_wrapes
+
+def detecter_et_convertir_titres(document):
+    """Convertit les <p><strong> en <h2> quand c'est approprié"""
+    titres_convertis = 0
+    
+    for p in document.trouver_tous('p'):
+        strong_tags = p.trouver_tous('strong')
+        
+        if strong_tags:
+            texte_total = p.texte().strip()
+            texte_strong = ''.join([s.texte().strip() for s in strong_tags])
+            
+            if (len(texte_strong) > 0 and 
+                len(texte_total) > 0 and
+                len(texte_strong) / len(texte_total) >= 0.8 and
+                len(texte_total) <= 100 and
+                not texte_total.endswith('.') and
+                not texte_total.endswith(',') and
+                len(texte_total.split()) <= 15):
+                
+                if (not any(mot in texte_total.lower() for mot in ['cliquez', 'voir', 'télécharger', 'lire', 'plus d\'info']) and
+                    not re.search(r'\d+\s*%', texte_total) and
+                    not re.search(r'\$\d+', texte_total)):
+                    
+                    p.remplacer_par(Element('h2', texte=texte_total))
+                    titres_convertis += 1
+    
+    return titres_convertis
+
+def detecter_et_convertir_table_matieres(document):
+    """
+    Détecte et convertit les tables de matières en listes avec liens
+    """
+    toc_convertie = False
+    
+    # Chercher les titres "Table des matières" (français) et "Table of contents" (anglais)
+    for h2 in document.trouver_tous('h2'):
+        texte_titre = h2.texte().lower()
+        
+        if ('table des matières' in texte_titre or 
+            'table of contents' in texte_titre or
+            'table des matieres' in texte_titre):  # Sans accent aussi
+            
+            logger.info(f"📋 Table des matières détectée: {h2.texte()}")
+            
+            # Chercher la liste qui suit ce titre
+            next_element = h2.element_suivant()
+            while next_element and next_element.nom not in ['ol', 'ul']:
+                next_element = next_element.element_suivant()
+            
+            if next_element and next_element.nom in ['ol', 'ul']:
+                # Convertir cette liste en table des matières avec liens
+                convertir_liste_en_toc(next_element)
+                toc_convertie = True
+                break
+    
+    return toc_convertie
+
+def convertir_liste_en_toc(liste_element):
+    """
+    Convertit une liste ordinaire en table des matières avec liens et numérotation
+    """
+    def extraire_texte_propre(li):
+        """Extrait le texte d'un élément li en excluant les sous-listes"""
+        texte = ""
+        for content in li.enfants:
+            if content.__class__ is str:
+                texte += content
+            elif content.nom not in ['ol', 'ul']:
+                texte += content.texte()
+        
+        # Nettoyer le texte
+        texte = texte.strip()
+        texte = re.sub(r'^\d+\.?\s*', '', texte)  # Supprimer numérotation existante
+        texte = re.sub(r'^\d+\.\d+\.?\s*', '', texte)
+        texte = re.sub(r'^\d+\.\d+\.\d+\.?\s*', '', texte)
+        texte = re.sub(r'\s+', ' ', texte)  # Normaliser les espaces
+        
+        return texte.strip()
+    
+    def traiter_niveau(items, niveau=1, numero_parent=""):
+        """Traite récursivement chaque niveau de la liste"""
+        for index, li in enumerate(items):
+            numero_actuel = f"{numero_parent}{index + 1}" if numero_parent else str(index + 1)
+            
+            # Extraire le texte propre
+            texte = extraire_texte_propre(li)
+            
+            if texte:
+                # Trouver les sous-listes dans l'élément original
+                sous_listes = li.enfants_elements(('ol', 'ul'))
+                
+                # Vider l'élément li
+                li.vider()
+                
+                # Créer le nouveau lien
+                li.ajouter(Element('a', {'href': f"#{numero_actuel}"}, f"{numero_actuel}.&nbsp;{texte}"))
+                
+                # Traiter les sous-listes
+                if sous_listes:
+                    nouvelle_sous_liste = Element('ul')
+                    sous_items = sous_listes[0].enfants_elements('li')
+                    
+                    for sous_index, sous_li in enumerate(sous_items):
+                        sous_numero = f"{numero_actuel}.{sous_index + 1}"
+                        sous_texte = extraire_texte_propre(sous_li)
+                        
+                        if sous_texte:
+                            nouveau_sous_li = Element('li')
+                            nouveau_sous_li.ajouter(Element('a', {'href': f"#{sous_numero}"}, f"{sous_numero}&nbsp;{sous_texte}"))
+                            
+                            # Gérer le troisième niveau
+                            sous_sous_listes = sous_li.enfants_elements(('ol', 'ul'))
+                            if sous_sous_listes:
+                                sous_sous_liste = Element('ul')
+                                sous_sous_items = sous_sous_listes[0].enfants_elements('li')
+                                
+                                for sss_index, sss_li in enumerate(sous_sous_items):
+                                    sss_numero = f"{sous_numero}.{sss_index + 1}"
+                                    sss_texte = extraire_texte_propre(sss_li)
+                                    
+                                    if sss_texte:
+                                        nouveau_sss_li = Element('li')
+                                        nouveau_sss_li.ajouter(Element('a', {'href': f"#{sss_numero}"}, f"{sss_numero}&nbsp;{sss_texte}"))
+                                        sous_sous_liste.ajouter(nouveau_sss_li)
+                                
+                                if sous_sous_liste.enfants:
+                                    nouveau_sous_li.ajouter(sous_sous_liste)
+                            
+                            nouvelle_sous_liste.ajouter(nouveau_sous_li)
+                    
+                    if nouvelle_sous_liste.enfants:
+                        li.ajouter(nouvelle_sous_liste)
+    
+    # Convertir ol en ul
+    if liste_element.nom == 'ol':
+        liste_element.nom = 'ul'
+    
+    # Traiter tous les éléments de premier niveau
+    items_premier_niveau = liste_element.enfants_elements('li')
+    traiter_niveau(items_premier_niveau)
+
+# Étapes de la conversion, dans l'ordre d'exécution
+ETAPES_CONVERSION = (
+    'analyse_xml', 'mammoth', 'nettoyage_images', 'analyse_html', 'titres', 'typographie',
+    'table_matieres', 'recuperation_images', 'nettoyage', 'tableaux', 'serialisation'
+)
+
+class ConversionAnnulee(Exception):
+    """Levée par la fonction de suivi des étapes pour interrompre une conversion"""
+
+# tracemalloc est global au processus : les mesures en cours le partagent, et la dernière
+# à se terminer l'arrête s'il a été démarré par l'une d'elles
+_VERROU_TRACEMALLOC = threading.Lock()
+_mesures_tracemalloc = 0
+_tracemalloc_demarre = False
+
+class MesureEtapes:
+    """
+    Mesure le temps réel, le temps CPU et, en option, le pic mémoire de chaque étape.
+    
+    suivre_etape, si elle est fournie, est appelée avec le nom de chaque étape avant
+    qu'elle commence ; elle peut lever ConversionAnnulee pour arrêter la conversion.
+    
+    Le pic mémoire est mesuré avec tracemalloc, qui ralentit nettement la conversion et
+    trace tout le processus : les conversions simultanées d'autres threads s'y ajoutent.
+    Il reste actif tant qu'une mesure de la mémoire est en cours ; une étape pendant
+    laquelle il a été arrêté (par un autre module) a un pic mémoire None.
+    Le temps CPU est celui du thread qui exécute l'étape : les conversions simultanées
+    d'autres threads ne s'y ajoutent pas.
+    """
+    
+    def __init__(self, memoire=False, suivre_etape=None):
+        global _mesures_tracemalloc, _tracemalloc_demarre
+        self.memoire = memoire
+        self.suivre_etape = suivre_etape
+        self.etapes = []
+        
+        if memoire:
+            with _VERROU_TRACEMALLOC:
+                if _mesures_tracemalloc == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _tracemalloc_demarre = True
+                _mesures_tracemalloc += 1
+    
+    @contextmanager
+    def etape(self, nom):
+        if self.suivre_etape:
+            self.suivre_etape(nom)
+        tracage = self.memoire and tracemalloc.is_tracing()
+        if tracage:
+            tracemalloc.reset_peak()
+            memoire_debut = tracemalloc.get_traced_memory()[0]
+        debut = time.perf_counter()
+        debut_cpu = time.thread_time()
+        
+        try:
+            yield
+        finally:
+            mesure = {
+                'etape': nom,
+                'duree': time.perf_counter() - debut,
+                'cpu': time.thread_time() - debut_cpu,
+                'memoire_pic': None
+            }
+            if tracage and tracemalloc.is_tracing():
+                # Une mesure simultanée peut avoir remis le pic à zéro après une libération
+                mesure['memoire_pic'] = max(0, tracemalloc.get_traced_memory()[1] - memoire_debut)
+            self.etapes.append(mesure)
+    
+    def terminer(self):
+        """Fin de la mesure : arrête tracemalloc si c'était la dernière en cours et qu'une mesure l'a démarré"""
+        global _mesures_tracemalloc, _tracemalloc_demarre
+        if not self.memoire:
+            return
+        self.memoire = False
+        with _VERROU_TRACEMALLOC:
+            _mesures_tracemalloc -= 1
+            if _mesures_tracemalloc == 0 and _tracemalloc_demarre:
+                tracemalloc.stop()
+                _tracemalloc_demarre = False
+
+def ecrire_mesures_jsonl(chemin, nom_fichier, stats):
+    """Ajoute les mesures d'une conversion sous forme d'une ligne JSON"""
+    ligne = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'fichier': nom_fichier,
+        'etapes': stats.get('etapes', [])
+    }
+    with open(chemin, 'a', encoding='utf-8') as fichier:
+        fichier.write(json.dumps(ligne, ensure_ascii=False) + '\n')
+
+class SourceDocument:
+    """
+    Archive .docx ouverte une seule fois et partagée entre les étapes de conversion.
+    
+    Chaque partie de l'archive est décompressée au plus une fois et les parties XML
+    ne sont analysées qu'une seule fois.
+    """
+    
+    def __init__(self, fichier_word_bytes):
+        self.donnees = fichier_word_bytes
+        self._zip = zipfile.ZipFile(BytesIO(fichier_word_bytes), 'r')
+        self._parties = {}
+        self._racines_xml = {}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.fermer()
+    
+    def fermer(self):
+        self._zip.close()
+    
+    def existe(self, nom_partie):
+        try:
+            self._zip.getinfo(nom_partie)
+            return True
+        except KeyError:
+            return False
+    
+    def lire(self, nom_partie):
+        """Retourne le contenu décompressé d'une partie de l'archive"""
+        if nom_partie not in self._parties:
+            self._parties[nom_partie] = self._zip.read(nom_partie)
+        return self._parties[nom_partie]
+    
+    def ouvrir(self, nom_partie):
+        """Ouvre une partie de l'archive en flux, sans la décompresser d'un bloc"""
+        if nom_partie in self._parties:
+            return BytesIO(self._parties[nom_partie])
+        return self._zip.open(nom_partie)
+    
+    def lire_xml(self, nom_partie):
+        """Retourne la racine XML analysée d'une partie de l'archive"""
+        if nom_partie not in self._racines_xml:
+            self._racines_xml[nom_partie] = ET.fromstring(self.lire(nom_partie))
+        return self._racines_xml[nom_partie]
+    
+    def style_map_embarque(self):
+        """Style map mammoth embarqué dans le document, s'il existe"""
+        if self.existe('mammoth/style-map'):
+            return self.lire('mammoth/style-map').decode('utf8')
+        return None
+    
+    def fichier(self):
+        """Fichier en mémoire sur les octets d'origine, pour mammoth"""
+        return BytesIO(self.donnees)
+
+# Balises WordprocessingML utilisées par l'analyse en flux
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+W_P = W_NS + 'p'
+W_T = W_NS + 't'
+W_DRAWING = W_NS + 'drawing'
+W_OBJECT = W_NS + 'object'
+W_PSTYLE = W_NS + 'pStyle'
+W_VAL = W_NS + 'val'
+
+# Références aux images des paragraphes (DrawingML et VML), vers word/_rels/document.xml.rels
+A_BLIP = '{http://schemas.openxmlformats.org/drawingml/2006/main}blip'
+V_IMAGEDATA = '{urn:schemas-microsoft-com:vml}imagedata'
+R_EMBED = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed'
+R_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+def iterer_structure_document(source):
+    """
+    Analyse en flux de word/document.xml (SourceDocument) avec iterparse.
+    
+    Produit un enregistrement par paragraphe, dans le même ordre et avec les mêmes
+    champs que analyser_structure_document, dont son style (w:pStyle, None sans style)
+    et les relations de ses images ('relations_images').
+    Les éléments terminés sont libérés au fur et à mesure pour que la mémoire reste
+    constante quelle que soit la taille du document.
+    Les paragraphes imbriqués (zones de texte) sont émis après leur paragraphe parent.
+    """
+    paragraphes_ouverts = []
+    en_attente = []
+    elements_ouverts = []
+    index = 0
+    
+    with source.ouvrir('word/document.xml') as flux:
+        for evenement, elem in ET.iterparse(flux, events=('start', 'end')):
+            if evenement == 'start':
+                elements_ouverts.append(elem)
+                
+                if elem.tag == W_P:
+                    paragraphe = {'index': index, 'textes': [], 'nb_images': 0, 'style': None, 'relations': []}
+                    index += 1
+                    paragraphes_ouverts.append(paragraphe)
+                    en_attente.append(paragraphe)
+                elif elem.tag == W_DRAWING or elem.tag == W_OBJECT:
+                    for paragraphe in paragraphes_ouverts:
+                        paragraphe['nb_images'] += 1
+                elif (elem.tag == A_BLIP or elem.tag == V_IMAGEDATA) and paragraphes_ouverts:
+                    relation = elem.get(R_EMBED) or elem.get(R_ID)
+                    if relation:
+                        paragraphes_ouverts[-1]['relations'].append(relation)
+                elif elem.tag == W_PSTYLE and paragraphes_ouverts and paragraphes_ouverts[-1]['style'] is None:
+                    # Le premier w:pStyle est celui du paragraphe ; les suivants décrivent des révisions
+                    paragraphes_ouverts[-1]['style'] = elem.get(W_VAL)
+                continue
+            
+            elements_ouverts.pop()
+            
+            if elem.tag == W_T:
+                for paragraphe in paragraphes_ouverts:
+                    paragraphe['textes'].append(elem.text or '')
+            elif elem.tag == W_P:
+                paragraphes_ouverts.pop()
+            
+            if paragraphes_ouverts:
+                continue
+            
+            # Paragraphe de premier niveau terminé : émettre lui et ses paragraphes imbriqués
+            for paragraphe in en_attente:
+                yield {
+                    'type': 'paragraphe',
+                    'index': paragraphe['index'],
+                    'texte': ''.join(paragraphe['textes']).strip(),
+                    'has_image': paragraphe['nb_images'] > 0,
+                    'nb_images': paragraphe['nb_images'],
+                    'style': paragraphe['style'],
+                    'relations_images': paragraphe['relations']
+                }
+            en_attente.clear()
+            
+            # Libérer l'élément terminé
+            elem.clear()
+            if elements_ouverts:
+                elements_ouverts[-1].remove(elem)
+
+def analyser_structure_document(source):
+    """Analyse la structure complète du document Word (SourceDocument) pour préserver l'ordre exact"""
+    return list(iterer_structure_document(source))
+
+def analyser_structure_document_bytes(fichier_word_bytes):
+    """Analyse la structure complète du document Word pour préserver l'ordre exact"""
+    try:
+        with SourceDocument(fichier_word_bytes) as source:
+            return analyser_structure_document(source)
+            
+    except Exception as e:
+        logger.error(f"Erreur lors de l'analyse XML: {e}")
+        return []
+
+# Image de remplacement utilisée pour toutes les images du document
+PLACEHOLDER_IMAGE = "https://picsum.photos/800/600"
+
+# Modes de gestion des images :
+# - 'placeholder' : chaque image est remplacée par PLACEHOLDER_IMAGE
+# - 'inline' : mammoth encode les images en base64, puis elles sont remplacées par PLACEHOLDER_IMAGE
+# - 'export' : les images sont copiées dans un dépôt (dossier_images), nommées par l'empreinte
+#   de leur contenu, et le HTML y fait référence par images/<empreinte>.<extension>
+MODES_IMAGES = ('placeholder', 'inline', 'export')
+
+def nettoyer_images_dans_html(html_content):
+    """Remplace toutes les images avec des données longues par l'image sample"""
+    placeholder_path = PLACEHOLDER_IMAGE
+    pattern_img_longue = r'<img[^>]*src="data:image/[^"]{100,}"[^>]*/?>'
+    images_longues = re.findall(pattern_img_longue, html_content)
+    
+    counter = [1]
+    
+    def remplacer_image(match):
+        img_tag = f'<img src="{placeholder_path}" alt="Image {counter[0]}" class="img-responsive"  />'
+        counter[0] += 1
+        return img_tag
+    
+    html_nettoye = re.sub(pattern_img_longue, remplacer_image, html_content)
+    return html_nettoye, len(images_longues)
+
+def creer_convertisseur_images_placeholder():
+    """
+    Crée un convertisseur d'images pour mammoth qui remplace chaque image par
+    l'image sample au moment de la conversion, sans lire ni encoder ses données.
+    
+    Returns:
+        tuple: (convertisseur à passer à mammoth, compteur [nb_images_remplacees])
+    """
+    import mammoth
+    
+    compteur = [0]
+    
+    def convertir_image(image):
+        compteur[0] += 1
+        return {
+            'src': PLACEHOLDER_IMAGE,
+            'alt': f'Image {compteur[0]}',
+            'class': 'img-responsive'
+        }
+    
+    return mammoth.images.img_element(convertir_image), compteur
+
+def creer_convertisseur_images_export(export):
+    """
+    Crée un convertisseur d'images pour mammoth qui copie chaque image dans le dépôt
+    de export (ExportImages) et y fait référence, sans jamais l'encoder en base64.
+    
+    Returns:
+        tuple: (convertisseur à passer à mammoth, compteur [nb_images_exportees])
+    """
+    import mammoth
+    
+    compteur = [0]
+    
+    def convertir_image(image):
+        compteur[0] += 1
+        try:
+            src = export.src_image_mammoth(image)
+        except Exception as e:
+            logger.warning(f"Image {compteur[0]} non exportée: {e}")
+            src = PLACEHOLDER_IMAGE
+        return {
+            'src': src,
+            'alt': f'Image {compteur[0]}',
+            'class': 'img-responsive'
+        }
+    
+    return mammoth.images.img_element(convertir_image), compteur
+
+# Modes de détection des titres :
+# - 'heuristique' : les paragraphes courts en gras deviennent des <h2> (detecter_et_convertir_titres)
+# - 'styles' : les paragraphes aux styles de titre de Word deviennent des titres dès la conversion
+#   par mammoth ; l'heuristique s'applique ensuite aux paragraphes en gras qui n'ont pas de style titre
+MODES_TITRES = ('heuristique', 'styles')
+
+# Balise produite pour chaque niveau de titre Word en mode 'styles' (Titre 1, Titre 2, puis les suivants)
+BALISES_NIVEAUX_TITRES = ('h2', 'h3', 'h4')
+
+# Nom interne des styles de titre de Word (« heading 1 » quelle que soit la langue de Word)
+MOTIF_NOM_STYLE_TITRE = re.compile(r'^(?:heading|titre)\s*([1-9])$', re.IGNORECASE)
+
+# Nom interne du style du titre de la table des matières : rendu en <h2> pour que la table reste détectée
+NOM_STYLE_TITRE_TABLE_MATIERES = 'toc heading'
+
+# Balises de word/styles.xml utilisées pour reconnaître les styles de titre
+W_STYLE = W_NS + 'style'
+W_TYPE = W_NS + 'type'
+W_STYLE_ID = W_NS + 'styleId'
+W_NAME = W_NS + 'name'
+W_BASED_ON = W_NS + 'basedOn'
+W_PPR_OUTLINE_LVL = W_NS + 'pPr/' + W_NS + 'outlineLvl'
+
+def niveaux_styles_titres(source):
+    """
+    Niveau de titre (1 à 9) de chaque style de paragraphe de titre du document (SourceDocument),
+    par identifiant de style.
+    
+    Un style est un titre si son nom interne est « heading N » ou s'il a un niveau hiérarchique
+    (w:outlineLvl de 0 à 8), le sien ou celui de son style de base (w:basedOn). Le style du
+    titre de la table des matières compte comme un titre de niveau 1.
+    """
+    if not source.existe('word/styles.xml'):
+        return {}
+    
+    styles = {}
+    for style in source.lire_xml('word/styles.xml').iter(W_STYLE):
+        identifiant = style.get(W_STYLE_ID)
+        if style.get(W_TYPE) != 'paragraph' or not identifiant:
+            continue
+        nom = style.find(W_NAME)
+        base = style.find(W_BASED_ON)
+        niveau_plan = style.find(W_PPR_OUTLINE_LVL)
+        styles[identifiant] = (
+            (nom.get(W_VAL) or '').strip().lower() if nom is not None else '',
+            base.get(W_VAL) if base is not None else None,
+            niveau_plan.get(W_VAL) if niveau_plan is not None else None
+        )
+    
+    def niveau(identifiant, vus):
+        if identifiant not in styles or identifiant in vus:
+            return None
+        vus.add(identifiant)
+        nom, base, niveau_plan = styles[identifiant]
+        
+        correspondance = MOTIF_NOM_STYLE_TITRE.match(nom)
+        if correspondance:
+            return int(correspondance.group(1))
+        if nom == NOM_STYLE_TITRE_TABLE_MATIERES:
+            return 1
+        if niveau_plan is not None:
+            # Le niveau 9 est celui du corps de texte
+            return int(niveau_plan) + 1 if niveau_plan.isdigit() and int(niveau_plan) < 9 else None
+        return niveau(base, vus)
+    
+    niveaux = {}
+    for identifiant in styles:
+        niveau_titre = niveau(identifiant, set())
+        if niveau_titre:
+            niveaux[identifiant] = niveau_titre
+    return niveaux
+
+def echapper_identifiant_style(identifiant):
+    """Échappe un identifiant de style pour la syntaxe des style maps de mammoth (p.Identifiant)"""
+    return ''.join(
+        caractere if caractere.isascii() and (caractere.isalpha() or caractere in '-_' or (caractere.isdigit() and position))
+        else '\\' + caractere
+        for position, caractere in enumerate(identifiant)
+    )
+
+def style_map_titres(niveaux):
+    """Style map mammoth qui convertit les paragraphes de chaque style de titre en <h2>, <h3>..."""
+    lignes = []
+    for identifiant, niveau in niveaux.items():
+        balise = BALISES_NIVEAUX_TITRES[min(niveau, len(BALISES_NIVEAUX_TITRES)) - 1]
+        lignes.append(f"p.{echapper_identifiant_style(identifiant)} => {balise}:fresh")
+    return '\n'.join(lignes)
+
+def convertir_docx_avec_images(source, mode_images='placeholder', mesure=None, style_map=None, export=None):
+    """
+    Convertit le document (SourceDocument) avec mammoth selon le mode de gestion des images.
+    
+    Le style map embarqué est lu depuis la source partagée pour que mammoth
+    n'ouvre l'archive qu'une seule fois. style_map s'ajoute avant le style map
+    embarqué et celui de mammoth par défaut.
+    
+    - 'placeholder' : les images sont remplacées pendant la conversion (aucun base64)
+    - 'inline' : mammoth encode les images en base64, puis elles sont remplacées par regex
+    - 'export' : les images sont copiées dans le dépôt de export (ExportImages) pendant la conversion
+    
+    Returns:
+        tuple: (html, nb_images_remplacees)
+    """
+    import mammoth
+    
+    mesure = mesure or MesureEtapes()
+    options_mammoth = {
+        'include_embedded_style_map': False,
+        'embedded_style_map': source.style_map_embarque()
+    }
+    if style_map:
+        options_mammoth['style_map'] = style_map
+    
+    if mode_images == 'placeholder':
+        convertisseur, compteur = creer_convertisseur_images_placeholder()
+        options_mammoth['convert_image'] = convertisseur
+    elif mode_images == 'export':
+        convertisseur, compteur = creer_convertisseur_images_export(export)
+        options_mammoth['convert_image'] = convertisseur
+    elif mode_images != 'inline':
+        raise ValueError(f"Mode d'images inconnu: {mode_images}")
+    
+    with mesure.etape('mammoth'):
+        with source.fichier() as docx_file:
+            result = mammoth.convert_to_html(docx_file, **options_mammoth)
+    
+    with mesure.etape('nettoyage_images'):
+        if mode_images == 'inline':
+            return nettoyer_images_dans_html(result.value)
+        return result.value, compteur[0]
+
+def recuperer_images_manquantes(document, structure_originale, sources_images=None):
+    """
+    Réinsère les images que mammoth n'a pas converties, après le bloc HTML
+    dont le texte correspond au paragraphe XML qui les contenait.
+    
+    sources_images associe les relations d'images des paragraphes à l'adresse de l'image
+    exportée (mode 'export') : les images réinsérées sont alors les images réelles du
+    paragraphe, dans l'ordre de ses relations ; sinon, l'image de remplacement.
+    
+    Le texte des blocs est extrait une seule fois et concaténé dans un index : le premier
+    bloc contenant un mot donné est trouvé par recherche dans cet index puis mémorisé,
+    au lieu de reparcourir tous les blocs pour chaque paragraphe XML.
+    
+    Returns:
+        int: Nombre d'images ajoutées
+    """
+    nb_images_html = sum(1 for _ in document.elements('img'))
+    images_attendues = sum(elem['nb_images'] for elem in structure_originale if elem['has_image'])
+    
+    if nb_images_html >= images_attendues:
+        return 0
+    
+    # Index des blocs candidats (texte de plus de 10 caractères), dans l'ordre du document
+    blocs = []
+    debuts = []
+    textes = []
+    position = 0
+    for para_html in document.elements(('p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6')):
+        # Les blocs de 10 caractères ou moins sont écartés sans extraire leur texte
+        if para_html.longueur_texte <= 10:
+            continue
+        texte_html = para_html.texte().strip()
+        if texte_html and len(texte_html) > 10:
+            texte_minuscule = texte_html.lower()
+            blocs.append(para_html)
+            debuts.append(position)
+            textes.append(texte_minuscule)
+            position += len(texte_minuscule) + 1
+    
+    # Les mots ne contiennent pas d'espaces : le séparateur empêche toute correspondance entre deux blocs
+    texte_index = '\n'.join(textes)
+    premier_bloc_par_mot = {}
+    
+    def premier_bloc(mot):
+        if mot not in premier_bloc_par_mot:
+            offset = texte_index.find(mot)
+            premier_bloc_par_mot[mot] = bisect.bisect_right(debuts, offset) - 1 if offset >= 0 else None
+        return premier_bloc_par_mot[mot]
+    
+    # Position de chaque bloc parmi ses frères et position de la dernière image de chaque parent,
+    # pour savoir en temps constant si un bloc est suivi d'une image
+    position_bloc = {}
+    derniere_image = {}
+    for bloc in blocs:
+        parent = bloc.parent
+        if id(parent) in derniere_image:
+            continue
+        derniere_image[id(parent)] = -1
+        for i, enfant in enumerate(parent.enfants):
+            position_bloc[id(enfant)] = i
+            if enfant.__class__ is not str and enfant.nom == 'img':
+                derniere_image[id(parent)] = i
+    
+    images_ajoutees = nb_images_html
+    nb_images_initial = images_ajoutees
+    for elem_xml in structure_originale:
+        if elem_xml['has_image'] and elem_xml['texte'] and len(elem_xml['texte']) > 10:
+            trouves = [premier_bloc(mot) for mot in elem_xml['texte'][:50].lower().split() if len(mot) > 3]
+            trouves = [index for index in trouves if index is not None]
+            if not trouves:
+                continue
+            
+            para_html = blocs[min(trouves)]
+            parent_id = id(para_html.parent)
+            if position_bloc[id(para_html)] >= derniere_image[parent_id]:
+                nb_a_inserer = max(0, min(elem_xml['nb_images'], images_attendues - images_ajoutees))
+                # Chaque image s'insère juste après le bloc, devant les précédentes : les relations
+                # sont parcourues à rebours pour que les images réelles restent dans leur ordre
+                for rang in reversed(range(nb_a_inserer)):
+                    src = None
+                    if sources_images and rang < len(elem_xml['relations_images']):
+                        src = sources_images.get(elem_xml['relations_images'][rang])
+                    img_tag = Element('img', {
+                        'src': src or PLACEHOLDER_IMAGE,
+                        'alt': f'Image {images_ajoutees + 1}',
+                        'class_': 'img-responsive',
+                        'style': ''
+                    })
+                    para_html.inserer_apres(img_tag)
+                    images_ajoutees += 1
+                    # Les images insérées se placent juste après le bloc
+                    derniere_image[parent_id] = max(derniere_image[parent_id], position_bloc[id(para_html)] + 0.5)
+    
+    return images_ajoutees - nb_images_initial
+
+# Balises dont les attributs sont conservés lors du nettoyage (liens, listes, images, titres)
+BALISES_ATTRIBUTS_PRESERVES = {'img', 'h2', 'span', 'a', 'ul', 'li'}
+
+def supprimer_attributs(tag):
+    """Supprime les attributs de mise en forme d'une balise, sauf pour les balises préservées"""
+    if tag.attributs and tag.nom not in BALISES_ATTRIBUTS_PRESERVES:
+        for attr in ['style', 'class', 'id', 'name']:
+            tag.retirer_attribut(attr)
+
+def supprimer_paragraphe_vide(p, image_apres):
+    """Supprime les paragraphes vides qui ne contiennent ni ne précèdent une image"""
+    if not p.texte().strip() and not p.trouver('img') and not image_apres:
+        p.retirer()
+        return True
+    return False
+
+def nettoyer_div(div):
+    div.deballer()
+
+def nettoyer_ins(ins):
+    ins.remplacer_par(ins.texte())
+
+def marquer_span(span, image_apres):
+    """Ne garde que la classe nowrap des spans, évaluée sur le contenu d'origine"""
+    if span.get('class') != ['nowrap']:
+        span.attributs = None
+        if 'nowrap' in serialiser(span):
+            span.definir_attribut('class', 'nowrap')
+    return False
+
+def nettoyer_span(span):
+    """Remplace par leur texte les spans qui ne sont pas nowrap"""
+    if not span.get('class') or 'nowrap' not in span.get('class', []):
+        span.remplacer_par(span.texte())
+
+# Règles appliquées en entrant dans une balise, avant ses enfants et sur l'arbre d'origine.
+# Elles reçoivent la balise et un booléen indiquant si une image la suit parmi ses frères,
+# et retournent True si la balise a été supprimée.
+REGLES_ENTREE = {
+    'p': supprimer_paragraphe_vide,
+    'span': marquer_span,
+}
+
+# Règles appliquées en sortant d'une balise, une fois ses enfants nettoyés.
+# Les balises sans règle perdent seulement leurs attributs de mise en forme.
+REGLES_SORTIE = {
+    'div': nettoyer_div,
+    'ins': nettoyer_ins,
+    'span': nettoyer_span,
+}
+
+def nettoyer_arbre(document, regles_entree=REGLES_ENTREE, regles_sortie=REGLES_SORTIE, classes_personnalisees=None):
+    """
+    Applique toutes les règles de nettoyage en un seul parcours de l'arbre.
+    
+    Chaque balise est visitée une fois : les règles d'entrée s'appliquent avant ses
+    enfants, les règles de sortie après. Les enfants sont parcourus sur une copie de la
+    liste prise avant toute modification, pour que les balises déballées ne soient
+    pas revisitées.
+    
+    Les classes personnalisées (préparées par preparer_classes_personnalisees) sont
+    ajoutées en sortie, une fois les attributs de la balise nettoyés.
+    """
+    classes_personnalisees = classes_personnalisees or {}
+    
+    def cadre(noeud):
+        enfants = list(noeud.enfants)
+        images_apres = [False] * len(enfants)
+        image_trouvee = False
+        for i in range(len(enfants) - 1, -1, -1):
+            images_apres[i] = image_trouvee
+            if enfants[i].__class__ is not str and enfants[i].nom == 'img':
+                image_trouvee = True
+        return [noeud, enfants, images_apres, 0]
+    
+    pile = [cadre(document)]
+    while pile:
+        noeud, enfants, images_apres, i = pile[-1]
+        
+        if i < len(enfants):
+            pile[-1][3] += 1
+            enfant = enfants[i]
+            if enfant.__class__ is str:
+                continue
+            regle = regles_entree.get(enfant.nom)
+            if regle and regle(enfant, images_apres[i]):
+                continue
+            pile.append(cadre(enfant))
+            continue
+        
+        pile.pop()
+        if noeud is document:
+            continue
+        
+        regle = regles_sortie.get(noeud.nom)
+        if regle:
+            regle(noeud)
+        else:
+            supprimer_attributs(noeud)
+        
+        if noeud.nom in classes_personnalisees:
+            ajouter_classes(noeud, classes_personnalisees[noeud.nom])
+
+# CSS du document HTML autonome, avec style pour les tables de matières
+CSS_DOCUMENT = """
+        body { 
+            font-family: Georgia, "Times New Roman", serif; 
+            line-height: 1.6; 
+            max-width: 800px; 
+            margin: 0 auto; 
+            padding: 20px; 
+            color: #333;
+        }
+        h2 { 
+            color: #2c3e50; 
+            font-size: 1.5em; 
+            margin: 25px 0 15px 0; 
+            padding-bottom: 8px; 
+            border-bottom: 2px solid #3498db; 
+            font-family: Arial, sans-serif;
+        }
+        .sample-img { 
+            max-width: 300px; 
+            height: auto; 
+            border: 2px solid #3498db; 
+            border-radius: 5px;
+            display: block; 
+            margin: 15px 0;
+            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+        }
+        .nowrap { 
+            white-space: nowrap; 
+            color: #2c3e50;
+            font-weight: 500;
+        }
+        strong { 
+            font-weight: bold; 
+            color: #2c3e50; 
+        }
+        p { 
+            margin: 12px 0; 
+            text-align: justify;
+        }
+        /* Styles pour les tables de matières */
+        ul { 
+            margin: 10px 0; 
+            padding-left: 20px;
+        }
+        ul ul { 
+            margin: 5px 0; 
+            padding-left: 25px;
+        }
+        ul ul ul { 
+            margin: 3px 0; 
+            padding-left: 25px;
+        }
+        li { 
+            margin: 3px 0; 
+            line-height: 1.4;
+        }
+        a { 
+            color: #2c3e50; 
+            text-decoration: none;
+            border-bottom: 1px dotted #3498db;
+        }
+        a:hover { 
+            color: #3498db; 
+            border-bottom: 1px solid #3498db;
+        }
+        /* Tables */
+        .table-responsive {
+            overflow-x: auto;
+            margin: 20px 0;
+        }
+        .table {
+            width: 100%;
+            border-collapse: collapse;
+            margin: 10px 0;
+        }
+        .table-bordered {
+            border: 1px solid #ddd;
+        }
+        .table th, .table td {
+            padding: 8px;
+            text-align: left;
+            border: 1px solid #ddd;
+        }
+        .table thead {
+            background-color: #f5f5f5;
+        }
+        caption {
+            caption-side: top;
+            text-align: center;
+            font-weight: bold;
+            margin-bottom: 10px;
+            color: #2c3e50;
+            font-size: 1.1em;
+        }
+        /* Typographie */
+        body {
+            font-feature-settings: "liga", "kern";
+            text-rendering: optimizeLegibility;
+        }
+"""
+
+def analyser_html(html_content, parseur=None):
+    """
+    Construit le modèle de document (modele_document) d'un fragment HTML avec le parseur choisi.
+    
+    lxml place le fragment dans <html><body> : ces balises ne sont pas reprises dans le
+    modèle, pour obtenir le même arbre qu'avec html.parser.
+    """
+    return analyser_modele(html_content, parseur or PARSEUR_HTML_DEFAUT)
+
+def serialiser_contenu(document):
+    """Sérialise les éléments de premier niveau du document, sans le texte vide entre eux"""
+    morceaux = []
+    for element in document.enfants:
+        if element.__class__ is not str:
+            morceaux.append(serialiser(element))
+        elif element.strip():
+            morceaux.append(element)
+    return ''.join(morceaux)
+
+def nom_sortie_html(nom_fichier):
+    """Nom du fichier HTML produit pour un document Word"""
+    return nom_fichier.replace('.docx', '_converted.html')
+
+def generer_document_html(contenu, nom_fichier):
+    """Construit le document HTML autonome (avec CSS) autour du contenu converti"""
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>{nom_fichier} - Converti</title>
+    <style>{CSS_DOCUMENT}    </style>
+</head>
+<body>
+{contenu}
+</body>
+</html>"""
+
+# Sections d'un tableau HTML qui contiennent ses lignes
+SECTIONS_TABLEAU = ('thead', 'tbody', 'tfoot')
+
+def lignes_du_tableau(table):
+    """Lignes <tr> propres au tableau, dans l'ordre, sans celles des tableaux imbriqués"""
+    lignes = []
+    for enfant in table.enfants_elements():
+        if enfant.nom == 'tr':
+            lignes.append(enfant)
+        elif enfant.nom in SECTIONS_TABLEAU:
+            lignes.extend(enfant.enfants_elements('tr'))
+    return lignes
+
+def cellules_de_ligne(ligne):
+    """Cellules <td>/<th> d'une ligne, sans celles des tableaux imbriqués"""
+    return ligne.enfants_elements(('td', 'th'))
+
+def chercher_titre_tableau(table):
+    """Cherche le titre du tableau dans les 5 éléments précédents et le retire du document"""
+    parent = table.parent
+    index = table.index_dans_parent()
+    
+    for position in range(index - 1, max(index - 6, -1), -1):
+        current = parent.enfants[position]
+        if current == '':
+            break
+        texte = (current if current.__class__ is str else current.texte()).strip()
+        if texte and ('table' in texte.lower() or 'tableau' in texte.lower()):
+            # Supprimer l'élément titre pour éviter la duplication
+            parent.retirer_enfant(position)
+            return texte
+    
+    return None
+
+def normaliser_tableau(table):
+    """
+    Met un tableau en forme : classes, caption, première ligne en <thead>, autres lignes en <tbody>.
+    
+    Seules les lignes et cellules propres au tableau sont parcourues, une seule fois : les
+    tableaux imbriqués dans une cellule restent intacts et sont normalisés séparément.
+    Les cellules du corps sont modifiées sur place au lieu d'être recréées.
+    """
+    # Conserver les classes personnalisées après les classes du tableau
+    table.definir_attribut('class', ['table', 'table-bordered'] + [
+        classe for classe in table.get('class', []) if classe not in ('table', 'table-bordered')
+    ])
+    
+    titre_tableau = chercher_titre_tableau(table)
+    
+    # Remplacer le caption existant
+    for caption in table.enfants_elements('caption')[:1]:
+        caption.retirer()
+    
+    table.inserer(0, Element('caption', texte=titre_tableau or "Tableau"))
+    
+    # Relever les lignes avant de retirer les sections existantes qui les contiennent
+    all_rows = lignes_du_tableau(table)
+    for section in table.enfants_elements(SECTIONS_TABLEAU):
+        section.retirer()
+    
+    if not all_rows:
+        return
+    
+    # Première ligne : en-tête de colonnes, réduit au texte de chaque cellule
+    first_row = all_rows[0]
+    thead = Element('thead', {'class': 'well'})
+    header_row = Element('tr')
+    for cell in cellules_de_ligne(first_row):
+        header_row.ajouter(Element('th', {'scope': 'col'}, cell.texte().strip()))
+    thead.ajouter(header_row)
+    table.ajouter(thead)
+    first_row.retirer()
+    
+    # Lignes suivantes : la première cellule devient l'en-tête de ligne, les autres th deviennent td
+    tbody = Element('tbody')
+    for tr in all_rows[1:]:
+        cells = cellules_de_ligne(tr)
+        if cells:
+            first_cell = cells[0]
+            if first_cell.nom == 'th':
+                first_cell.nom = 'td'
+                first_cell.attributs = {'scope': 'row'}
+            else:
+                first_cell.definir_attribut('scope', 'row')
+            
+            for cell in cells[1:]:
+                if cell.nom == 'th':
+                    cell.nom = 'td'
+                    cell.attributs = None
+        
+        tbody.ajouter(tr)
+    
+    table.ajouter(tbody)
+
+def traiter_tableaux(document):
+    """Traitement des tableaux avec récupération du titre"""
+    for table in document.trouver_tous('table'):
+        normaliser_tableau(table)
+        
+        # Envelopper le tableau dans div.table-responsive
+        table.envelopper(Element('div', {'class': 'table-responsive'}))
+
+def compter_par_segment(document, marqueur_segments, compter):
+    """
+    Compte séparément dans chaque segment d'un document dont les segments sont séparés par
+    des paragraphes marqueurs de premier niveau (conversion incrémentale).
+
+    Returns:
+        list: Somme de compter(noeud) sur les nœuds de premier niveau de chaque segment, dans
+        l'ordre des marqueurs ; ce qui précède le premier marqueur n'est pas compté
+    """
+    comptes = []
+    for noeud in document.enfants:
+        if noeud.__class__ is not str and noeud.nom == 'p' and marqueur_segments.fullmatch(noeud.texte()):
+            comptes.append(0)
+        elif comptes:
+            comptes[-1] += compter(noeud)
+    return comptes
+
+def structure_par_segment(structure, marqueur_segments):
+    """Paragraphes de la structure du document répartis entre les segments, comme compter_par_segment"""
+    segments = []
+    for elem in structure:
+        if marqueur_segments.fullmatch(elem['texte']):
+            segments.append([])
+        elif segments:
+            segments[-1].append(elem)
+    return segments
+
+def _compter_elements(noeud, condition):
+    if noeud.__class__ is str:
+        return 0
+    return condition(noeud) + sum(1 for element in noeud.elements() if condition(element))
+
+def _compter_titres(noeud):
+    return _compter_elements(noeud, lambda element: element.nom == 'h2')
+
+def _compter_mots_wrapes(noeud):
+    return _compter_elements(noeud, lambda element: element.nom == 'span' and element.get('class') == ['nowrap'])
+
+def _compter_liens_internes(noeud):
+    return _compter_elements(noeud, lambda element: element.nom == 'a' and (element.get('href') or '').startswith('#'))
+
+def _compter_apostrophes(noeud):
+    """Apostrophes droites que remplace ameliorations_typographiques"""
+    if noeud.__class__ is str:
+        return noeud.count("'")
+    return sum(
+        enfant.count("'")
+        for element in [noeud] + noeud.trouver_tous() if element.nom not in ('script', 'style')
+        for enfant in element.enfants if enfant.__class__ is str
+    )
+
+def convertir_word_vers_html_complet(fichier_word_bytes, nom_fichier, mode_images='placeholder', custom_classes=None,
+                                     mesurer_memoire=False, parseur=None, suivre_etape=None, mode_titres='heuristique',
+                                     dossier_images=None, marqueur_segments=None):
+    """
+    Convertit un fichier Word en HTML avec toutes les fonctionnalités.
+    
+    mode_images choisit la gestion des images (voir MODES_IMAGES). En mode 'export', chaque
+    image est copiée une seule fois dans dossier_images sous le nom de l'empreinte de son
+    contenu, et le HTML y fait référence par un chemin relatif images/<nom> ; l'archive du
+    HTML et de ses images est écrite par export_images.ecrire_html_et_images.
+    
+    parseur choisit le parseur HTML ('lxml' ou 'html.parser') qui construit le modèle de
+    document sur lequel travaillent les étapes ; par défaut lxml s'il est installé. Les deux
+    produisent le même HTML, écrit une seule fois à la fin.
+    
+    mode_titres choisit la détection des titres (voir MODES_TITRES). En mode 'styles', les
+    paragraphes aux styles de titre de Word deviennent des <h2>, <h3>... puis l'heuristique des
+    paragraphes en gras s'applique au reste du document : stats['titres_convertis'] compte les
+    paragraphes de style titre et les titres détectés par l'heuristique.
+    
+    suivre_etape est appelée avec le nom de chaque étape (voir ETAPES_CONVERSION) avant
+    qu'elle commence ; si elle lève ConversionAnnulee, l'exception est propagée.
+    
+    Les mesures de chaque étape (temps réel, temps CPU et, si mesurer_memoire est activé,
+    pic mémoire tracemalloc) sont retournées dans stats['etapes'].
+    
+    marqueur_segments (expression régulière), utilisé par la conversion incrémentale, décrit
+    le texte des paragraphes qui séparent des segments convertis ensemble :
+    stats['compteurs_segments'] donne alors, pour chaque segment dans l'ordre des marqueurs,
+    les compteurs titres_convertis, apostrophes_changees, mots_wrapes, toc_convertie et
+    nb_paragraphes des étapes, pris aux mêmes endroits que ceux du document entier.
+    """
+    mesure = MesureEtapes(memoire=mesurer_memoire, suivre_etape=suivre_etape)
+    try:
+        classes_personnalisees = preparer_classes_personnalisees(custom_classes)
+        
+        if mode_titres not in MODES_TITRES:
+            raise ValueError(f"Mode de titres inconnu: {mode_titres}")
+        if mode_images == 'export' and not dossier_images:
+            raise ValueError("Le mode d'images 'export' demande un dossier_images")
+        
+        with SourceDocument(fichier_word_bytes) as source:
+            export = ExportImages(source, DepotImages(dossier_images)) if mode_images == 'export' else None
+            niveaux_titres = {}
+            with mesure.etape('analyse_xml'):
+                try:
+                    structure_originale = analyser_structure_document(source)
+                    if mode_titres == 'styles':
+                        niveaux_titres = niveaux_styles_titres(source)
+                except Exception as e:
+                    logger.error(f"Erreur lors de l'analyse XML: {e}")
+                    structure_originale = []
+            
+            titres_styles = sum(1 for elem in structure_originale if elem['style'] in niveaux_titres)
+            html_nettoye, nb_images_remplacees = convertir_docx_avec_images(
+                source, mode_images, mesure, style_map_titres(niveaux_titres) if titres_styles else None, export
+            )
+            
+            # Images que mammoth n'a pas converties : exportées tant que l'archive est ouverte,
+            # pour que la récupération des images manquantes réinsère les images réelles
+            sources_images = None
+            if export and nb_images_remplacees < sum(elem['nb_images'] for elem in structure_originale):
+                sources_images = export.sources_relations(
+                    relation for elem in structure_originale for relation in elem['relations_images']
+                )
+        
+        with mesure.etape('analyse_html'):
+            document = analyser_html(html_nettoye, parseur)
+        
+        def par_segment(compter):
+            if marqueur_segments is None:
+                return []
+            return compter_par_segment(document, marqueur_segments, compter)
+        
+        # ÉTAPE 1 : Détecter et convertir les titres
+        with mesure.etape('titres'):
+            titres_avant = par_segment(_compter_titres)
+            titres_convertis = detecter_et_convertir_titres(document)
+            titres_segments = [apres - avant for avant, apres in zip(titres_avant, par_segment(_compter_titres))]
+            if titres_styles:
+                logger.info(f"{titres_styles} titres issus des styles Word")
+                titres_convertis += titres_styles
+        
+        # ÉTAPE 2 : Améliorations typographiques
+        with mesure.etape('typographie'):
+            # Toutes les apostrophes droites sont remplacées
+            apostrophes_segments = par_segment(_compter_apostrophes)
+            wrapes_avant = par_segment(_compter_mots_wrapes)
+            apostrophes_changees, mots_tirets_wrapes = ameliorations_typographiques(document)
+            wrapes_segments = [apres - avant for avant, apres in zip(wrapes_avant, par_segment(_compter_mots_wrapes))]
+        
+        # NOUVELLE ÉTAPE 3 : Conversion des tables de matières
+        with mesure.etape('table_matieres'):
+            liens_avant = par_segment(_compter_liens_internes)
+            toc_convertie = detecter_et_convertir_table_matieres(document)
+            toc_segments = [apres > avant for avant, apres in zip(liens_avant, par_segment(_compter_liens_internes))]
+        
+        # Gestion des images manquantes
+        with mesure.etape('recuperation_images'):
+            recuperer_images_manquantes(document, structure_originale, sources_images)
+        
+        # Nettoyage final et classes CSS personnalisées
+        with mesure.etape('nettoyage'):
+            nettoyer_arbre(document, classes_personnalisees=classes_personnalisees)
+        
+        # Traitement des tableaux avec récupération du titre
+        with mesure.etape('tableaux'):
+            traiter_tableaux(document)
+        
+        # Contenu du body produit directement depuis l'arbre de travail
+        with mesure.etape('serialisation'):
+            clean_content = serialiser_contenu(document)
+        
+        stats = {
+            'nb_images': clean_content.count('<img'),
+            'titres_convertis': titres_convertis,
+            'apostrophes_changees': apostrophes_changees,
+            'mots_wrapes': mots_tirets_wrapes,
+            'toc_convertie': toc_convertie,
+            'nb_paragraphes': len(structure_originale),
+            'etapes': mesure.etapes
+        }
+        if marqueur_segments is not None:
+            stats['compteurs_segments'] = [
+                {
+                    'titres_convertis': titres + sum(1 for elem in segment if elem['style'] in niveaux_titres),
+                    'apostrophes_changees': apostrophes,
+                    'mots_wrapes': wrapes,
+                    'toc_convertie': toc,
+                    'nb_paragraphes': len(segment)
+                }
+                for segment, titres, apostrophes, wrapes, toc in zip(
+                    structure_par_segment(structure_originale, marqueur_segments),
+                    titres_segments, apostrophes_segments, wrapes_segments, toc_segments
+                )
+            ]
+        
+        return clean_content, stats
+    
+    except ConversionAnnulee:
+        raise
+        
+    except Exception as e:
+        logger.exception(f"Erreur lors de la conversion: {e}")
+        return None, None
+    
+    finally:
+        mesure.terminer()
+
+# Nombre de blocs (paragraphes et tableaux de premier niveau) convertis par défaut pour un aperçu
+NB_BLOCS_APERCU = 60
+
+class _FinAnalyse(Exception):
+    """Interrompt l'analyse expat dès que la coupure de l'aperçu est trouvée"""
+
+def fin_element_vide(document_xml, debut_balise):
+    """
+    Fin (exclue) d'un élément vide <w:p/> commençant à debut_balise, None sinon.
+    
+    Pour un élément vide, expat signale la fin de l'élément après sa balise : la position
+    de fin doit être relevée dès la balise ouvrante.
+    """
+    fin_balise = document_xml.index(b'>', debut_balise) + 1
+    return fin_balise if document_xml[fin_balise - 2:fin_balise - 1] == b'/' else None
+
+def tronquer_document_xml(document_xml, nb_blocs):
+    """
+    Garde les nb_blocs premiers paragraphes ou tableaux du corps de word/document.xml,
+    suivis des propriétés de section du document (w:sectPr final).
+    
+    Le XML est coupé au niveau des octets : seul le début du document est analysé et
+    le reste du balisage (espaces de noms, attributs) est conservé tel quel.
+    
+    Returns:
+        tuple: (document_xml tronqué, True si des blocs ont été retirés)
+    """
+    analyseur = expat.ParserCreate()
+    etat = {'profondeur': 0, 'blocs': 0, 'prefixe': '', 'fin_vide': None, 'coupure': None}
+    
+    def debut_element(nom, attributs):
+        etat['profondeur'] += 1
+        if etat['profondeur'] == 2:
+            # Préfixe du corps (w:body), réutilisé pour retrouver le w:sectPr final
+            etat['prefixe'] = nom.rpartition(':')[0]
+        elif etat['profondeur'] == 3:
+            etat['fin_vide'] = fin_element_vide(document_xml, analyseur.CurrentByteIndex)
+    
+    def fin_element(nom):
+        if etat['profondeur'] == 3 and nom.rpartition(':')[2] in ('p', 'tbl'):
+            etat['blocs'] += 1
+            if etat['blocs'] >= nb_blocs:
+                etat['coupure'] = etat['fin_vide'] or document_xml.index(b'>', analyseur.CurrentByteIndex) + 1
+                raise _FinAnalyse()
+        etat['profondeur'] -= 1
+    
+    analyseur.StartElementHandler = debut_element
+    analyseur.EndElementHandler = fin_element
+    
+    try:
+        for position in range(0, len(document_xml), 65536):
+            analyseur.Parse(document_xml[position:position + 65536], False)
+        analyseur.Parse(b'', True)
+    except _FinAnalyse:
+        pass
+    
+    coupure = etat['coupure']
+    if coupure is None:
+        return document_xml, False
+    
+    prefixe = etat['prefixe'].encode('utf-8') + b':' if etat['prefixe'] else b''
+    fin_corps = document_xml.rfind(b'</' + prefixe + b'body>')
+    section = document_xml.rfind(b'<' + prefixe + b'sectPr', coupure, fin_corps)
+    # Un w:sectPr suivi d'un paragraphe appartient à ce paragraphe, pas au document
+    if section == -1 or document_xml.rfind(b'</' + prefixe + b'p>', section, fin_corps) != -1:
+        section = fin_corps
+    
+    if document_xml[coupure:section].strip() == b'':
+        return document_xml, False
+    return document_xml[:coupure] + document_xml[section:], True
+
+def extraire_apercu_docx(fichier_word_bytes, nb_blocs=NB_BLOCS_APERCU, mode_images='placeholder'):
+    """
+    Construit un .docx ne contenant que le début du document.
+    
+    Les autres parties de l'archive sont recopiées sans compression ; en mode
+    'placeholder', les images ne sont jamais lues et ne sont pas recopiées.
+    
+    Returns:
+        tuple: (bytes du .docx d'aperçu, True si le document a été tronqué)
+    """
+    with zipfile.ZipFile(BytesIO(fichier_word_bytes), 'r') as archive:
+        document_xml, tronque = tronquer_document_xml(archive.read('word/document.xml'), nb_blocs)
+        if not tronque:
+            return fichier_word_bytes, False
+        
+        sortie = BytesIO()
+        with zipfile.ZipFile(sortie, 'w', zipfile.ZIP_STORED) as apercu:
+            for info in archive.infolist():
+                if info.filename == 'word/document.xml':
+                    apercu.writestr(info.filename, document_xml)
+                elif mode_images == 'placeholder' and info.filename.startswith('word/media/'):
+                    continue
+                else:
+                    apercu.writestr(info.filename, archive.read(info))
+    
+    return sortie.getvalue(), True
+
+def convertir_apercu(fichier_word_bytes, nom_fichier, nb_blocs=NB_BLOCS_APERCU, **options):
+    """
+    Convertit seulement les nb_blocs premiers paragraphes ou tableaux du document, avec
+    toutes les étapes de la conversion complète.
+    
+    Returns:
+        tuple: (html, stats) comme convertir_word_vers_html_complet ; stats['apercu'] vaut
+        True si le document a été tronqué
+    """
+    try:
+        donnees_apercu, tronque = extraire_apercu_docx(
+            fichier_word_bytes, nb_blocs, options.get('mode_images', 'placeholder')
+        )
+    except Exception as e:
+        logger.error(f"Erreur lors de l'extraction de l'aperçu: {e}")
+        return None, None
+    
+    html, stats = convertir_word_vers_html_complet(donnees_apercu, nom_fichier, **options)
+    if stats:
+        stats['apercu'] = tronque
+    return html, stats
+
+def nettoyer_valeur_classe(class_value):
+    """
+    Nettoie la valeur de classe entrée par l'utilisateur et la divise en classes individuelles.
+    Supprime les attributs 'class=' ou class=" s'ils sont inclus.
+    """
+    cleaned_value = class_value.replace('class=', '').strip()
+    if cleaned_value.startswith('"') and cleaned_value.endswith('"'):
+        cleaned_value = cleaned_value[1:-1]
+    elif cleaned_value.startswith("'") and cleaned_value.endswith("'"):
+        cleaned_value = cleaned_value[1:-1]
+    
+    return cleaned_value.split()
+
+def preparer_classes_personnalisees(custom_classes):
+    """Nettoie une seule fois la valeur de classe de chaque balise personnalisée"""
+    if not custom_classes:
+        return {}
+    return {tag: nettoyer_valeur_classe(class_value) for tag, class_value in custom_classes.items()}
+
+def ajouter_classes(element, new_classes):
+    """Fusionne les nouvelles classes avec les classes existantes de l'élément, sans duplicats"""
+    # Récupérer les classes existantes
+    existing_classes = element.get('class', [])
+    
+    # Convertir en liste si c'est une chaîne ou None
+    if existing_classes is None:
+        existing_classes = []
+    elif isinstance(existing_classes, str):
+        existing_classes = [existing_classes]
+    
+    final_classes = list(existing_classes)
+    for cls in new_classes:
+        if cls not in final_classes:
+            final_classes.append(cls)
+    
+    element.definir_attribut('class', final_classes)
+
+# Fonction pour appliquer les classes personnalisées au HTML
+def appliquer_classes_personnalisees(html_content, custom_classes, parseur=None):
+    """
+    Applique les classes CSS personnalisées aux balises HTML spécifiées.
+    
+    Utilisée pour réappliquer les classes sur un résultat de conversion sans classes,
+    sans relancer la conversion. Toutes les balises sont traitées en un seul parcours.
+    
+    Args:
+        html_content (str): Le contenu HTML à modifier
+        custom_classes (dict): Dictionnaire des balises et leurs classes à appliquer
+        parseur (str): Parseur HTML du modèle de document (par défaut, lxml s'il est installé)
+    
+    Returns:
+        str: Le HTML modifié avec les classes appliquées
+    """
+    if not custom_classes:
+        return html_content
+    
+    try:
+        classes_personnalisees = preparer_classes_personnalisees(custom_classes)
+        
+        # Parser le HTML
+        document = analyser_html(html_content, parseur)
+        
+        # Appliquer les classes à toutes les balises spécifiées en un seul parcours
+        for element in document.elements(classes_personnalisees):
+            ajouter_classes(element, classes_personnalisees[element.nom])
+        
+        # Convertir le document modifié en string
+        return serialiser(document)
+    
+    except Exception as e:
+        # En cas d'erreur, retourner le HTML original
+        logger.error(f"Erreur lors de l'application des classes personnalisées: {e}")
+        return html_content
+
+def lire_classes_cli(valeurs):
+    """Convertit les arguments --classe balise=classes en dictionnaire de classes personnalisées"""
+    custom_classes = {}
+    for valeur in valeurs or []:
+        tag, separateur, class_value = valeur.partition('=')
+        if not separateur or not tag.strip():
+            raise argparse.ArgumentTypeError(f"Classe invalide (attendu balise=classes): {valeur}")
+        custom_classes[tag.strip()] = class_value
+    return custom_classes
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Conversion d'un document Word (.docx) en HTML")
+    parser.add_argument('entree', help="Fichier .docx à convertir")
+    parser.add_argument('-o', '--sortie', help="Fichier HTML produit (par défaut, <nom>_converted.html à côté du document ; "
+                                                "<nom>_converted.zip avec ses images en mode d'images 'export')")
+    parser.add_argument('--document-complet', action='store_true', help="Produire un document HTML autonome avec CSS")
+    parser.add_argument('--mode-images', choices=MODES_IMAGES, default='placeholder',
+                        help="Gestion des images ('export' : archive zip du HTML et des images réelles)")
+    parser.add_argument('--parseur', choices=PARSEURS_HTML, default=None, help=f"Parseur HTML (par défaut, {PARSEUR_HTML_DEFAUT})")
+    parser.add_argument('--mode-titres', choices=MODES_TITRES, default='heuristique',
+                        help="Titres devinés d'après les paragraphes en gras, ou repris des styles de titre Word")
+    parser.add_argument('--apercu', type=int, metavar='N', help="Ne convertir que les N premiers paragraphes ou tableaux")
+    parser.add_argument('--classe', action='append', metavar='BALISE=CLASSES', help="Classes CSS à ajouter à une balise (répétable)")
+    parser.add_argument('--mesures', metavar='FICHIER.jsonl', help="Ajouter les mesures de chaque étape à un fichier JSON lines")
+    parser.add_argument('--mesurer-memoire', action='store_true', help="Mesurer le pic mémoire de chaque étape (plus lent)")
+    parser.add_argument('-v', '--verbeux', action='store_true', help="Afficher les messages d'information")
+    args = parser.parse_args(arguments)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbeux else logging.WARNING,
+        format='%(levelname)s: %(message)s'
+    )
+
+    try:
+        custom_classes = lire_classes_cli(args.classe)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    try:
+        with open(args.entree, 'rb') as fichier:
+            fichier_word_bytes = fichier.read()
+    except OSError as e:
+        logger.error(f"Impossible de lire le document: {e}")
+        return 1
+
+    nom_fichier = os.path.basename(args.entree)
+    if args.apercu:
+        conversion = partial(convertir_apercu, nb_blocs=args.apercu)
+    else:
+        conversion = convertir_word_vers_html_complet
+    
+    with tempfile.TemporaryDirectory() as dossier_images:
+        html, stats = conversion(
+            fichier_word_bytes,
+            nom_fichier,
+            mode_images=args.mode_images,
+            custom_classes=custom_classes,
+            mesurer_memoire=args.mesurer_memoire,
+            parseur=args.parseur,
+            mode_titres=args.mode_titres,
+            dossier_images=dossier_images if args.mode_images == 'export' else None
+        )
+        if not html:
+            return 1
+        
+        if args.mesures:
+            ecrire_mesures_jsonl(args.mesures, nom_fichier, stats)
+
+        if args.document_complet:
+            html = generer_document_html(html, nom_fichier)
+
+        if args.mode_images == 'export':
+            # Archive du HTML et de ses images, écrite tant que le dépôt d'images existe
+            sortie = args.sortie or os.path.splitext(nom_sortie_html(args.entree))[0] + '.zip'
+            with zipfile.ZipFile(sortie, 'w', zipfile.ZIP_DEFLATED) as archive:
+                ecrire_html_et_images(archive, os.path.basename(nom_sortie_html(args.entree)), html, DepotImages(dossier_images), set())
+        else:
+            sortie = args.sortie or nom_sortie_html(args.entree)
+            with open(sortie, 'w', encoding='utf-8') as fichier:
+                fichier.write(html)
+
+    logger.info(f"{nom_fichier} -> {sortie} ({stats['nb_paragraphes']} paragraphes, {stats['nb_images']} images)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import os
+import tempfile
+
+def _lire_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+# Droits donnés aux fichiers écrits, ceux qu'open() leur donnerait : mkstemp crée les fichiers
+# en 0600, ce qui les rendrait illisibles pour les autres utilisateurs (serveur web, partage).
+# L'umask est lu une fois, à l'import, puisque le lire le modifie un instant pour tout le processus
+MODE_FICHIERS = 0o666 & ~_lire_umask()
+
+def creer_fichier_temporaire(dossier, suffixe='.tmp'):
+    """
+    Crée un fichier temporaire dans dossier, destiné à être renommé à sa place définitive.
+
+    Returns:
+        tuple: (descripteur ouvert, chemin), comme tempfile.mkstemp
+    """
+    descripteur, chemin_temporaire = tempfile.mkstemp(dir=dossier, suffix=suffixe)
+    try:
+        os.chmod(chemin_temporaire, MODE_FICHIERS)
+    except BaseException:
+        os.close(descripteur)
+        os.remove(chemin_temporaire)
+        raise
+    return descripteur, chemin_temporaire
+
+def ecrire_fichier_atomique(chemin, contenu):
+    """Écrit un fichier texte sous un nom temporaire puis le renomme : il n'est jamais lu à moitié écrit"""
+    descripteur, chemin_temporaire = creer_fichier_temporaire(os.path.dirname(os.path.abspath(chemin)))
+    try:
+        with os.fdopen(descripteur, 'w', encoding='utf-8') as fichier:
+            fichier.write(contenu)
+        os.replace(chemin_temporaire, chemin)
+    except BaseException:
+        os.remove(chemin_temporaire)
+        raise
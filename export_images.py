@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import time
+import zipfile
+
+from ecriture_fichiers import creer_fichier_temporaire
+
+logger = logging.getLogger(__name__)
+
+# Dossier des images, relatif au HTML, dans l'archive produite
+DOSSIER_IMAGES = 'images'
+
+# Taille des blocs copiés de l'archive .docx vers le dépôt d'images
+TAILLE_BLOC_COPIE = 64 * 1024
+
+# Droits des fichiers dans l'archive (writestr et les fichiers du dépôt donneraient 0600)
+MODE_FICHIERS_ARCHIVE = 0o644
+
+# Références du HTML vers les images exportées
+MOTIF_REFERENCE_IMAGE = re.compile(r'src="' + DOSSIER_IMAGES + r'/([0-9a-f]{64}\.[0-9a-z]+)"')
+
+# Relations de word/document.xml vers les images
+RELATIONS_DOCUMENT = 'word/_rels/document.xml.rels'
+REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+class DepotImages:
+    """
+    Dossier d'images nommées par l'empreinte SHA-256 de leur contenu.
+
+    Une image présente dans plusieurs documents (logo, capture d'écran répétée) n'y est
+    stockée qu'une fois. Le dépôt peut être partagé par les processus d'un lot : chaque image
+    est écrite sous un nom temporaire puis renommée, et deux processus qui écrivent la même
+    image produisent le même fichier.
+    """
+
+    def __init__(self, dossier):
+        self.dossier = dossier
+        os.makedirs(dossier, exist_ok=True)
+
+    def chemin(self, nom):
+        return os.path.join(self.dossier, nom)
+
+    def enregistrer(self, flux, extension):
+        """
+        Copie un flux binaire dans le dépôt, bloc par bloc, en calculant son empreinte.
+
+        Returns:
+            str: Nom de l'image dans le dépôt (empreinte + extension)
+        """
+        empreinte = hashlib.sha256()
+        descripteur, chemin_temporaire = creer_fichier_temporaire(self.dossier)
+        try:
+            with os.fdopen(descripteur, 'wb') as fichier:
+                while True:
+                    bloc = flux.read(TAILLE_BLOC_COPIE)
+                    if not bloc:
+                        break
+                    empreinte.update(bloc)
+                    fichier.write(bloc)
+
+            nom = empreinte.hexdigest() + extension
+            if os.path.exists(self.chemin(nom)):
+                os.remove(chemin_temporaire)
+            else:
+                os.replace(chemin_temporaire, self.chemin(nom))
+        except BaseException:
+            if os.path.exists(chemin_temporaire):
+                os.remove(chemin_temporaire)
+            raise
+        return nom
+
+def extension_image(nom_partie, content_type=None):
+    """Extension du fichier exporté, d'après le nom de la partie ou son type de contenu"""
+    extension = posixpath.splitext(nom_partie or '')[1].lower()
+    if not extension and content_type:
+        extension = mimetypes.guess_extension(content_type) or ''
+    if not re.fullmatch(r'\.[0-9a-z]+', extension):
+        extension = '.bin'
+    return extension
+
+class ExportImages:
+    """
+    Export des images d'un document (SourceDocument) vers un dépôt, pendant sa conversion.
+
+    Chaque partie word/media/* est lue une seule fois, même si le document l'affiche
+    plusieurs fois : les images converties par mammoth et celles réinsérées par
+    recuperer_images_manquantes partagent la même table.
+    """
+
+    def __init__(self, source, depot):
+        self.source = source
+        self.depot = depot
+        self._sources_par_partie = {}
+        self._relations = None
+
+    def src_partie(self, nom_partie, flux=None, content_type=None):
+        """Adresse relative de l'image exportée pour une partie de l'archive"""
+        if nom_partie not in self._sources_par_partie:
+            if flux is None:
+                with self.source.ouvrir(nom_partie) as flux_partie:
+                    nom = self.depot.enregistrer(flux_partie, extension_image(nom_partie, content_type))
+            else:
+                nom = self.depot.enregistrer(flux, extension_image(nom_partie, content_type))
+            self._sources_par_partie[nom_partie] = f'{DOSSIER_IMAGES}/{nom}'
+        return self._sources_par_partie[nom_partie]
+
+    def src_image_mammoth(self, image):
+        """Adresse de l'image d'un élément image de mammoth"""
+        with image.open() as flux:
+            # Les images intégrées sont ouvertes dans l'archive : le flux porte le nom de la partie
+            nom_partie = getattr(flux, 'name', None)
+            if nom_partie is None:
+                return f'{DOSSIER_IMAGES}/{self.depot.enregistrer(flux, extension_image(None, image.content_type))}'
+            return self.src_partie(nom_partie, flux, image.content_type)
+
+    def src_relation(self, identifiant):
+        """Adresse de l'image désignée par une relation de word/document.xml, None si introuvable"""
+        if self._relations is None:
+            self._relations = {}
+            if self.source.existe(RELATIONS_DOCUMENT):
+                for relation in self.source.lire_xml(RELATIONS_DOCUMENT).iter(REL_NS + 'Relationship'):
+                    if relation.get('TargetMode') != 'External':
+                        cible = relation.get('Target', '')
+                        chemin = cible.lstrip('/') if cible.startswith('/') else posixpath.join('word', cible)
+                        self._relations[relation.get('Id')] = posixpath.normpath(chemin)
+
+        nom_partie = self._relations.get(identifiant)
+        if nom_partie is None or not self.source.existe(nom_partie):
+            return None
+        return self.src_partie(nom_partie)
+
+    def sources_relations(self, identifiants):
+        """Adresses des images désignées par des relations, pour celles qui ont pu être exportées"""
+        sources = {}
+        for identifiant in identifiants:
+            if identifiant in sources:
+                continue
+            try:
+                src = self.src_relation(identifiant)
+            except Exception as e:
+                logger.warning(f"Image {identifiant} non exportée: {e}")
+                continue
+            if src:
+                sources[identifiant] = src
+        return sources
+
+def references_images(html):
+    """Noms des images exportées auxquelles le HTML fait référence"""
+    return set(MOTIF_REFERENCE_IMAGE.findall(html))
+
+def ajuster_references_images(html, nom_html):
+    """Références aux images depuis un HTML placé dans un sous-dossier de l'archive"""
+    profondeur = nom_html.replace('\\', '/').count('/')
+    if not profondeur:
+        return html
+    return html.replace(f'src="{DOSSIER_IMAGES}/', f'src="{"../" * profondeur}{DOSSIER_IMAGES}/')
+
+def ecrire_html_et_images(archive, nom_html, html, depot, images_ecrites):
+    """
+    Ajoute un HTML à une archive zip ouverte en écriture, avec les images qu'il référence.
+
+    Les images sont recopiées depuis le dépôt par l'archive, sans passer en mémoire et sans
+    recompression (elles sont déjà compressées) ; images_ecrites garde les noms déjà ajoutés,
+    pour n'écrire chaque image qu'une fois.
+    """
+    info_html = zipfile.ZipInfo(nom_html, time.localtime()[:6])
+    info_html.compress_type = archive.compression
+    info_html.external_attr = MODE_FICHIERS_ARCHIVE << 16
+    archive.writestr(info_html, ajuster_references_images(html, nom_html))
+    for nom in sorted(references_images(html) - images_ecrites):
+        chemin = depot.chemin(nom)
+        info = zipfile.ZipInfo.from_file(chemin, f'{DOSSIER_IMAGES}/{nom}')
+        info.compress_type = zipfile.ZIP_STORED
+        info.external_attr = (info.external_attr & ~(0o777 << 16)) | (MODE_FICHIERS_ARCHIVE << 16)
+        with open(chemin, 'rb') as source, archive.open(info, 'w') as destination:
+            shutil.copyfileobj(source, destination, TAILLE_BLOC_COPIE)
+        images_ecrites.add(nom)
@@ -0,0 +1,379 @@
+"""
+Modèle de document compact sur lequel travaillent les étapes de la conversion.
+
+Le HTML de mammoth est analysé une seule fois en un arbre d'éléments à __slots__ :
+les balises (blocs et éléments en ligne) sont des Element, les textes sont des chaînes
+Python ordinaires rangées dans la liste enfants de leur parent. Chaque Element garde en
+cache la longueur de son texte, recalculée seulement après une modification de ses
+descendants. Le HTML n'est produit qu'à la fin, par serialiser.
+
+L'arbre et le HTML produit sont identiques à ceux de BeautifulSoup avec le même parseur :
+espaces des textes vides réduits, attributs triés et échappés de la même façon, classes
+découpées en liste, éléments vides écrits <img/>. Les commentaires sont ignorés
+(mammoth n'en produit pas).
+"""
+import logging
+from html.parser import HTMLParser
+
+logger = logging.getLogger(__name__)
+
+# Balises sans contenu ni balise fermante, écrites <img/> comme le fait BeautifulSoup
+ELEMENTS_VIDES = frozenset({
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem',
+    'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame',
+    'image', 'isindex', 'nextid', 'spacer'
+})
+
+# Balises dont les textes vides gardent tous leurs espaces
+ELEMENTS_PRESERVANT_ESPACES = frozenset({'pre', 'textarea'})
+
+# Balises ajoutées par lxml autour d'un fragment, absentes du modèle
+ENVELOPPES_LXML = frozenset({'html', 'head', 'body'})
+
+# Espaces ASCII, normalisés comme le fait BeautifulSoup pour les textes vides
+ESPACES_ASCII = ' \n\t\x0c\r'
+
+def morceau_texte(texte):
+    """Crée un morceau de texte ; s'il ne contient que des espaces, il est réduit à une espace ou un saut de ligne"""
+    if not texte.strip(ESPACES_ASCII):
+        return '\n' if '\n' in texte else ' '
+    return texte
+
+class Element:
+    """
+    Balise du modèle de document.
+
+    attributs vaut None quand la balise n'en a pas ; la classe est une liste de noms.
+    Les enfants sont des Element ou des chaînes. Les modifications passent par les
+    méthodes ci-dessous pour tenir à jour les liens parent et le cache de longueur du texte.
+    La racine du document est un Element sans nom.
+    """
+
+    __slots__ = ('nom', 'attributs', 'enfants', 'parent', '_longueur_texte')
+
+    def __init__(self, nom, attributs=None, texte=None):
+        self.nom = nom
+        self.attributs = attributs or None
+        self.enfants = [texte] if texte else []
+        self.parent = None
+        self._longueur_texte = None
+
+    def __repr__(self):
+        return f"<Element {self.nom}>"
+
+    # Attributs
+
+    def get(self, nom, defaut=None):
+        if self.attributs is None:
+            return defaut
+        return self.attributs.get(nom, defaut)
+
+    def definir_attribut(self, nom, valeur):
+        if self.attributs is None:
+            self.attributs = {}
+        self.attributs[nom] = valeur
+
+    def retirer_attribut(self, nom):
+        if self.attributs and nom in self.attributs:
+            del self.attributs[nom]
+            if not self.attributs:
+                self.attributs = None
+
+    # Texte
+
+    @property
+    def longueur_texte(self):
+        """Longueur du texte de l'élément, gardée en cache jusqu'à la prochaine modification"""
+        if self._longueur_texte is None:
+            self._longueur_texte = sum(
+                len(enfant) if enfant.__class__ is str else enfant.longueur_texte
+                for enfant in self.enfants
+            )
+        return self._longueur_texte
+
+    def texte(self):
+        """Texte de l'élément et de tous ses descendants, comme get_text()"""
+        if self.longueur_texte == 0:
+            return ''
+        morceaux = []
+        pile = [iter(self.enfants)]
+        while pile:
+            for enfant in pile[-1]:
+                if enfant.__class__ is str:
+                    morceaux.append(enfant)
+                elif enfant._longueur_texte != 0:
+                    pile.append(iter(enfant.enfants))
+                    break
+            else:
+                pile.pop()
+        return ''.join(morceaux)
+
+    def _modifie(self):
+        """Invalide le cache de longueur du texte de l'élément et de ses ancêtres"""
+        element = self
+        while element is not None and element._longueur_texte is not None:
+            element._longueur_texte = None
+            element = element.parent
+
+    # Parcours
+
+    def elements(self, noms=None):
+        """Éléments descendants dans l'ordre du document, limités aux balises noms si précisé"""
+        if isinstance(noms, str):
+            noms = (noms,)
+        pile = [iter(self.enfants)]
+        while pile:
+            for enfant in pile[-1]:
+                if enfant.__class__ is not str:
+                    if noms is None or enfant.nom in noms:
+                        yield enfant
+                    if enfant.enfants:
+                        pile.append(iter(enfant.enfants))
+                        break
+            else:
+                pile.pop()
+
+    def trouver_tous(self, noms=None):
+        """Liste des éléments descendants, comme find_all() : les modifications suivantes ne la changent pas"""
+        return list(self.elements(noms))
+
+    def trouver(self, noms):
+        """Premier élément descendant de l'une des balises noms, None sinon"""
+        return next(self.elements(noms), None)
+
+    def enfants_elements(self, noms=None):
+        """Enfants directs qui sont des éléments, limités aux balises noms si précisé"""
+        if isinstance(noms, str):
+            noms = (noms,)
+        return [
+            enfant for enfant in self.enfants
+            if enfant.__class__ is not str and (noms is None or enfant.nom in noms)
+        ]
+
+    def element_suivant(self):
+        """Premier élément frère qui suit l'élément, None s'il n'y en a pas"""
+        enfants = self.parent.enfants
+        for i in range(self.index_dans_parent() + 1, len(enfants)):
+            if enfants[i].__class__ is not str:
+                return enfants[i]
+        return None
+
+    def index_dans_parent(self):
+        for i, enfant in enumerate(self.parent.enfants):
+            if enfant is self:
+                return i
+        raise ValueError(f"{self!r} absent de son parent")
+
+    # Modifications
+
+    def _adopter(self, noeud):
+        if noeud.__class__ is not str:
+            if noeud.parent is not None:
+                noeud.retirer()
+            noeud.parent = self
+        return noeud
+
+    def ajouter(self, noeud):
+        self.enfants.append(self._adopter(noeud))
+        self._modifie()
+
+    def inserer(self, index, noeud):
+        self.enfants.insert(index, self._adopter(noeud))
+        self._modifie()
+
+    def remplacer_enfants(self, enfants):
+        """Remplace tous les enfants de l'élément"""
+        for enfant in self.enfants:
+            if enfant.__class__ is not str:
+                enfant.parent = None
+        self.enfants = []
+        for enfant in enfants:
+            self.enfants.append(self._adopter(enfant))
+        self._modifie()
+
+    def vider(self):
+        self.remplacer_enfants(())
+
+    def inserer_apres(self, noeud):
+        """Insère un élément ou un texte juste après l'élément"""
+        self.parent.inserer(self.index_dans_parent() + 1, noeud)
+
+    def retirer_enfant(self, index):
+        """Retire l'enfant (élément ou texte) à la position index et le retourne"""
+        enfant = self.enfants.pop(index)
+        if enfant.__class__ is not str:
+            enfant.parent = None
+        self._modifie()
+        return enfant
+
+    def retirer(self):
+        """Détache l'élément de son parent"""
+        if self.parent is not None:
+            self.parent.retirer_enfant(self.index_dans_parent())
+        return self
+
+    def remplacer_par(self, *noeuds):
+        """Remplace l'élément par des éléments ou des textes"""
+        parent = self.parent
+        index = self.index_dans_parent()
+        del parent.enfants[index]
+        self.parent = None
+        parent.enfants[index:index] = [parent._adopter(noeud) for noeud in noeuds]
+        parent._modifie()
+
+    def deballer(self):
+        """Remplace l'élément par ses enfants"""
+        enfants = self.enfants
+        self.enfants = []
+        self._longueur_texte = None
+        for enfant in enfants:
+            if enfant.__class__ is not str:
+                enfant.parent = None
+        self.remplacer_par(*enfants)
+
+    def envelopper(self, enveloppe):
+        """Place l'élément dans enveloppe, à sa position actuelle"""
+        self.remplacer_par(enveloppe)
+        enveloppe.ajouter(self)
+        return enveloppe
+
+class ConstructeurModele:
+    """
+    Construit le modèle à partir des événements d'un analyseur HTML (interface cible de lxml).
+
+    Les textes consécutifs sont réunis, les éléments vides sont fermés dès leur balise
+    ouvrante et une balise fermante referme l'élément ouvert de même nom le plus proche,
+    comme le fait BeautifulSoup.
+    """
+
+    def __init__(self, ignorer_enveloppes=False):
+        self.racine = Element(None)
+        self._pile = [self.racine]
+        self._noms_ouverts = []
+        self._textes = []
+        self._ignorer_enveloppes = ignorer_enveloppes
+
+    def _terminer_texte(self):
+        if not self._textes:
+            return
+        texte = ''.join(self._textes)
+        self._textes = []
+        if not texte.strip(ESPACES_ASCII) and ELEMENTS_PRESERVANT_ESPACES.isdisjoint(self._noms_ouverts):
+            texte = '\n' if '\n' in texte else ' '
+        self._pile[-1].enfants.append(texte)
+
+    def start(self, nom, attributs, nsmap=None):
+        if self._ignorer_enveloppes and nom in ENVELOPPES_LXML:
+            return
+        self._terminer_texte()
+
+        attributs = dict(attributs)
+        if 'class' in attributs:
+            attributs['class'] = attributs['class'].split()
+        element = Element(nom, attributs)
+        element.parent = self._pile[-1]
+        self._pile[-1].enfants.append(element)
+
+        if nom not in ELEMENTS_VIDES:
+            self._pile.append(element)
+            self._noms_ouverts.append(nom)
+
+    def end(self, nom):
+        if nom in ELEMENTS_VIDES or (self._ignorer_enveloppes and nom in ENVELOPPES_LXML):
+            return
+        self._terminer_texte()
+
+        for position in range(len(self._noms_ouverts) - 1, -1, -1):
+            if self._noms_ouverts[position] == nom:
+                del self._noms_ouverts[position:]
+                del self._pile[position + 1:]
+                return
+
+    def data(self, texte):
+        self._textes.append(texte)
+
+    def comment(self, texte):
+        pass
+
+    def close(self):
+        self._terminer_texte()
+        return self.racine
+
+class AnalyseurHTMLStandard(HTMLParser):
+    """Transmet les événements de html.parser au constructeur du modèle"""
+
+    def __init__(self, constructeur):
+        super().__init__(convert_charrefs=True)
+        self.constructeur = constructeur
+
+    def handle_starttag(self, nom, attributs):
+        self.constructeur.start(nom, {cle: '' if valeur is None else valeur for cle, valeur in attributs})
+
+    def handle_endtag(self, nom):
+        self.constructeur.end(nom)
+
+    def handle_data(self, texte):
+        self.constructeur.data(texte)
+
+def analyser_modele(html_content, parseur):
+    """
+    Construit le modèle d'un fragment HTML avec le parseur choisi ('lxml' ou 'html.parser').
+
+    Returns:
+        Element: La racine du document
+    """
+    if parseur == 'lxml':
+        from lxml import etree
+        constructeur = ConstructeurModele(ignorer_enveloppes=True)
+        analyseur = etree.HTMLParser(target=constructeur)
+        analyseur.feed(html_content)
+        return analyseur.close()
+
+    if parseur != 'html.parser':
+        raise ValueError(f"Parseur HTML inconnu: {parseur}")
+
+    constructeur = ConstructeurModele()
+    analyseur = AnalyseurHTMLStandard(constructeur)
+    analyseur.feed(html_content)
+    analyseur.close()
+    return constructeur.close()
+
+def echapper_texte(texte):
+    return texte.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def ecrire_attribut(nom, valeur):
+    """Écrit un attribut entre guillemets doubles, ou simples si la valeur contient des guillemets doubles"""
+    if isinstance(valeur, list):
+        valeur = ' '.join(valeur)
+    valeur = echapper_texte(valeur)
+    if '"' in valeur:
+        if "'" in valeur:
+            return f' {nom}="{valeur.replace(chr(34), "&quot;")}"'
+        return f" {nom}='{valeur}'"
+    return f' {nom}="{valeur}"'
+
+def serialiser(noeud):
+    """HTML d'un élément (ou, pour la racine, de son contenu)"""
+    morceaux = []
+
+    def ecrire(element):
+        if element.nom is not None:
+            attributs = ''.join(
+                ecrire_attribut(nom, valeur) for nom, valeur in sorted(element.attributs.items())
+            ) if element.attributs else ''
+            if not element.enfants and element.nom in ELEMENTS_VIDES:
+                morceaux.append(f'<{element.nom}{attributs}/>')
+                return
+            morceaux.append(f'<{element.nom}{attributs}>')
+
+        for enfant in element.enfants:
+            if enfant.__class__ is str:
+                morceaux.append(echapper_texte(enfant))
+            else:
+                ecrire(enfant)
+
+        if element.nom is not None:
+            morceaux.append(f'</{element.nom}>')
+
+    ecrire(noeud)
+    return ''.join(morceaux)
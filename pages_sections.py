@@ -0,0 +1,303 @@
+"""
+Découpage du HTML converti en pages, une par section (<h2> de premier niveau), avec un index.
+
+Usage :
+    python pages_sections.py document_converted.html                 # archive document_converted_pages.zip
+    python pages_sections.py document_converted.html -o pages.zip --nom document.docx
+
+Les liens internes (table des matières, notes) sont réécrits vers la page qui contient leur
+cible. Chaque entrée de la table des matières produite par la conversion (#1, #4.2...) est
+reliée au premier titre, paragraphe ou élément de liste qui porte le même texte : cet élément
+reçoit l'identifiant de l'entrée ; une entrée sans cible renvoie à la page de l'entrée reliée
+qui la précède. L'index reprend la table des matières et la liste des pages.
+"""
+import argparse
+import bisect
+import logging
+import os
+import re
+import sys
+import zipfile
+
+from conversion_word import analyser_html, generer_document_html, nom_sortie_html
+from modele_document import echapper_texte, serialiser
+
+logger = logging.getLogger(__name__)
+
+# Préfixe des identifiants donnés aux titres de section qui n'en ont pas
+PREFIXE_ANCRE_SECTION = 'section-'
+
+# Éléments auxquels une entrée de la table des matières peut renvoyer (les titres de
+# chapitres numérotés sont souvent un élément de liste en gras)
+BALISES_CIBLES_TOC = ('h2', 'h3', 'h4', 'h5', 'h6', 'li', 'p', 'strong')
+
+# Numérotation ajoutée par convertir_liste_en_toc devant le texte des entrées (« 4.2&nbsp;Rôles »)
+MOTIF_NUMERO_TOC = re.compile(r'^\d+(?:\.\d+)*\.?(?:&nbsp;|\s)*')
+
+# Titre de la section qui précède le premier <h2>
+TITRE_SECTION_DEBUT = 'Début du document'
+
+class Section:
+    """Éléments de premier niveau d'une page, du <h2> qui l'ouvre jusqu'au suivant"""
+
+    __slots__ = ('titre', 'noeuds', 'nom_page', 'ancre')
+
+    def __init__(self, titre, nom_page, ancre=None):
+        self.titre = titre
+        self.noeuds = []
+        self.nom_page = nom_page
+        self.ancre = ancre
+
+    def contenu(self):
+        """HTML de la section, écrit comme serialiser_contenu"""
+        morceaux = []
+        for noeud in self.noeuds:
+            if noeud.__class__ is not str:
+                morceaux.append(serialiser(noeud))
+            elif noeud.strip():
+                morceaux.append(noeud)
+        return ''.join(morceaux)
+
+def normaliser_titre(texte):
+    return ' '.join(MOTIF_NUMERO_TOC.sub('', texte.replace('\xa0', ' ').strip()).split()).lower()
+
+def noms_pages(nom_fichier):
+    """Nom de l'index (le nom habituel du HTML converti) et modèle du nom des pages"""
+    nom_index = os.path.basename(nom_sortie_html(nom_fichier))
+    base = nom_index[:-len('.html')] if nom_index.endswith('.html') else nom_index
+    return nom_index, base + '_{:03d}.html'
+
+def decouper_sections(document, modele_nom_page='section_{:03d}.html'):
+    """
+    Répartit les éléments de premier niveau du document entre des sections commençant
+    chacune à un <h2> ; le contenu qui précède le premier <h2> forme une première section.
+    Les titres de section reçoivent un identifiant s'ils n'en ont pas.
+    """
+    sections = []
+    for noeud in document.enfants:
+        if noeud.__class__ is not str and noeud.nom == 'h2':
+            numero = len(sections) + 1
+            ancre = noeud.get('id')
+            if not ancre:
+                ancre = f'{PREFIXE_ANCRE_SECTION}{numero}'
+                noeud.definir_attribut('id', ancre)
+            sections.append(Section(noeud.texte().strip() or f'Section {numero}', modele_nom_page.format(numero), ancre))
+        elif not sections:
+            sections.append(Section(TITRE_SECTION_DEBUT, modele_nom_page.format(1)))
+        sections[-1].noeuds.append(noeud)
+    return sections
+
+def relier_table_matieres(document):
+    """
+    Donne à la cible de chaque lien de la table des matières l'identifiant de ce lien.
+    
+    Les entrées et leurs cibles doivent se suivre dans le même ordre : parmi les occurrences
+    de chaque titre, on retient l'alignement qui relie le plus d'entrées (plus longue
+    sous-suite croissante), pour que les titres répétés (« Options de filtrage » dans
+    plusieurs chapitres) renvoient chacun à leur chapitre et qu'une correspondance isolée
+    ne décale pas les suivantes.
+
+    Returns:
+        tuple: (liste de la table des matières, None si le document n'en a pas ; couples
+        (lien sans cible, lien relié qui le précède ou None) pour diriger_entrees_non_reliees)
+    """
+    liens = [
+        lien for lien in document.elements('a')
+        if (lien.get('href') or '').startswith('#') and lien.parent is not None and lien.parent.nom == 'li'
+    ]
+    if not liens:
+        return None, []
+
+    # La table des matières est la liste qui contient les liens ; ses propres éléments ne sont pas des cibles
+    table = liens[0].parent
+    while table.parent is not None and table.parent.nom in ('ul', 'ol', 'li'):
+        table = table.parent
+    dans_table = {id(element) for element in table.elements()}
+    dans_table.add(id(table))
+
+    titres = [normaliser_titre(lien.texte()) for lien in liens]
+    longueur_max = max(map(len, titres), default=0) * 2 + 20
+
+    # Positions des occurrences de chaque titre dans l'ordre du document ; un <li> précède
+    # son <strong> et l'emporte donc quand les deux portent le titre
+    occurrences = {titre: [] for titre in titres if titre}
+    cibles = []
+    for element in document.elements(BALISES_CIBLES_TOC):
+        if id(element) in dans_table or element.longueur_texte > longueur_max:
+            continue
+        titre = normaliser_titre(element.texte())
+        if titre in occurrences:
+            occurrences[titre].append(len(cibles))
+            cibles.append(element)
+
+    # Plus longue sous-suite croissante des couples (entrée, position) : les positions d'une
+    # même entrée sont parcourues à rebours pour qu'une entrée ne soit reliée qu'une fois
+    couples = []
+    precedent = []
+    fins = []
+    couples_fins = []
+    for rang, titre in enumerate(titres):
+        for position in reversed(occurrences.get(titre, ())):
+            longueur = bisect.bisect_left(fins, position)
+            precedent.append(couples_fins[longueur - 1] if longueur else -1)
+            couples.append((rang, position))
+            if longueur == len(fins):
+                fins.append(position)
+                couples_fins.append(len(couples) - 1)
+            else:
+                fins[longueur] = position
+                couples_fins[longueur] = len(couples) - 1
+
+    alignement = []
+    courant = couples_fins[-1] if couples_fins else -1
+    while courant != -1:
+        alignement.append(couples[courant])
+        courant = precedent[courant]
+
+    for rang, position in reversed(alignement):
+        lien = liens[rang]
+        element = cibles[position]
+        ancre = element.get('id')
+        if not ancre:
+            ancre = lien.get('href')[1:]
+            element.definir_attribut('id', ancre)
+        lien.definir_attribut('href', '#' + ancre)
+
+    relies = {rang for rang, _ in alignement}
+    non_relies = []
+    precedent = None
+    for rang, lien in enumerate(liens):
+        if rang in relies:
+            precedent = lien
+        else:
+            non_relies.append((lien, precedent))
+    return table, non_relies
+
+def element_de_premier_niveau(element):
+    while element.parent is not None and element.parent.parent is not None:
+        element = element.parent
+    return element
+
+def reecrire_liens_internes(document, sections):
+    """Fait pointer les liens #ancre vers la page de la section qui contient l'ancre"""
+    page_par_noeud = {id(noeud): section.nom_page for section in sections for noeud in section.noeuds}
+    page_par_ancre = {}
+    for element in document.elements():
+        ancre = element.get('id')
+        if ancre and ancre not in page_par_ancre:
+            page_par_ancre[ancre] = page_par_noeud[id(element_de_premier_niveau(element))]
+
+    for lien in document.elements('a'):
+        href = lien.get('href') or ''
+        if href.startswith('#') and href[1:] in page_par_ancre:
+            lien.definir_attribut('href', page_par_ancre[href[1:]] + href)
+
+def diriger_entrees_non_reliees(non_relies, sections):
+    """
+    Fait pointer les entrées de la table des matières sans cible vers la page de l'entrée
+    reliée qui les précède (la première page s'il n'y en a pas), après reecrire_liens_internes
+    """
+    for lien, precedent in non_relies:
+        page = precedent.get('href').partition('#')[0] if precedent is not None else ''
+        lien.definir_attribut('href', page or sections[0].nom_page)
+
+def navigation(sections, position, nom_index):
+    """Liens vers la page précédente, l'index et la page suivante"""
+    liens = []
+    if position > 0:
+        liens.append(f'<a href="{sections[position - 1].nom_page}" rel="prev">← {echapper_texte(sections[position - 1].titre)}</a>')
+    liens.append(f'<a href="{nom_index}">Sommaire</a>')
+    if position + 1 < len(sections):
+        liens.append(f'<a href="{sections[position + 1].nom_page}" rel="next">{echapper_texte(sections[position + 1].titre)} →</a>')
+    return f'<nav class="navigation-sections">{" | ".join(liens)}</nav>'
+
+def generer_index(sections, table_matieres):
+    """Contenu de l'index : table des matières reliée aux pages, puis liste des pages"""
+    morceaux = []
+    if table_matieres is not None:
+        morceaux.append('<h2>Table des matières</h2>')
+        morceaux.append(serialiser(table_matieres))
+    morceaux.append('<h2>Pages</h2><ol class="index-sections">')
+    for section in sections:
+        cible = f'{section.nom_page}#{section.ancre}' if section.ancre else section.nom_page
+        morceaux.append(f'<li><a href="{cible}">{echapper_texte(section.titre)}</a></li>')
+    morceaux.append('</ol>')
+    return ''.join(morceaux)
+
+def analyser_sections(html_content, nom_fichier, parseur=None):
+    """
+    Découpe le HTML converti en sections et relie ses liens internes aux pages.
+
+    Returns:
+        tuple: (sections, contenu HTML de l'index)
+    """
+    nom_index, modele_nom_page = noms_pages(nom_fichier)
+    document = analyser_html(html_content, parseur)
+    table_matieres, non_relies = relier_table_matieres(document)
+    sections = decouper_sections(document, modele_nom_page)
+    reecrire_liens_internes(document, sections)
+    diriger_entrees_non_reliees(non_relies, sections)
+    return sections, generer_index(sections, table_matieres)
+
+def assembler_pages(sections, index, nom_fichier, document_complet=True):
+    """
+    Pages HTML à partir du résultat de analyser_sections : l'index puis une page par section.
+
+    Returns:
+        list: Couples (nom de la page, HTML) ; l'index porte le nom habituel du HTML converti
+    """
+    nom_index, _ = noms_pages(nom_fichier)
+
+    def page(contenu, titre):
+        return generer_document_html(contenu, f'{nom_fichier} - {titre}') if document_complet else contenu
+
+    pages = [(nom_index, page(index, 'Sommaire'))]
+    for position, section in enumerate(sections):
+        nav = navigation(sections, position, nom_index)
+        pages.append((section.nom_page, page(nav + section.contenu() + nav, section.titre)))
+    return pages
+
+def generer_pages_sections(html_content, nom_fichier, document_complet=True, parseur=None):
+    """
+    Pages HTML d'un document converti : l'index puis une page par section.
+
+    Args:
+        html_content (str): HTML produit par convertir_word_vers_html_complet
+        nom_fichier (str): Nom du document Word
+        document_complet (bool): Pages HTML autonomes avec CSS (generer_document_html)
+
+    Returns:
+        list: Couples (nom de la page, HTML), comme assembler_pages
+    """
+    sections, index = analyser_sections(html_content, nom_fichier, parseur)
+    return assembler_pages(sections, index, nom_fichier, document_complet)
+
+def ecrire_pages_zip(pages, fichier_zip):
+    """Écrit les pages dans une archive zip (chemin ou fichier ouvert en écriture binaire)"""
+    with zipfile.ZipFile(fichier_zip, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for nom_page, html_page in pages:
+            archive.writestr(nom_page, html_page)
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Découpage d'un HTML converti en pages par section")
+    parser.add_argument('entree', help="HTML produit par la conversion (_converted.html)")
+    parser.add_argument('-o', '--sortie', help="Archive zip des pages (par défaut, <entrée>_pages.zip)")
+    parser.add_argument('--nom', help="Nom du document Word d'origine (par défaut, déduit de l'entrée)")
+    parser.add_argument('--contenu-seul', action='store_true', help="Pages sans en-tête HTML ni CSS")
+    args = parser.parse_args(arguments)
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s')
+
+    with open(args.entree, 'r', encoding='utf-8') as fichier:
+        html_content = fichier.read()
+
+    nom_fichier = args.nom or os.path.basename(args.entree).replace('_converted.html', '.docx')
+    pages = generer_pages_sections(html_content, nom_fichier, not args.contenu_seul)
+
+    sortie = args.sortie or os.path.splitext(args.entree)[0] + '_pages.zip'
+    ecrire_pages_zip(pages, sortie)
+    print(f"{len(pages) - 1} page(s) et un index -> {sortie}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
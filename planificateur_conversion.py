@@ -0,0 +1,138 @@
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Mémoire de travail d'une conversion par octet de .docx : le modèle de document de mammoth
+# et son HTML occupent plusieurs centaines de fois la taille du document compressé
+FACTEUR_MEMOIRE = 400
+
+# Secondes entre deux vérifications d'une conversion en attente : suivre_attente est rappelée
+# à chaque vérification, ce qui borne le délai de prise en compte d'une annulation
+INTERVALLE_ATTENTE = 0.5
+
+class DocumentTropVolumineux(Exception):
+    """Le document dépasse la taille maximale acceptée : il est refusé avant toute conversion"""
+
+class FileConversionPleine(Exception):
+    """La file d'attente des conversions est pleine"""
+
+class PlanificateurConversion:
+    """
+    Contrôle d'admission des conversions, partagé par toutes les sessions d'un processus.
+
+    - Les documents plus gros que taille_max_document sont refusés avant toute conversion.
+    - Au plus max_conversions conversions s'exécutent en même temps, et la somme de leur
+      mémoire estimée (taille du document × facteur_memoire) reste sous budget_memoire.
+      Un document dont l'estimation dépasse le budget à lui seul attend que toutes les
+      autres conversions soient terminées.
+    - Les conversions en surnombre attendent dans une file FIFO bornée à taille_max_file.
+    """
+
+    def __init__(self, max_conversions=2, budget_memoire=2048 * 1024 * 1024,
+                 taille_max_document=20 * 1024 * 1024, taille_max_file=10, facteur_memoire=FACTEUR_MEMOIRE):
+        self.max_conversions = max(1, max_conversions)
+        self.budget_memoire = budget_memoire
+        self.taille_max_document = taille_max_document
+        self.taille_max_file = taille_max_file
+        self.facteur_memoire = facteur_memoire
+
+        self._condition = threading.Condition()
+        self._file = deque()
+        self._en_cours = 0
+        self._memoire_reservee = 0
+
+    def estimer_memoire(self, taille_document):
+        """Mémoire estimée d'une conversion, plafonnée au budget total"""
+        return min(taille_document * self.facteur_memoire, self.budget_memoire)
+
+    def verifier_admission(self, taille_document):
+        """Refuse un document trop volumineux, avant même de lire son contenu"""
+        if taille_document > self.taille_max_document:
+            raise DocumentTropVolumineux(
+                f"Le document fait {taille_document / (1024 * 1024):.1f} Mo, "
+                f"la taille maximale est de {self.taille_max_document / (1024 * 1024):.0f} Mo"
+            )
+
+    def etat(self):
+        """Nombre de conversions en cours, en attente et mémoire réservée"""
+        with self._condition:
+            return {
+                'en_cours': self._en_cours,
+                'en_attente': len(self._file),
+                'memoire_reservee': self._memoire_reservee,
+            }
+
+    @contextmanager
+    def creneau(self, taille_document, nb_conversions=1, suivre_attente=None):
+        """
+        Attend son tour puis réserve un créneau de conversion pour la durée du bloc.
+
+        Args:
+            taille_document (int): Taille du document (ou somme des documents traités en même temps)
+            nb_conversions (int): Nombre de conversions simultanées occupées (processus d'un lot) ;
+                pour un lot, la taille sert seulement à estimer la mémoire réservée : chaque
+                document a déjà été vérifié par verifier_admission
+            suivre_attente (callable): Appelée avec la position dans la file (1 = prochaine
+                conversion lancée) à chaque vérification pendant l'attente, même si la position
+                n'a pas changé ; une exception levée par cette fonction (annulation) abandonne
+                l'attente et libère aussitôt la place dans la file
+
+        Raises:
+            DocumentTropVolumineux: Le document (conversion seule) dépasse la taille maximale
+            FileConversionPleine: Trop de conversions attendent déjà
+        """
+        if nb_conversions <= 1:
+            self.verifier_admission(taille_document)
+        memoire = self.estimer_memoire(taille_document)
+        nb_conversions = min(max(1, nb_conversions), self.max_conversions)
+        ticket = object()
+
+        with self._condition:
+            if len(self._file) >= self.taille_max_file:
+                raise FileConversionPleine(
+                    f"{len(self._file)} conversions sont déjà en attente, réessayez dans quelques instants"
+                )
+            self._file.append(ticket)
+
+        try:
+            with self._condition:
+                while not (self._file[0] is ticket and self._peut_demarrer(memoire, nb_conversions)):
+                    if suivre_attente:
+                        # Ne pas garder le verrou pendant le suivi (affichage, test d'annulation)
+                        position = self._file.index(ticket) + 1
+                        self._condition.release()
+                        try:
+                            suivre_attente(position)
+                        finally:
+                            self._condition.acquire()
+                        if self._file[0] is ticket and self._peut_demarrer(memoire, nb_conversions):
+                            break
+                    self._condition.wait(timeout=INTERVALLE_ATTENTE)
+
+                self._file.popleft()
+                self._en_cours += nb_conversions
+                self._memoire_reservee += memoire
+                self._condition.notify_all()
+        except BaseException:
+            with self._condition:
+                if ticket in self._file:
+                    self._file.remove(ticket)
+                    self._condition.notify_all()
+            raise
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._en_cours -= nb_conversions
+                self._memoire_reservee -= memoire
+                self._condition.notify_all()
+
+    def _peut_demarrer(self, memoire, nb_conversions):
+        if self._en_cours == 0:
+            return True
+        return (self._en_cours + nb_conversions <= self.max_conversions and
+                self._memoire_reservee + memoire <= self.budget_memoire)
@@ -0,0 +1,267 @@
+"""
+Service HTTP local de conversion Word (.docx) -> HTML, pour les autres applications.
+
+Usage :
+    python service_conversion.py                        # http://127.0.0.1:8600
+    python service_conversion.py --port 9000 --workers 4
+
+Requêtes :
+    POST /convertir?nom=document.docx   corps : le contenu du .docx (Content-Length obligatoire)
+        Paramètres facultatifs : mode_images, mode_titres, parseur, classe=balise=classes (répétable)
+        Réponse JSON : {"nom": ..., "html": ..., "stats": ...}, comme convertir_word_vers_html_complet
+    GET /etat
+        Réponse JSON : conversions en cours et en attente
+
+Le document reçu est écrit dans un fichier temporaire au fil de la lecture : seul son chemin
+est transmis au pool de processus, démarré au lancement du service. Chaque connexion est servie
+par un thread et reste ouverte entre deux requêtes (HTTP/1.1 keep-alive) ; le planificateur
+limite les conversions simultanées et la file d'attente comme dans l'interface Streamlit.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, wait
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from conversion_word import (
+    MODES_IMAGES, MODES_TITRES, PARSEURS_HTML, convertir_word_vers_html_complet, lire_classes_cli
+)
+from planificateur_conversion import DocumentTropVolumineux, FileConversionPleine, PlanificateurConversion
+
+logger = logging.getLogger(__name__)
+
+# Taille des blocs lus sur la connexion et écrits dans le fichier temporaire
+TAILLE_BLOC_LECTURE = 64 * 1024
+
+# Délai en secondes avant de fermer une connexion keep-alive inactive
+DELAI_CONNEXION_INACTIVE = 30
+
+# Modes d'images acceptés par le service : le mode 'export' écrit les images dans un dossier,
+# que la réponse JSON ne peut pas transmettre
+MODES_IMAGES_SERVICE = tuple(mode for mode in MODES_IMAGES if mode != 'export')
+
+class RequeteInvalide(Exception):
+    """Paramètres de la requête incorrects"""
+
+def prechauffer_processus():
+    """Initialisation d'un processus du pool : importe mammoth et lxml avant la première conversion"""
+    import mammoth  # noqa: F401
+    try:
+        import lxml.etree  # noqa: F401
+    except ImportError:
+        pass
+
+def _tache_prechauffage():
+    return os.getpid()
+
+def convertir_fichier(chemin, nom, options):
+    """Tâche exécutée dans un processus du pool : convertit le document écrit dans chemin"""
+    with open(chemin, 'rb') as fichier:
+        fichier_word_bytes = fichier.read()
+    return convertir_word_vers_html_complet(fichier_word_bytes, nom, **options)
+
+def lire_options(parametres):
+    """Convertit les paramètres de l'URL en options de convertir_word_vers_html_complet"""
+    def valeur(cle, choix, defaut):
+        texte = parametres.get(cle, [defaut])[-1]
+        if texte not in choix:
+            raise RequeteInvalide(f"{cle} invalide: {texte} (attendu: {', '.join(map(str, choix))})")
+        return texte
+
+    try:
+        custom_classes = lire_classes_cli(parametres.get('classe'))
+    except argparse.ArgumentTypeError as e:
+        raise RequeteInvalide(str(e))
+
+    options = {
+        'mode_images': valeur('mode_images', MODES_IMAGES_SERVICE, 'placeholder'),
+        'mode_titres': valeur('mode_titres', MODES_TITRES, 'heuristique'),
+        'custom_classes': custom_classes,
+    }
+    if 'parseur' in parametres:
+        options['parseur'] = valeur('parseur', PARSEURS_HTML, None)
+    return options
+
+class ServiceConversion(ThreadingHTTPServer):
+    """
+    Serveur HTTP multi-thread adossé à un pool de processus préchauffé.
+
+    Les threads ne font que lire les requêtes et attendre les résultats : le travail CPU
+    de la conversion s'exécute dans les processus du pool.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, adresse, nb_workers=None, planificateur=None, dossier_temporaire=None):
+        super().__init__(adresse, RequeteConversion)
+        self.nb_workers = nb_workers or os.cpu_count() or 1
+        self.planificateur = planificateur or PlanificateurConversion(max_conversions=self.nb_workers)
+        self.dossier_temporaire = dossier_temporaire
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.nb_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=prechauffer_processus
+        )
+
+    def prechauffer(self):
+        """Démarre tous les processus du pool avant la première requête"""
+        wait([self.pool.submit(_tache_prechauffage) for _ in range(self.nb_workers)])
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(cancel_futures=True)
+
+class RequeteConversion(BaseHTTPRequestHandler):
+    """Traitement d'une connexion : plusieurs requêtes peuvent se suivre (keep-alive)"""
+
+    protocol_version = 'HTTP/1.1'
+    timeout = DELAI_CONNEXION_INACTIVE
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} - {format % args}")
+
+    def envoyer_json(self, statut, contenu):
+        corps = json.dumps(contenu, ensure_ascii=False).encode('utf-8')
+        self.send_response(statut)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corps)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def envoyer_erreur(self, statut, message, fermer=False):
+        """Répond par une erreur JSON ; fermer quand le corps de la requête n'a pas été lu"""
+        if fermer:
+            self.close_connection = True
+        self.envoyer_json(statut, {'erreur': message})
+
+    def taille_corps(self):
+        try:
+            return int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            return None
+
+    def handle_expect_100(self):
+        # Refuser un document trop volumineux avant que le client n'envoie le corps
+        taille = self.taille_corps()
+        if taille is not None:
+            try:
+                self.server.planificateur.verifier_admission(taille)
+            except DocumentTropVolumineux as e:
+                self.envoyer_erreur(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, str(e), fermer=True)
+                return False
+        return super().handle_expect_100()
+
+    def do_GET(self):
+        if urlsplit(self.path).path == '/etat':
+            self.envoyer_json(HTTPStatus.OK, self.server.planificateur.etat())
+        else:
+            self.envoyer_erreur(HTTPStatus.NOT_FOUND, f"Chemin inconnu: {self.path}")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/convertir':
+            self.envoyer_erreur(HTTPStatus.NOT_FOUND, f"Chemin inconnu: {url.path}", fermer=True)
+            return
+
+        taille = self.taille_corps()
+        if taille is None or taille < 0:
+            self.envoyer_erreur(HTTPStatus.LENGTH_REQUIRED, "En-tête Content-Length requis", fermer=True)
+            return
+
+        parametres = parse_qs(url.query)
+        nom = os.path.basename(parametres.get('nom', ['document.docx'])[-1]) or 'document.docx'
+        try:
+            options = lire_options(parametres)
+            self.server.planificateur.verifier_admission(taille)
+        except RequeteInvalide as e:
+            self.envoyer_erreur(HTTPStatus.BAD_REQUEST, str(e), fermer=True)
+            return
+        except DocumentTropVolumineux as e:
+            self.envoyer_erreur(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, str(e), fermer=True)
+            return
+
+        fichier = tempfile.NamedTemporaryFile(suffix='.docx', dir=self.server.dossier_temporaire, delete=False)
+        try:
+            with fichier:
+                if not self.recevoir_corps(fichier, taille):
+                    return
+            self.convertir(fichier.name, nom, taille, options)
+        finally:
+            os.remove(fichier.name)
+
+    def recevoir_corps(self, fichier, taille):
+        """Écrit le corps de la requête dans fichier bloc par bloc ; False si la connexion est coupée"""
+        restant = taille
+        while restant:
+            bloc = self.rfile.read(min(TAILLE_BLOC_LECTURE, restant))
+            if not bloc:
+                logger.warning(f"Connexion interrompue après {taille - restant} octet(s) sur {taille}")
+                self.close_connection = True
+                return False
+            fichier.write(bloc)
+            restant -= len(bloc)
+        return True
+
+    def convertir(self, chemin, nom, taille, options):
+        service = self.server
+        try:
+            with service.planificateur.creneau(taille):
+                html, stats = service.pool.submit(convertir_fichier, chemin, nom, options).result()
+        except FileConversionPleine as e:
+            self.envoyer_erreur(HTTPStatus.SERVICE_UNAVAILABLE, str(e))
+            return
+        except Exception as e:
+            logger.exception(f"Erreur lors de la conversion de {nom}: {e}")
+            self.envoyer_erreur(HTTPStatus.INTERNAL_SERVER_ERROR, f"Erreur lors de la conversion: {e}")
+            return
+
+        if not html:
+            self.envoyer_erreur(HTTPStatus.UNPROCESSABLE_ENTITY, f"Le document {nom} n'a pas pu être converti")
+            return
+        self.envoyer_json(HTTPStatus.OK, {'nom': nom, 'html': html, 'stats': stats})
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Service HTTP local de conversion Word (.docx) en HTML")
+    parser.add_argument('--hote', default='127.0.0.1', help="Adresse d'écoute (127.0.0.1 par défaut)")
+    parser.add_argument('--port', type=int, default=8600, help="Port d'écoute (8600 par défaut)")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Nombre de processus de conversion (par défaut, le nombre de cœurs)")
+    parser.add_argument('--taille-max-mb', type=int, default=20, help="Taille maximale d'un document en Mo")
+    parser.add_argument('--memoire-max-mb', type=int, default=2048, help="Mémoire estimée totale des conversions en cours en Mo")
+    parser.add_argument('--file-max', type=int, default=10, help="Conversions en attente au plus")
+    parser.add_argument('--dossier-temporaire', default=None, help="Dossier des documents reçus (par défaut, celui du système)")
+    parser.add_argument('-v', '--verbeux', action='store_true', help="Afficher chaque requête")
+    args = parser.parse_args(arguments)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbeux else logging.WARNING,
+        format='%(levelname)s: %(message)s'
+    )
+
+    nb_workers = args.workers or os.cpu_count() or 1
+    planificateur = PlanificateurConversion(
+        max_conversions=nb_workers,
+        budget_memoire=args.memoire_max_mb * 1024 * 1024,
+        taille_max_document=args.taille_max_mb * 1024 * 1024,
+        taille_max_file=args.file_max
+    )
+    service = ServiceConversion((args.hote, args.port), nb_workers, planificateur, args.dossier_temporaire)
+    try:
+        service.prechauffer()
+        print(f"Service de conversion sur http://{args.hote}:{service.server_port} ({nb_workers} processus)")
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
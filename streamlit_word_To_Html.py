@@ -1,11 +1,28 @@
 import streamlit as st
 import tempfile
-import zipfile
 from io import BytesIO
-import xml.etree.ElementTree as ET
-from bs4 import BeautifulSoup
-import re
+import logging
+import threading
+from contextlib import contextmanager
 import os
+from conversion_word import (
+    NB_BLOCS_APERCU,
+    convertir_apercu,
+    convertir_word_vers_html_complet,
+    appliquer_classes_personnalisees,
+    generer_document_html,
+    nom_sortie_html,
+    ecrire_mesures_jsonl
+)
+from cache_conversion import CacheConversion, convertir_avec_cache
+from conversion_incrementale import convertir_incremental
+from conversion_lot import convertir_lot, ecrire_resultats_zip
+from pages_sections import analyser_sections, assembler_pages, ecrire_pages_zip
+from planificateur_conversion import DocumentTropVolumineux, FileConversionPleine, PlanificateurConversion
+from taches_conversion import GestionnaireTaches
+
+# Les messages d'information du convertisseur sont affichés dans l'interface
+logging.getLogger('conversion_word').setLevel(logging.INFO)
 
 # Configuration de la page
 st.set_page_config(
@@ -53,567 +70,460 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def ameliorations_typographiques(soup):
-    """Applique des améliorations typographiques au contenu HTML"""
-    apostrophes_changees = 0
-    mots_tirets_wrapes = 0
-    
-    # Parcourir tous les éléments textuels
-    for element in soup.find_all(string=True):
-        if element.parent.name not in ['script', 'style']:
-            texte_original = str(element)
-            texte_modifie = texte_original
-            
-            # 1. Remplacer les apostrophes droites par des apostrophes courbes
-            apostrophes_avant = texte_modifie.count("'")
-            texte_modifie = texte_modifie.replace("'", "'")
-            apostrophes_changees += apostrophes_avant
-            
-            # 2. Identifier et protéger les mots avec tirets
-            pattern_tirets = r'\b([a-zA-ZÀ-ÿ]+(?:-[a-zA-ZÀ-ÿ]+)+)\b'
-            
-            def wrap_mot_tiret(match):
-                mot = match.group(1)
-                nonlocal mots_tirets_wrapes
-                mots_tirets_wrapes += 1
-                return f'<span class="nowrap">{mot}</span>'
+class CollecteurDiagnostics(logging.Handler):
+    """Collecte les messages du convertisseur émis par le thread de la session courante"""
+    
+    def __init__(self):
+        super().__init__(level=logging.INFO)
+        self.thread = threading.get_ident()
+        self.messages = []
+    
+    def emit(self, record):
+        if record.thread == self.thread:
+            self.messages.append(record)
+
+@contextmanager
+def capturer_diagnostics():
+    """Capture les messages du convertisseur pendant une conversion de cette session"""
+    collecteur = CollecteurDiagnostics()
+    journal = logging.getLogger('conversion_word')
+    journal.addHandler(collecteur)
+    try:
+        yield collecteur.messages
+    finally:
+        journal.removeHandler(collecteur)
+
+def afficher_diagnostics(messages):
+    """Affiche les messages capturés pendant la conversion"""
+    for message in messages:
+        if message.levelno >= logging.ERROR:
+            st.error(message.getMessage())
+        elif message.levelno >= logging.WARNING:
+            st.warning(message.getMessage())
+        else:
+            st.info(message.getMessage())
+
+@st.cache_resource
+def obtenir_cache_conversion():
+    """
+    Cache de conversion partagé par toutes les sessions du processus.
+    
+    Variables d'environnement :
+    - WORD_TO_HTML_CACHE_ENTRIES : nombre de résultats gardés en mémoire (32 par défaut)
+    - WORD_TO_HTML_CACHE_DIR : dossier du cache disque partagé entre processus (désactivé par défaut)
+    - WORD_TO_HTML_CACHE_MAX_MB : taille maximale du cache disque en Mo (500 par défaut)
+    """
+    return CacheConversion(
+        taille_memoire=int(os.environ.get('WORD_TO_HTML_CACHE_ENTRIES', '32')),
+        dossier=os.environ.get('WORD_TO_HTML_CACHE_DIR') or None,
+        taille_max_disque=int(os.environ.get('WORD_TO_HTML_CACHE_MAX_MB', '500')) * 1024 * 1024
+    )
+
+@st.cache_resource
+def obtenir_planificateur():
+    """
+    Planificateur des conversions partagé par toutes les sessions du processus.
+    
+    Variables d'environnement :
+    - WORD_TO_HTML_MAX_CONVERSIONS : conversions simultanées (2 par défaut)
+    - WORD_TO_HTML_MEMOIRE_MAX_MB : mémoire estimée totale des conversions en cours en Mo (2048 par défaut)
+    - WORD_TO_HTML_TAILLE_MAX_MB : taille maximale d'un document en Mo (20 par défaut)
+    - WORD_TO_HTML_FILE_MAX : conversions en attente au plus (10 par défaut)
+    """
+    return PlanificateurConversion(
+        max_conversions=int(os.environ.get('WORD_TO_HTML_MAX_CONVERSIONS', '2')),
+        budget_memoire=int(os.environ.get('WORD_TO_HTML_MEMOIRE_MAX_MB', '2048')) * 1024 * 1024,
+        taille_max_document=int(os.environ.get('WORD_TO_HTML_TAILLE_MAX_MB', '20')) * 1024 * 1024,
+        taille_max_file=int(os.environ.get('WORD_TO_HTML_FILE_MAX', '10'))
+    )
+
+def afficher_position_file(zone):
+    """Fonction de suivi de l'attente : affiche la position dans la file dans la zone donnée"""
+    position_affichee = None
+
+    def suivre_attente(position):
+        nonlocal position_affichee
+        # Rappelée à chaque vérification du planificateur : n'afficher que les changements
+        if position != position_affichee:
+            zone.info(f"⏳ Serveur occupé : votre conversion est en position {position} dans la file d'attente")
+            position_affichee = position
+    return suivre_attente
+
+def afficher_conversion_lot(fichiers, custom_classes, nb_workers, mode_titres='heuristique', exporter_images=False):
+    """
+    Convertit plusieurs fichiers sur un pool de processus et propose l'archive zip des résultats.
+    
+    Avec exporter_images, l'archive contient aussi les images réelles des documents, chacune une seule fois.
+    """
+    st.markdown(f"### 📚 {len(fichiers)} fichier(s) sélectionné(s)")
+    
+    if not st.button("🚀 Convertir le lot en HTML", type="primary", use_container_width=True):
+        return
+    
+    planificateur = obtenir_planificateur()
+    
+    # Les documents trop volumineux sont écartés avant d'être lus
+    echecs = []
+    acceptes = []
+    for fichier in fichiers:
+        try:
+            planificateur.verifier_admission(fichier.size)
+            acceptes.append(fichier)
+        except DocumentTropVolumineux as e:
+            echecs.append(fichier.name)
+            st.write(f"❌ {fichier.name} — {e}")
+    
+    if not acceptes:
+        st.error("❌ Aucun fichier à convertir")
+        return
+    
+    documents = [(fichier.name, fichier.getvalue()) for fichier in acceptes]
+    options = {'custom_classes': custom_classes} if custom_classes else {}
+    if mode_titres != 'heuristique':
+        options['mode_titres'] = mode_titres
+    
+    # Le lot occupe autant de créneaux que de processus, avec la mémoire des plus gros documents
+    nb_processus = min(nb_workers, len(documents))
+    taille_simultanee = sum(sorted((len(donnees) for _, donnees in documents), reverse=True)[:nb_processus])
+    
+    attente = st.empty()
+    archive = tempfile.TemporaryFile()
+    convertis = 0
+    
+    try:
+        with planificateur.creneau(taille_simultanee, nb_processus, afficher_position_file(attente)), \
+                tempfile.TemporaryDirectory() as dossier_images:
+            attente.empty()
+            barre = st.progress(0.0, text="Conversion du lot en cours...")
             
-            texte_modifie = re.sub(pattern_tirets, wrap_mot_tiret, texte_modifie)
+            if exporter_images:
+                options.update(mode_images='export', dossier_images=dossier_images)
             
-            # Remplacer le texte si il y a eu des modifications
-            if texte_modifie != texte_original:
-                if '<span' in texte_modifie:
-                    fragment = BeautifulSoup(texte_modifie, 'html.parser')
-                    element.replace_with(*fragment.contents)
+            # Les HTML sont écrits dans l'archive au fur et à mesure que les processus les terminent
+            resultats = ecrire_resultats_zip(
+                convertir_lot(documents, nb_processus, **options), archive, options.get('dossier_images')
+            )
+            for position, (nom, html, stats) in enumerate(resultats, start=1):
+                if html:
+                    convertis += 1
+                    st.write(f"✅ {nom} — {stats['nb_paragraphes']} paragraphes, {stats['nb_images']} images")
                 else:
-                    element.replace_with(texte_modifie)
+                    echecs.append(nom)
+                    st.write(f"❌ {nom}")
+                barre.progress(position / len(documents), text=f"{position}/{len(documents)} : {nom}")
+    except (DocumentTropVolumineux, FileConversionPleine) as e:
+        attente.empty()
+        st.warning(f"⚠️ {e}")
+        return
+    
+    if echecs:
+        st.warning(f"⚠️ {len(echecs)} fichier(s) n'ont pas pu être convertis")
+    st.success(f"✅ {convertis} fichier(s) converti(s)")
     
-    return apostrophes_changees, mots_tirets_wrapes
+    archive.seek(0)
+    st.download_button(
+        label="⬇️ Télécharger l'archive HTML",
+        data=archive,
+        file_name="conversion_lot.zip",
+        mime="application/zip",
+        type="primary",
+        use_container_width=True
+    )
 
-def detecter_et_convertir_titres(soup):
-    """Convertit les <p><strong> en <h2> quand c'est approprié"""
-    titres_convertis = 0
+@st.cache_resource
+def obtenir_cache_segments():
+    """
+    Cache des segments de la reconversion incrémentale, partagé par toutes les sessions.
     
-    for p in soup.find_all('p'):
-        strong_tags = p.find_all('strong')
-        
-        if strong_tags:
-            texte_total = p.get_text().strip()
-            texte_strong = ''.join([s.get_text().strip() for s in strong_tags])
-            
-            if (len(texte_strong) > 0 and 
-                len(texte_total) > 0 and
-                len(texte_strong) / len(texte_total) >= 0.8 and
-                len(texte_total) <= 100 and
-                not texte_total.endswith('.') and
-                not texte_total.endswith(',') and
-                len(texte_total.split()) <= 15):
-                
-                if (not any(mot in texte_total.lower() for mot in ['cliquez', 'voir', 'télécharger', 'lire', 'plus d\'info']) and
-                    not re.search(r'\d+\s*%', texte_total) and
-                    not re.search(r'\$\d+', texte_total)):
-                    
-                    h2 = soup.new_tag('h2')
-                    h2.string = texte_total
-                    p.replace_with(h2)
-                    titres_convertis += 1
-    
-    return titres_convertis
+    Variable d'environnement :
+    - WORD_TO_HTML_CACHE_SEGMENTS : nombre de segments gardés en mémoire (4096 par défaut)
+    Avec WORD_TO_HTML_CACHE_DIR, les segments sont aussi gardés sur disque dans le sous-dossier segments.
+    """
+    dossier = os.environ.get('WORD_TO_HTML_CACHE_DIR')
+    return CacheConversion(
+        taille_memoire=int(os.environ.get('WORD_TO_HTML_CACHE_SEGMENTS', '4096')),
+        dossier=os.path.join(dossier, 'segments') if dossier else None,
+        taille_max_disque=int(os.environ.get('WORD_TO_HTML_CACHE_MAX_MB', '500')) * 1024 * 1024
+    )
 
-def detecter_et_convertir_table_matieres(soup):
+def convertir_et_journaliser(fichier_bytes, nom_fichier, incremental=False, **options):
     """
-    Détecte et convertit les tables de matières en listes avec liens
+    Lance la conversion (incrémentale si demandé) et, si WORD_TO_HTML_MESURES_JSONL est défini,
+    ajoute ses mesures par étape à ce fichier JSON lines (les résultats repris du cache
+    ne sont pas journalisés).
     """
-    toc_convertie = False
+    if incremental:
+        html_resultat, stats = convertir_incremental(fichier_bytes, nom_fichier, obtenir_cache_segments(), **options)
+    else:
+        html_resultat, stats = convertir_word_vers_html_complet(fichier_bytes, nom_fichier, **options)
     
-    # Chercher les titres "Table des matières" (français) et "Table of contents" (anglais)
-    for h2 in soup.find_all('h2'):
-        texte_titre = h2.get_text().lower()
-        
-        if ('table des matières' in texte_titre or 
-            'table of contents' in texte_titre or
-            'table des matieres' in texte_titre):  # Sans accent aussi
-            
-            st.info(f"📋 Table des matières détectée: {h2.get_text()}")
-            
-            # Chercher la liste qui suit ce titre
-            next_element = h2.find_next_sibling()
-            while next_element and next_element.name not in ['ol', 'ul']:
-                next_element = next_element.find_next_sibling()
-            
-            if next_element and next_element.name in ['ol', 'ul']:
-                # Convertir cette liste en table des matières avec liens
-                convertir_liste_en_toc(next_element, soup)
-                toc_convertie = True
-                break
+    chemin_mesures = os.environ.get('WORD_TO_HTML_MESURES_JSONL')
+    if stats and chemin_mesures:
+        ecrire_mesures_jsonl(chemin_mesures, nom_fichier, stats)
     
-    return toc_convertie
+    return html_resultat, stats
+
+def afficher_mesures_etapes(etapes):
+    """Affiche le tableau des mesures de chaque étape de la conversion"""
+    st.markdown("### ⏱️ Mesures par étape")
+    lignes = []
+    for mesure in etapes:
+        lignes.append({
+            'Étape': mesure['etape'],
+            'Durée (ms)': round(mesure['duree'] * 1000, 1),
+            'CPU (ms)': round(mesure['cpu'] * 1000, 1),
+            'Pic mémoire (Ko)': round(mesure['memoire_pic'] / 1024, 1) if mesure['memoire_pic'] is not None else '—'
+        })
+    st.table(lignes)
 
-def convertir_liste_en_toc(liste_element, soup):
+@st.cache_data(max_entries=4, show_spinner="Découpage en pages...")
+def preparer_pages_sections(html_resultat, nom_fichier, document_complet):
     """
-    Convertit une liste ordinaire en table des matières avec liens et numérotation
+    Découpe le résultat en sections une seule fois par résultat affiché.
+    
+    Returns:
+        tuple: (liste des sections (titre, HTML) pour l'aperçu, archive zip des pages en bytes)
     """
-    def extraire_texte_propre(li):
-        """Extrait le texte d'un élément li en excluant les sous-listes"""
-        texte = ""
-        for content in li.contents:
-            if hasattr(content, 'name'):
-                if content.name not in ['ol', 'ul']:
-                    if hasattr(content, 'get_text'):
-                        texte += content.get_text()
-                    else:
-                        texte += str(content)
-            else:
-                texte += str(content)
-        
-        # Nettoyer le texte
-        texte = texte.strip()
-        texte = re.sub(r'^\d+\.?\s*', '', texte)  # Supprimer numérotation existante
-        texte = re.sub(r'^\d+\.\d+\.?\s*', '', texte)
-        texte = re.sub(r'^\d+\.\d+\.\d+\.?\s*', '', texte)
-        texte = re.sub(r'\s+', ' ', texte)  # Normaliser les espaces
-        
-        return texte.strip()
+    sections, index = analyser_sections(html_resultat, nom_fichier)
+    archive = BytesIO()
+    ecrire_pages_zip(assembler_pages(sections, index, nom_fichier, document_complet), archive)
+    return [(section.titre, section.contenu()) for section in sections], archive.getvalue()
+
+@st.fragment
+def afficher_sections(sections):
+    """Aperçu d'une section à la fois : changer de section ne réexécute que ce fragment"""
+    position = st.selectbox(
+        "Section",
+        range(len(sections)),
+        format_func=lambda position: f"{position + 1}. {sections[position][0][:80]}"
+    )
+    titre, contenu = sections[position]
     
-    def traiter_niveau(items, niveau=1, numero_parent=""):
-        """Traite récursivement chaque niveau de la liste"""
-        for index, li in enumerate(items):
-            numero_actuel = f"{numero_parent}{index + 1}" if numero_parent else str(index + 1)
-            
-            # Extraire le texte propre
-            texte = extraire_texte_propre(li)
-            
-            if texte:
-                # Trouver les sous-listes dans l'élément original
-                sous_listes = li.find_all(['ol', 'ul'], recursive=False)
-                
-                # Vider l'élément li
-                li.clear()
-                
-                # Créer le nouveau lien
-                lien = soup.new_tag('a', href=f"#{numero_actuel}")
-                lien.string = f"{numero_actuel}.&nbsp;{texte}"
-                li.append(lien)
-                
-                # Traiter les sous-listes
-                if sous_listes:
-                    nouvelle_sous_liste = soup.new_tag('ul')
-                    sous_items = sous_listes[0].find_all('li', recursive=False)
-                    
-                    for sous_index, sous_li in enumerate(sous_items):
-                        sous_numero = f"{numero_actuel}.{sous_index + 1}"
-                        sous_texte = extraire_texte_propre(sous_li)
-                        
-                        if sous_texte:
-                            nouveau_sous_li = soup.new_tag('li')
-                            sous_lien = soup.new_tag('a', href=f"#{sous_numero}")
-                            sous_lien.string = f"{sous_numero}&nbsp;{sous_texte}"
-                            nouveau_sous_li.append(sous_lien)
-                            
-                            # Gérer le troisième niveau
-                            sous_sous_listes = sous_li.find_all(['ol', 'ul'], recursive=False)
-                            if sous_sous_listes:
-                                sous_sous_liste = soup.new_tag('ul')
-                                sous_sous_items = sous_sous_listes[0].find_all('li', recursive=False)
-                                
-                                for sss_index, sss_li in enumerate(sous_sous_items):
-                                    sss_numero = f"{sous_numero}.{sss_index + 1}"
-                                    sss_texte = extraire_texte_propre(sss_li)
-                                    
-                                    if sss_texte:
-                                        nouveau_sss_li = soup.new_tag('li')
-                                        sss_lien = soup.new_tag('a', href=f"#{sss_numero}")
-                                        sss_lien.string = f"{sss_numero}&nbsp;{sss_texte}"
-                                        nouveau_sss_li.append(sss_lien)
-                                        sous_sous_liste.append(nouveau_sss_li)
-                                
-                                if sous_sous_liste.contents:
-                                    nouveau_sous_li.append(sous_sous_liste)
-                            
-                            nouvelle_sous_liste.append(nouveau_sous_li)
-                    
-                    if nouvelle_sous_liste.contents:
-                        li.append(nouvelle_sous_liste)
-    
-    # Convertir ol en ul
-    if liste_element.name == 'ol':
-        liste_element.name = 'ul'
-    
-    # Traiter tous les éléments de premier niveau
-    items_premier_niveau = liste_element.find_all('li', recursive=False)
-    traiter_niveau(items_premier_niveau)
+    with st.expander("Voir le code HTML de la section", expanded=False):
+        st.code(contenu, language='html')
+    
+    st.components.v1.html(
+        f"<div style='font-family: Georgia; line-height: 1.6; padding: 20px;'>{contenu}</div>",
+        height=600,
+        scrolling=True
+    )
 
-def analyser_structure_document_bytes(fichier_word_bytes):
-    """Analyse la structure complète du document Word pour préserver l'ordre exact"""
-    elements_document = []
+def afficher_resultat(html_resultat, stats, nom_fichier, custom_classes, afficher_stats, afficher_mesures, document_complet,
+                      pages_sections=False):
+    """
+    Affiche le résultat d'une conversion : statistiques, code, téléchargement et aperçu.
     
-    try:
-        with zipfile.ZipFile(BytesIO(fichier_word_bytes), 'r') as docx_zip:
-            document_xml = docx_zip.read('word/document.xml')
-            root = ET.fromstring(document_xml)
-            
-            namespaces = {
-                'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
-                'wp': 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing',
-                'pic': 'http://schemas.openxmlformats.org/drawingml/2006/picture',
-                'a': 'http://schemas.openxmlformats.org/drawingml/2006/main'
-            }
-            
-            paragraphes = root.findall('.//w:p', namespaces)
-            
-            for i, para in enumerate(paragraphes):
-                texte_runs = para.findall('.//w:t', namespaces)
-                texte_paragraphe = ''.join([t.text or '' for t in texte_runs])
-                
-                drawings = para.findall('.//w:drawing', namespaces)
-                objects = para.findall('.//w:object', namespaces)
-                
-                has_image = len(drawings) > 0 or len(objects) > 0
-                
-                elements_document.append({
-                    'type': 'paragraphe',
-                    'index': i,
-                    'texte': texte_paragraphe.strip(),
-                    'has_image': has_image,
-                    'nb_images': len(drawings) + len(objects)
-                })
-            
-            return elements_document
-            
-    except Exception as e:
-        st.error(f"Erreur lors de l'analyse XML: {e}")
-        return []
+    Avec pages_sections, le résultat est aussi proposé en pages par section (<h2>) et
+    l'aperçu n'envoie au navigateur qu'une section à la fois.
+    """
+    # Appliquer les classes personnalisées si nécessaire
+    if custom_classes:
+        html_resultat = appliquer_classes_personnalisees(html_resultat, custom_classes)
+    
+    # Section des résultats
+    st.markdown('<div class="result-section">', unsafe_allow_html=True)
+    st.success("✅ Conversion réussie!")
+    
+    # Statistiques
+    if afficher_stats:
+        st.markdown("### 📊 Statistiques de conversion")
+        col1, col2, col3, col4, col5, col6 = st.columns(6)
+        with col1:
+            st.metric("🖼️ Images", stats['nb_images'])
+        with col2:
+            st.metric("📑 Titres H2", stats['titres_convertis'])
+        with col3:
+            st.metric("🔗 Mots protégés", stats['mots_wrapes'])
+        with col4:
+            st.metric("✏️ Apostrophes", stats['apostrophes_changees'])
+        with col5:
+            st.metric("📋 Table matières", "✅" if stats['toc_convertie'] else "❌")
+        with col6:
+            st.metric("📝 Paragraphes", stats['nb_paragraphes'])
+    
+        # Ajouter des statistiques sur les classes personnalisées
+        if custom_classes:
+            st.markdown("### 🎨 Classes CSS personnalisées appliquées")
+            classes_cols = st.columns(len(custom_classes))
+            for i, (tag, classe) in enumerate(custom_classes.items()):
+                with classes_cols[i]:
+                    st.metric(f"Tag <{tag}>", classe)
+    
+    if afficher_mesures and stats.get('etapes'):
+        afficher_mesures_etapes(stats['etapes'])
+    
+    if pages_sections:
+        sections, archive_pages = preparer_pages_sections(html_resultat, nom_fichier, document_complet)
+    else:
+        # Prévisualisation
+        st.markdown("### 👁️ Prévisualisation")
+        with st.expander("Voir le code HTML généré", expanded=False):
+            st.code(html_resultat, language='html')
+    
+    # Téléchargement
+    nom_sortie = nom_sortie_html(nom_fichier)
+    
+    if document_complet:
+        donnees_sortie = generer_document_html(html_resultat, nom_fichier)
+    else:
+        donnees_sortie = html_resultat
+    
+    st.download_button(
+        label="⬇️ Télécharger le fichier HTML",
+        data=donnees_sortie,
+        file_name=nom_sortie,
+        mime="text/html",
+        type="primary",
+        use_container_width=True
+    )
+    
+    if pages_sections:
+        st.download_button(
+            label=f"⬇️ Télécharger les {len(sections)} pages et l'index (zip)",
+            data=archive_pages,
+            file_name=nom_sortie.replace('.html', '_pages.zip'),
+            mime="application/zip",
+            use_container_width=True
+        )
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    if pages_sections:
+        st.markdown(f"### 🌐 Aperçu par section ({len(sections)} sections)")
+        afficher_sections(sections)
+        return
+    
+    # Aperçu
+    st.markdown("### 🌐 Aperçu du rendu")
+    st.components.v1.html(
+        f"<div style='font-family: Georgia; line-height: 1.6; padding: 20px;'>{html_resultat}</div>", 
+        height=600, 
+        scrolling=True
+    )
 
-def nettoyer_images_dans_html(html_content):
-    """Remplace toutes les images avec des données longues par l'image sample"""
-    placeholder_path = "https://picsum.photos/800/600"
-    pattern_img_longue = r'<img[^>]*src="data:image/[^"]{100,}"[^>]*/?>'
-    images_longues = re.findall(pattern_img_longue, html_content)
+@st.cache_resource
+def obtenir_gestionnaire_taches():
+    """
+    Registre des conversions en arrière-plan partagé par toutes les sessions du processus.
     
-    counter = [1]
+    Variable d'environnement :
+    - WORD_TO_HTML_TACHES_CONSERVATION_S : durée de conservation d'un résultat non consulté en secondes (3600 par défaut)
+    """
+    return GestionnaireTaches(
+        duree_conservation=int(os.environ.get('WORD_TO_HTML_TACHES_CONSERVATION_S', '3600'))
+    )
+
+# Libellés des étapes de la conversion affichés dans la barre de progression
+LIBELLES_ETAPES = {
+    'analyse_xml': "Analyse de la structure du document",
+    'mammoth': "Conversion Word → HTML",
+    'nettoyage_images': "Remplacement des images",
+    'analyse_html': "Analyse du HTML",
+    'titres': "Détection des titres",
+    'typographie': "Améliorations typographiques",
+    'table_matieres': "Table des matières",
+    'recuperation_images': "Récupération des images manquantes",
+    'nettoyage': "Nettoyage du HTML",
+    'tableaux': "Traitement des tableaux",
+    'serialisation': "Génération du HTML",
+    'decoupage': "Découpage du document en segments",
+    'reconstruction': "Préparation des segments modifiés",
+    'assemblage': "Assemblage des segments",
+}
+
+def lancer_conversion(fichier_bytes, nom_fichier, cle_document, mesurer_memoire, incremental=False,
+                      mode_titres='heuristique'):
+    """
+    Lance la conversion en arrière-plan : elle attend un créneau du planificateur
+    (sauf si le résultat est en cache) et signale chaque étape à sa tâche.
+    """
+    planificateur = obtenir_planificateur()
+    cache = obtenir_cache_conversion()
+    options = {'mesurer_memoire': mesurer_memoire}
+    if incremental:
+        options['incremental'] = True
+    if mode_titres != 'heuristique':
+        options['mode_titres'] = mode_titres
     
-    def remplacer_image(match):
-        img_tag = f'<img src="{placeholder_path}" alt="Image {counter[0]}" class="img-responsive"  />'
-        counter[0] += 1
-        return img_tag
+    def executer(tache):
+        def convertir(fichier_bytes, nom_fichier, **options):
+            with planificateur.creneau(len(fichier_bytes), suivre_attente=tache.suivre_attente):
+                return convertir_et_journaliser(fichier_bytes, nom_fichier, suivre_etape=tache.suivre_etape, **options)
+        
+        try:
+            with capturer_diagnostics() as messages:
+                tache.messages = messages
+                return convertir_avec_cache(cache, convertir, fichier_bytes, nom_fichier, **options)
+        except FileConversionPleine as e:
+            tache.erreur = str(e)
+            return None, None
     
-    html_nettoye = re.sub(pattern_img_longue, remplacer_image, html_content)
-    return html_nettoye, len(images_longues)
+    return obtenir_gestionnaire_taches().lancer(executer, nom_fichier, cle_document)
 
-def convertir_word_vers_html_complet(fichier_word_bytes, nom_fichier):
-    """Convertit un fichier Word en HTML avec toutes les fonctionnalités"""
-    try:
-        import mammoth
-        
-        structure_originale = analyser_structure_document_bytes(fichier_word_bytes)
-        
-        with BytesIO(fichier_word_bytes) as docx_file:
-            result = mammoth.convert_to_html(docx_file)
-            html = result.value
-        
-        html_nettoye, nb_images_remplacees = nettoyer_images_dans_html(html)
-        soup = BeautifulSoup(html_nettoye, 'html.parser')
-        
-        # ÉTAPE 1 : Détecter et convertir les titres
-        titres_convertis = detecter_et_convertir_titres(soup)
-        
-        # ÉTAPE 2 : Améliorations typographiques
-        apostrophes_changees, mots_tirets_wrapes = ameliorations_typographiques(soup)
-        
-        # NOUVELLE ÉTAPE 3 : Conversion des tables de matières
-        toc_convertie = detecter_et_convertir_table_matieres(soup)
-        
-        # Gestion des images manquantes
-        images_html = soup.find_all('img')
-        images_attendues = sum(elem['nb_images'] for elem in structure_originale if elem['has_image'])
-        
-        if len(images_html) < images_attendues:
-            paragraphes_html = soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-            placeholder_path = "https://picsum.photos/800/600"
-            
-            images_ajoutees = len(images_html)
-            for elem_xml in structure_originale:
-                if elem_xml['has_image'] and elem_xml['texte'] and len(elem_xml['texte']) > 10:
-                    for para_html in paragraphes_html:
-                        texte_html = para_html.get_text().strip()
-                        
-                        if texte_html and len(texte_html) > 10:
-                            if any(mot in texte_html.lower() for mot in elem_xml['texte'][:50].lower().split() if len(mot) > 3):
-                                if not para_html.find_next_sibling('img'):
-                                    for _ in range(elem_xml['nb_images']):
-                                        if images_ajoutees < images_attendues:
-                                            img_tag = soup.new_tag('img', 
-                                                                 src=placeholder_path, 
-                                                                 alt=f'Image {images_ajoutees + 1}',
-                                                                 class_='img-responsive',
-                                                                 style='')
-                                            para_html.insert_after(img_tag)
-                                            images_ajoutees += 1
-                                break
-        
-        # Nettoyage final
-        for p in soup.find_all('p'):
-            if not p.get_text(strip=True) and not p.find('img') and not p.find_next_sibling('img'):
-                p.decompose()
-        
-        for div in soup.find_all('div'):
-            div.replace_with_children()
-        
-        for tag in soup.find_all(True):
-            if tag.name not in ['img', 'h2', 'span', 'a', 'ul', 'li']:  # Préserver les liens et listes
-                if tag.has_attr('style'):
-                    del tag['style']
-                for attr in ['class', 'id', 'name']:
-                    if tag.has_attr(attr):
-                        del tag[attr]
-            elif tag.name == 'span':
-                if tag.get('class') != ['nowrap']:
-                    tag.attrs = {}
-                    if 'nowrap' in str(tag):
-                        tag['class'] = 'nowrap'
-        
-        for ins in soup.find_all('ins'):
-            ins.replace_with(ins.text)
-        
-        for span in soup.find_all('span'):
-            if not span.get('class') or 'nowrap' not in span.get('class', []):
-                span.replace_with(span.text)
-        
-# Traitement des tableaux avec récupération du titre
-        for table in soup.find_all('table'):
-            table['class'] = 'table table-bordered'
-            
-            # Chercher le titre dans les éléments précédents
-            titre_tableau = None
-            current = table.previous_sibling
-            attempts = 0
-            
-            while current and attempts < 5:
-                if hasattr(current, 'get_text'):
-                    texte = current.get_text().strip()
-                    if texte and ('table' in texte.lower() or 'tableau' in texte.lower()):
-                        titre_tableau = texte
-                        # Supprimer l'élément titre pour éviter la duplication
-                        current.extract()
-                        break
-                current = current.previous_sibling
-                attempts += 1
-            
-            # Créer ou modifier le caption
-            caption = table.find('caption')
-            if caption:
-                caption.decompose()  # Supprimer l'ancien caption s'il existe
-            
-            caption = soup.new_tag('caption')
-            if titre_tableau:
-                caption.string = titre_tableau  # Pas de parenthèses
-            else:
-                caption.string = "Tableau"
-            table.insert(0, caption)
-            
-            # Récupérer toutes les lignes avant de traiter thead/tbody
-            all_rows = table.find_all('tr')
-            
-            # Supprimer thead et tbody existants
-            existing_thead = table.find('thead')
-            if existing_thead:
-                existing_thead.decompose()
-            existing_tbody = table.find('tbody')
-            if existing_tbody:
-                existing_tbody.decompose()
-            
-            # Créer nouveau thead avec la première ligne
-            if all_rows:
-                thead = soup.new_tag('thead')
-                thead['class'] = 'well'
-                
-                # Prendre la première ligne pour le header
-                first_row = all_rows[0]
-                header_row = soup.new_tag('tr')
-                
-                # Convertir toutes les cellules de la première ligne en th
-                for cell in first_row.find_all(['td', 'th']):
-                    th = soup.new_tag('th')
-                    th['scope'] = 'col'
-                    th.string = cell.get_text().strip()
-                    header_row.append(th)
-                
-                thead.append(header_row)
-                table.append(thead)
-                
-                # Supprimer la première ligne de all_rows
-                first_row.decompose()
-                
-                # Créer tbody avec les lignes restantes
-                tbody = soup.new_tag('tbody')
-                
-                # Traiter les lignes restantes (sauf la première qui est maintenant dans thead)
-                for tr in all_rows[1:]:
-                    # S'assurer que la première cellule a scope="row"
-                    cells = tr.find_all(['td', 'th'])
-                    if cells:
-                        first_cell = cells[0]
-                        if first_cell.name == 'th':
-                            # Convertir th en td
-                            td = soup.new_tag('td')
-                            td['scope'] = 'row'
-                            td.extend(first_cell.contents)
-                            first_cell.replace_with(td)
-                        else:
-                            first_cell['scope'] = 'row'
-                        
-                        # Convertir les autres th en td dans le tbody
-                        for cell in cells[1:]:
-                            if cell.name == 'th':
-                                td = soup.new_tag('td')
-                                td.extend(cell.contents)
-                                cell.replace_with(td)
-                    
-                    tbody.append(tr)
-                
-                table.append(tbody)
-            
-            # Envelopper le tableau dans div.table-responsive
-            responsive_div = soup.new_tag('div')
-            responsive_div['class'] = 'table-responsive'
-            table.wrap(responsive_div)
-        
-        # CSS final avec style pour les tables de matières
-        html_final = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <title>{nom_fichier} - Converti</title>
-    <style>
-        body {{ 
-            font-family: Georgia, "Times New Roman", serif; 
-            line-height: 1.6; 
-            max-width: 800px; 
-            margin: 0 auto; 
-            padding: 20px; 
-            color: #333;
-        }}
-        h2 {{ 
-            color: #2c3e50; 
-            font-size: 1.5em; 
-            margin: 25px 0 15px 0; 
-            padding-bottom: 8px; 
-            border-bottom: 2px solid #3498db; 
-            font-family: Arial, sans-serif;
-        }}
-        .sample-img {{ 
-            max-width: 300px; 
-            height: auto; 
-            border: 2px solid #3498db; 
-            border-radius: 5px;
-            display: block; 
-            margin: 15px 0;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-        }}
-        .nowrap {{ 
-            white-space: nowrap; 
-            color: #2c3e50;
-            font-weight: 500;
-        }}
-        strong {{ 
-            font-weight: bold; 
-            color: #2c3e50; 
-        }}
-        p {{ 
-            margin: 12px 0; 
-            text-align: justify;
-        }}
-        /* Styles pour les tables de matières */
-        ul {{ 
-            margin: 10px 0; 
-            padding-left: 20px;
-        }}
-        ul ul {{ 
-            margin: 5px 0; 
-            padding-left: 25px;
-        }}
-        ul ul ul {{ 
-            margin: 3px 0; 
-            padding-left: 25px;
-        }}
-        li {{ 
-            margin: 3px 0; 
-            line-height: 1.4;
-        }}
-        a {{ 
-            color: #2c3e50; 
-            text-decoration: none;
-            border-bottom: 1px dotted #3498db;
-        }}
-        a:hover {{ 
-            color: #3498db; 
-            border-bottom: 1px solid #3498db;
-        }}
-        /* Tables */
-        .table-responsive {{
-            overflow-x: auto;
-            margin: 20px 0;
-        }}
-        .table {{
-            width: 100%;
-            border-collapse: collapse;
-            margin: 10px 0;
-        }}
-        .table-bordered {{
-            border: 1px solid #ddd;
-        }}
-        .table th, .table td {{
-            padding: 8px;
-            text-align: left;
-            border: 1px solid #ddd;
-        }}
-        .table thead {{
-            background-color: #f5f5f5;
-        }}
-        caption {{
-            caption-side: top;
-            text-align: center;
-            font-weight: bold;
-            margin-bottom: 10px;
-            color: #2c3e50;
-            font-size: 1.1em;
-        }}
-        /* Typographie */
-        body {{
-            font-feature-settings: "liga", "kern";
-            text-rendering: optimizeLegibility;
-        }}
-    </style>
-</head>
-<body>
-{soup.body.decode_contents() if soup.body else str(soup)}
-</body>
-</html>"""
-        
-        # Extraire seulement le contenu body pour avoir le HTML final propre
-        soup_final = BeautifulSoup(html_final, 'html.parser')
-        clean_content = ""
-        if soup_final.body:
-            for element in soup_final.body.contents:
-                if hasattr(element, 'name') and element.name:
-                    clean_content += str(element)
-                elif hasattr(element, 'strip') and element.strip():
-                    clean_content += str(element)
-        
-        stats = {
-            'nb_images': html_final.count('<img'),
-            'titres_convertis': titres_convertis,
-            'apostrophes_changees': apostrophes_changees,
-            'mots_wrapes': mots_tirets_wrapes,
-            'toc_convertie': toc_convertie,
-            'nb_paragraphes': len(structure_originale)
-        }
-        
-        return clean_content, stats
-        
-    except Exception as e:
-        st.error(f"Erreur lors de la conversion: {e}")
-        return None, None
+def tache_courante():
+    """Conversion de la session, retrouvée par l'URL si l'utilisateur a quitté la page puis y est revenu"""
+    identifiant = st.session_state.get('tache') or st.query_params.get('tache')
+    if not identifiant:
+        return None
+    
+    tache = obtenir_gestionnaire_taches().obtenir(identifiant)
+    if tache is None:
+        # Résultat expiré ou lien d'un autre processus
+        oublier_tache()
+    return tache
+
+def oublier_tache():
+    st.session_state.pop('tache', None)
+    if 'tache' in st.query_params:
+        del st.query_params['tache']
+
+@st.fragment(run_every=0.5)
+def afficher_progression(identifiant):
+    """Barre de progression rafraîchie jusqu'à la fin de la conversion, puis réaffichage de la page"""
+    tache = obtenir_gestionnaire_taches().obtenir(identifiant)
+    if tache is None or tache.terminee:
+        st.rerun()
+    
+    if tache.etat == 'en_attente':
+        if tache.position_file:
+            st.info(f"⏳ Serveur occupé : votre conversion est en position {tache.position_file} dans la file d'attente")
+        st.progress(0.0, text="En attente d'un créneau de conversion...")
+    else:
+        st.progress(tache.progression, text=f"{LIBELLES_ETAPES.get(tache.etape, tache.etape)}...")
+    
+    st.caption("Vous pouvez quitter cette page et revenir plus tard avec le même lien pour récupérer le résultat.")
+    if st.button("⏹️ Annuler la conversion"):
+        tache.annuler()
+
+def afficher_apercu(html_apercu):
+    """Rendu du début du document, affiché pendant la conversion complète"""
+    st.markdown("### 🌐 Aperçu des premières pages")
+    st.components.v1.html(
+        f"<div style='font-family: Georgia; line-height: 1.6; padding: 20px;'>{html_apercu}</div>",
+        height=600,
+        scrolling=True
+    )
+
+def afficher_tache(tache, custom_classes, afficher_stats, afficher_mesures, document_complet, html_apercu=None,
+                   pages_sections=False):
+    """Affiche la progression d'une conversion en cours (et l'aperçu s'il existe) ou son résultat"""
+    if not tache.terminee:
+        afficher_progression(tache.id)
+        if html_apercu:
+            afficher_apercu(html_apercu)
+        return
+    
+    afficher_diagnostics(tache.messages)
+    
+    if tache.etat == 'annulee':
+        st.warning("⏹️ Conversion annulée")
+    elif tache.etat == 'terminee':
+        afficher_resultat(tache.html, tache.stats, tache.nom_fichier, custom_classes,
+                          afficher_stats, afficher_mesures, document_complet, pages_sections)
+    elif tache.erreur:
+        st.error(f"❌ {tache.erreur}")
+    else:
+        st.error("❌ Échec de la conversion. Vérifiez que votre fichier est un document Word valide.")
 
 # Interface Streamlit
 def main():
@@ -718,6 +628,85 @@ def main():
             help="Montre les détails de la conversion"
         )
         
+        afficher_mesures = st.checkbox(
+            "Afficher les mesures par étape",
+            value=False,
+            help="Temps réel, temps CPU et pic mémoire de chaque étape de la conversion"
+        )
+        
+        mesurer_memoire = st.checkbox(
+            "Mesurer la mémoire",
+            value=False,
+            disabled=not afficher_mesures,
+            help="Mesure le pic mémoire de chaque étape avec tracemalloc (conversion plus lente)"
+        )
+        
+        document_complet = st.checkbox(
+            "Télécharger un document HTML complet",
+            value=False,
+            help="Ajoute l'en-tête et le CSS autour du contenu converti"
+        )
+        
+        pages_sections = st.checkbox(
+            "Pages par section",
+            value=False,
+            help="Découpe le résultat en une page par titre H2 avec un index relié à la table des matières ; "
+                 "l'aperçu affiche une section à la fois (recommandé pour les longs documents)"
+        )
+        
+        reconversion_incrementale = st.checkbox(
+            "Reconversion incrémentale",
+            value=False,
+            help="Ne reconvertit que les passages modifiés depuis une version déjà convertie du document"
+        )
+        
+        titres_styles = st.checkbox(
+            "Titres depuis les styles Word",
+            value=False,
+            help="Reprend les titres des styles Titre 1, Titre 2... du document au lieu de deviner les titres d'après les paragraphes en gras"
+        )
+        mode_titres = 'styles' if titres_styles else 'heuristique'
+        
+        apercu_rapide = st.checkbox(
+            "Aperçu rapide",
+            value=True,
+            help="Affiche le rendu du début du document pendant que la conversion complète continue"
+        )
+        
+        nb_blocs_apercu = st.number_input(
+            "Paragraphes de l'aperçu",
+            min_value=1,
+            value=NB_BLOCS_APERCU,
+            disabled=not apercu_rapide,
+            help="Nombre de paragraphes ou tableaux du début du document convertis pour l'aperçu"
+        )
+        
+        # Conversion de plusieurs fichiers en parallèle
+        st.markdown("---")
+        st.header("📚 Conversion par lot")
+        
+        mode_lot = st.checkbox(
+            "Convertir plusieurs fichiers",
+            value=False,
+            help="Convertit plusieurs documents en parallèle et les regroupe dans une archive zip"
+        )
+        
+        nb_workers = st.number_input(
+            "Processus de conversion",
+            min_value=1,
+            max_value=os.cpu_count() or 1,
+            value=os.cpu_count() or 1,
+            disabled=not mode_lot,
+            help="Nombre de documents convertis en même temps"
+        )
+        
+        exporter_images = st.checkbox(
+            "Exporter les images",
+            value=False,
+            disabled=not mode_lot,
+            help="Ajoute les images réelles des documents dans le dossier images/ de l'archive, au lieu de l'image d'exemple"
+        )
+        
         # Ajout de la section de personnalisation des classes CSS
         st.markdown("---")
         st.header("🎨 Personnalisation CSS")
@@ -767,26 +756,40 @@ def main():
     
     with col1:
         st.markdown("### 📤 Upload your Word file")
-        uploaded_file = st.file_uploader(
-            "Choose a Word document",
-            type=['docx'],
-            help="Glissez-déposez votre fichier .docx ici ou cliquez pour parcourir"
-        )
+        if mode_lot:
+            uploaded_file = None
+            uploaded_files = st.file_uploader(
+                "Choose Word documents",
+                type=['docx'],
+                accept_multiple_files=True,
+                help="Glissez-déposez vos fichiers .docx ici ou cliquez pour parcourir"
+            )
+        else:
+            uploaded_files = []
+            uploaded_file = st.file_uploader(
+                "Choose a Word document",
+                type=['docx'],
+                help="Glissez-déposez votre fichier .docx ici ou cliquez pour parcourir"
+            )
     
     with col2:
         st.markdown("### 📋 Supported formats")
-        st.info("""
+        st.info(f"""
         **Formats acceptés:**
         - .docx (Word 2007+)
-        - Taille max: 200MB
+        - Taille max: {obtenir_planificateur().taille_max_document // (1024 * 1024)}MB
         - Tables de matières auto-détectées
         - Titres de tableaux automatiques
         """)
     
     st.markdown('</div>', unsafe_allow_html=True)
     
+    # Traitement par lot
+    if uploaded_files:
+        afficher_conversion_lot(uploaded_files, custom_classes, nb_workers, mode_titres, exporter_images)
+    
     # Traitement du fichier
-    if uploaded_file is not None:
+    elif uploaded_file is not None:
         # Informations sur le fichier
         st.markdown('<div class="info-box">', unsafe_allow_html=True)
         col1, col2, col3 = st.columns(3)
@@ -798,78 +801,64 @@ def main():
             st.metric("🗂️ Type", uploaded_file.type)
         st.markdown('</div>', unsafe_allow_html=True)
         
+        # Clé du document courant : la conversion lancée pour ce document reste affichée
+        cle_document = (uploaded_file.name, uploaded_file.size, uploaded_file.file_id)
+        
         # Bouton de conversion
         if st.button("🚀 Convertir en HTML", type="primary", use_container_width=True):
-            with st.spinner("Conversion en cours..."):
-                # Lire le fichier
-                fichier_bytes = uploaded_file.getvalue()
+            try:
+                # Refuser un document trop volumineux avant de le lire
+                obtenir_planificateur().verifier_admission(uploaded_file.size)
+            except DocumentTropVolumineux as e:
+                oublier_tache()
+                st.error(f"❌ {e}")
+            else:
+                # Une seule conversion par session : la précédente est abandonnée
+                precedente = tache_courante()
+                if precedente and not precedente.terminee:
+                    precedente.annuler()
                 
-                # Convertir avec votre code complet
-                html_resultat, stats = convertir_word_vers_html_complet(fichier_bytes, uploaded_file.name)
+                fichier_bytes = uploaded_file.getvalue()
                 
-                if html_resultat and stats:
-                    # Appliquer les classes personnalisées si nécessaire
-                    if custom_classes:
-                        html_resultat = appliquer_classes_personnalisees(html_resultat, custom_classes)
-                    
-                    # Section des résultats
-                    st.markdown('<div class="result-section">', unsafe_allow_html=True)
-                    st.success("✅ Conversion réussie!")
-                    
-                    # Statistiques
-                    if afficher_stats:
-                        st.markdown("### 📊 Statistiques de conversion")
-                        col1, col2, col3, col4, col5, col6 = st.columns(6)
-                        with col1:
-                            st.metric("🖼️ Images", stats['nb_images'])
-                        with col2:
-                            st.metric("📑 Titres H2", stats['titres_convertis'])
-                        with col3:
-                            st.metric("🔗 Mots protégés", stats['mots_wrapes'])
-                        with col4:
-                            st.metric("✏️ Apostrophes", stats['apostrophes_changees'])
-                        with col5:
-                            st.metric("📋 Table matières", "✅" if stats['toc_convertie'] else "❌")
-                        with col6:
-                            st.metric("📝 Paragraphes", stats['nb_paragraphes'])
-                        
-                        # Ajouter des statistiques sur les classes personnalisées
-                        if custom_classes:
-                            st.markdown("### 🎨 Classes CSS personnalisées appliquées")
-                            classes_cols = st.columns(len(custom_classes))
-                            for i, (tag, classe) in enumerate(custom_classes.items()):
-                                with classes_cols[i]:
-                                    st.metric(f"Tag <{tag}>", classe)
-                    
-                    # Prévisualisation
-                    st.markdown("### 👁️ Prévisualisation")
-                    with st.expander("Voir le code HTML généré", expanded=False):
-                        st.code(html_resultat, language='html')
-                    
-                    # Téléchargement
-                    nom_sortie = uploaded_file.name.replace('.docx', '_converted.html')
-                    
-                    st.download_button(
-                        label="⬇️ Télécharger le fichier HTML",
-                        data=html_resultat,
-                        file_name=nom_sortie,
-                        mime="text/html",
-                        type="primary",
-                        use_container_width=True
-                    )
-                    
-                    st.markdown('</div>', unsafe_allow_html=True)
-                    
-                    # Aperçu
-                    st.markdown("### 🌐 Aperçu du rendu")
-                    st.components.v1.html(
-                        f"<div style='font-family: Georgia; line-height: 1.6; padding: 20px;'>{html_resultat}</div>", 
-                        height=600, 
-                        scrolling=True
-                    )
+                # Aperçu du début du document, avant de lancer la conversion complète
+                st.session_state.pop('apercu', None)
+                if apercu_rapide:
+                    # L'aperçu occupe un créneau comme toute conversion : il attend son tour quand le serveur est occupé
+                    attente = st.empty()
+                    try:
+                        with obtenir_planificateur().creneau(len(fichier_bytes),
+                                                             suivre_attente=afficher_position_file(attente)):
+                            attente.empty()
+                            html_apercu, stats_apercu = convertir_apercu(fichier_bytes, uploaded_file.name,
+                                                                         nb_blocs_apercu, mode_titres=mode_titres)
+                    except FileConversionPleine as e:
+                        attente.empty()
+                        st.warning(f"⚠️ Aperçu indisponible : {e}")
+                    else:
+                        if html_apercu and stats_apercu['apercu']:
+                            st.session_state['apercu'] = {'cle': cle_document, 'html': html_apercu}
                 
-                else:
-                    st.error("❌ Échec de la conversion. Vérifiez que votre fichier est un document Word valide.")
+                # Convertir avec votre code complet (sans classes personnalisées) en arrière-plan
+                tache = lancer_conversion(fichier_bytes, uploaded_file.name, cle_document, mesurer_memoire,
+                                          reconversion_incrementale, mode_titres)
+                st.session_state['tache'] = tache.id
+                st.query_params['tache'] = tache.id
+        
+        # Conversion de ce document : un changement de classe dans la barre
+        # latérale ne fait que réappliquer les classes au résultat
+        tache = tache_courante()
+        if tache and tache.cle_document == cle_document:
+            apercu = st.session_state.get('apercu')
+            html_apercu = apercu['html'] if apercu and apercu['cle'] == cle_document else None
+            afficher_tache(tache, custom_classes, afficher_stats, afficher_mesures, document_complet, html_apercu,
+                           pages_sections)
+    
+    # Retour sur la page : la conversion lancée avant de la quitter est retrouvée par l'URL
+    elif tache_courante() is not None:
+        tache = tache_courante()
+        st.markdown(f"### 📄 {tache.nom_fichier}")
+        afficher_tache(tache, custom_classes, afficher_stats, afficher_mesures, document_complet,
+                       pages_sections=pages_sections)
     
     else:
         # Instructions quand aucun fichier n'est uploadé
@@ -911,69 +900,5 @@ def main():
             - Styles personnalisés pour tous les éléments
             """)
 
-# Fonction pour appliquer les classes personnalisées au HTML
-def appliquer_classes_personnalisees(html_content, custom_classes):
-    """
-    Applique les classes CSS personnalisées aux balises HTML spécifiées.
-    
-    Args:
-        html_content (str): Le contenu HTML à modifier
-        custom_classes (dict): Dictionnaire des balises et leurs classes à appliquer
-    
-    Returns:
-        str: Le HTML modifié avec les classes appliquées
-    """
-    if not custom_classes:
-        return html_content
-    
-    try:
-        from bs4 import BeautifulSoup
-        
-        # Parser le HTML
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Appliquer les classes à chaque type de balise
-        for tag, class_value in custom_classes.items():
-            # Trouver toutes les balises du type spécifié
-            elements = soup.find_all(tag)
-            
-            for element in elements:
-                # Nettoyer la valeur de classe entrée par l'utilisateur
-                # Supprimer les attributs 'class=' ou class=" s'ils sont inclus
-                cleaned_value = class_value.replace('class=', '').strip()
-                if cleaned_value.startswith('"') and cleaned_value.endswith('"'):
-                    cleaned_value = cleaned_value[1:-1]
-                elif cleaned_value.startswith("'") and cleaned_value.endswith("'"):
-                    cleaned_value = cleaned_value[1:-1]
-                
-                # Diviser en classes individuelles
-                new_classes = cleaned_value.split()
-                
-                # Récupérer les classes existantes
-                existing_classes = element.get('class', [])
-                
-                # Convertir en liste si c'est une chaîne ou None
-                if existing_classes is None:
-                    existing_classes = []
-                elif isinstance(existing_classes, str):
-                    existing_classes = [existing_classes]
-                
-                # Fusionner les classes sans duplicats
-                final_classes = list(existing_classes)
-                for cls in new_classes:
-                    if cls not in final_classes:
-                        final_classes.append(cls)
-                
-                # Appliquer les classes fusionnées
-                element['class'] = final_classes
-        
-        # Convertir le soup modifié en string
-        return str(soup)
-    
-    except Exception as e:
-        # En cas d'erreur, retourner le HTML original
-        print(f"Erreur lors de l'application des classes personnalisées: {e}")
-        return html_content
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""
+Surveillance d'un dossier : convertit en continu les documents Word (.docx) qui y sont déposés.
+
+Usage :
+    python surveillance_dossier.py dossier_partage
+    python surveillance_dossier.py dossier_partage -r -w 4 --mode-titres styles
+    python surveillance_dossier.py dossier_partage --une-fois      # un seul passage, puis arrêt
+
+Chaque document nouveau ou modifié est converti dans <nom>_converted.html, à côté du document,
+dès que sa taille et sa date de modification n'ont pas changé pendant --stabilite secondes
+(le fichier n'est plus en cours d'écriture). Le manifeste .conversion_manifeste.json du dossier
+garde l'empreinte du contenu de chaque document converti : un document dont le contenu,
+les options et la version de la conversion n'ont pas changé n'est pas reconverti, même après
+un redémarrage. Les conversions s'exécutent sur un pool de processus.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cache_conversion import cle_conversion
+from conversion_lot import lister_documents
+from conversion_word import MODES_TITRES, convertir_word_vers_html_complet, nom_sortie_html
+from ecriture_fichiers import ecrire_fichier_atomique
+
+logger = logging.getLogger(__name__)
+
+# Manifeste des documents convertis, écrit à la racine du dossier surveillé
+NOM_MANIFESTE = '.conversion_manifeste.json'
+
+# Secondes entre deux passages sur le dossier
+INTERVALLE_SURVEILLANCE = 2.0
+
+# Secondes sans changement de taille ni de date avant de considérer un fichier comme complet
+DELAI_STABILITE = 3.0
+
+def convertir_et_ecrire(chemin, options):
+    """
+    Tâche exécutée dans un processus du pool : convertit le document et écrit le HTML à côté.
+
+    Returns:
+        dict: Statistiques de la conversion, None si elle a échoué
+    """
+    with open(chemin, 'rb') as fichier:
+        fichier_word_bytes = fichier.read()
+
+    html, stats = convertir_word_vers_html_complet(fichier_word_bytes, os.path.basename(chemin), **options)
+    if not html:
+        return None
+    ecrire_fichier_atomique(nom_sortie_html(chemin), html)
+    return stats
+
+class SurveillanceDossier:
+    """
+    Conversion continue des documents déposés dans un dossier.
+
+    Chaque appel à analyser() parcourt le dossier une fois : il relève les résultats des
+    conversions terminées et lance celles des documents devenus stables dont le contenu
+    diffère du manifeste. Un document modifié pendant sa conversion est repris au passage
+    suivant, puisque sa signature (taille, date de modification) ne correspond plus.
+    """
+
+    def __init__(self, dossier, nb_workers=None, recursif=False, delai_stabilite=DELAI_STABILITE, **options):
+        self.dossier = dossier
+        self.recursif = recursif
+        self.delai_stabilite = delai_stabilite
+        self.options = options
+        self.pool = ProcessPoolExecutor(max_workers=nb_workers, mp_context=multiprocessing.get_context('spawn'))
+
+        self.chemin_manifeste = os.path.join(dossier, NOM_MANIFESTE)
+        self.manifeste = self._lire_manifeste()
+        # Signature observée de chaque document et instant depuis lequel elle n'a pas changé
+        self._observations = {}
+        # Conversions lancées : tâche -> (nom, signature, clé de contenu)
+        self._en_cours = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.fermer()
+
+    def fermer(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    @property
+    def inactive(self):
+        """Aucune conversion en cours et aucun document en attente de stabilité"""
+        return not self._en_cours and not self._observations
+
+    def _lire_manifeste(self):
+        try:
+            with open(self.chemin_manifeste, 'r', encoding='utf-8') as fichier:
+                return json.load(fichier)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Manifeste illisible, tous les documents seront reconvertis: {e}")
+            return {}
+
+    def _ecrire_manifeste(self):
+        try:
+            ecrire_fichier_atomique(self.chemin_manifeste, json.dumps(self.manifeste, ensure_ascii=False, indent=1, sort_keys=True))
+        except OSError as e:
+            logger.error(f"Erreur lors de l'écriture du manifeste: {e}")
+
+    def _a_jour(self, nom, chemin, signature):
+        """Le manifeste a déjà traité ce document avec cette signature, et le HTML existe toujours"""
+        entree = self.manifeste.get(nom)
+        return (entree is not None and entree['signature'] == signature and
+                (entree['echec'] or os.path.exists(nom_sortie_html(chemin))))
+
+    def documents_stables(self, maintenant):
+        """Documents dont la signature n'a pas changé depuis delai_stabilite secondes"""
+        stables = []
+        observes = set()
+        for nom, chemin in lister_documents(self.dossier, self.recursif):
+            try:
+                etat = os.stat(chemin)
+            except OSError:
+                continue
+            signature = [etat.st_size, etat.st_mtime_ns]
+            observes.add(nom)
+
+            if self._a_jour(nom, chemin, signature):
+                self._observations.pop(nom, None)
+                continue
+
+            observation = self._observations.get(nom)
+            if observation is None or observation[0] != signature:
+                self._observations[nom] = (signature, maintenant)
+            elif maintenant - observation[1] >= self.delai_stabilite:
+                stables.append((nom, chemin, signature))
+
+        # Oublier les documents supprimés ou renommés
+        for nom in set(self._observations) - observes:
+            del self._observations[nom]
+        return stables
+
+    def analyser(self, maintenant=None):
+        """
+        Un passage sur le dossier.
+
+        Returns:
+            int: Nombre de conversions lancées
+        """
+        self.relever_conversions()
+        en_cours = {nom for nom, signature, cle in self._en_cours.values()}
+        lancees = 0
+
+        for nom, chemin, signature in self.documents_stables(maintenant or time.monotonic()):
+            if nom in en_cours:
+                continue
+            try:
+                with open(chemin, 'rb') as fichier:
+                    cle = cle_conversion(fichier.read(), self.options)
+            except OSError as e:
+                logger.warning(f"Impossible de lire {nom}: {e}")
+                continue
+
+            del self._observations[nom]
+            entree = self.manifeste.get(nom)
+            if entree and entree['cle'] == cle and self._a_jour(nom, chemin, entree['signature']):
+                # Contenu identique (document copié ou simplement touché) : rien à convertir
+                entree['signature'] = signature
+                self._ecrire_manifeste()
+                continue
+
+            tache = self.pool.submit(convertir_et_ecrire, chemin, self.options)
+            self._en_cours[tache] = (nom, signature, cle)
+            lancees += 1
+        return lancees
+
+    def relever_conversions(self):
+        """Enregistre dans le manifeste le résultat des conversions terminées"""
+        terminees = [tache for tache in self._en_cours if tache.done()]
+        for tache in terminees:
+            nom, signature, cle = self._en_cours.pop(tache)
+            try:
+                stats = tache.result()
+            except Exception as e:
+                logger.error(f"Erreur lors de la conversion de {nom}: {e}")
+                stats = None
+
+            if stats:
+                logger.info(f"{nom} ✅ ({stats['nb_paragraphes']} paragraphes, {stats['nb_images']} images)")
+            else:
+                logger.warning(f"{nom} ❌ conversion échouée")
+            # Un échec est aussi noté, pour ne pas reconvertir le document tant qu'il ne change pas
+            self.manifeste[nom] = {'cle': cle, 'signature': signature, 'echec': not stats}
+
+        if terminees:
+            self._ecrire_manifeste()
+
+    def executer(self, intervalle=INTERVALLE_SURVEILLANCE, une_fois=False):
+        """Surveille le dossier jusqu'à une interruption ou, si une_fois, jusqu'à ce qu'il n'y ait plus rien à faire"""
+        while True:
+            self.analyser()
+            if une_fois and self.inactive:
+                return
+            time.sleep(intervalle)
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Conversion continue des documents Word (.docx) déposés dans un dossier")
+    parser.add_argument('dossier', help="Dossier à surveiller")
+    parser.add_argument('-r', '--recursif', action='store_true', help="Inclure les sous-dossiers")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Nombre de processus (par défaut, le nombre de cœurs)")
+    parser.add_argument('-i', '--intervalle', type=float, default=INTERVALLE_SURVEILLANCE, help="Secondes entre deux passages")
+    parser.add_argument('--stabilite', type=float, default=DELAI_STABILITE,
+                        help="Secondes sans modification avant de convertir un document")
+    parser.add_argument('--mode-images', choices=['placeholder', 'inline'], default='placeholder', help="Gestion des images")
+    parser.add_argument('--mode-titres', choices=MODES_TITRES, default='heuristique',
+                        help="Titres devinés d'après les paragraphes en gras, ou repris des styles de titre Word")
+    parser.add_argument('--une-fois', action='store_true', help="Convertir ce qui doit l'être puis s'arrêter")
+    args = parser.parse_args(arguments)
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s')
+    # Le résultat de chaque conversion reste affiché par la commande
+    logger.setLevel(logging.INFO)
+
+    if not os.path.isdir(args.dossier):
+        parser.error(f"Dossier introuvable: {args.dossier}")
+
+    options = {'mode_images': args.mode_images, 'mode_titres': args.mode_titres}
+    with SurveillanceDossier(args.dossier, args.workers, args.recursif, args.stabilite, **options) as surveillance:
+        try:
+            surveillance.executer(args.intervalle, args.une_fois)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+import uuid
+
+from conversion_word import ETAPES_CONVERSION, ConversionAnnulee
+
+logger = logging.getLogger(__name__)
+
+class TacheConversion:
+    """
+    Conversion exécutée dans un thread en arrière-plan.
+
+    L'état est lu par l'interface à chaque rafraîchissement :
+    'en_attente' (dans la file du planificateur), 'en_cours', 'terminee', 'echouee' ou 'annulee'.
+    L'annulation est prise en compte au début de l'étape suivante de la conversion.
+    """
+
+    def __init__(self, nom_fichier, cle_document=None):
+        self.id = uuid.uuid4().hex
+        self.nom_fichier = nom_fichier
+        self.cle_document = cle_document
+        self.etat = 'en_attente'
+        self.etape = None
+        self.position_file = None
+        self.html = None
+        self.stats = None
+        self.erreur = None
+        self.messages = []
+        self.debut = time.time()
+        self.fin = None
+        self._annulation = threading.Event()
+
+    @property
+    def terminee(self):
+        return self.fin is not None
+
+    @property
+    def progression(self):
+        """Avancement entre 0 et 1, d'après l'étape en cours"""
+        if self.etat == 'terminee':
+            return 1.0
+        if self.etape not in ETAPES_CONVERSION:
+            return 0.0
+        return ETAPES_CONVERSION.index(self.etape) / len(ETAPES_CONVERSION)
+
+    def annuler(self):
+        self._annulation.set()
+
+    def suivre_attente(self, position):
+        """Fonction de suivi de la file du planificateur"""
+        if self._annulation.is_set():
+            raise ConversionAnnulee()
+        self.position_file = position
+
+    def suivre_etape(self, etape):
+        """Fonction de suivi des étapes de la conversion"""
+        if self._annulation.is_set():
+            raise ConversionAnnulee()
+        self.etat = 'en_cours'
+        self.position_file = None
+        self.etape = etape
+
+class GestionnaireTaches:
+    """
+    Registre des conversions en arrière-plan, partagé par toutes les sessions du processus.
+
+    Une tâche reste consultable par son identifiant après la fin de la conversion, pour que
+    l'utilisateur puisse quitter la page et revenir chercher le résultat. Les tâches
+    terminées sont oubliées après duree_conservation secondes ou au-delà de max_terminees.
+    """
+
+    def __init__(self, duree_conservation=3600, max_terminees=100):
+        self.duree_conservation = duree_conservation
+        self.max_terminees = max_terminees
+        self._taches = {}
+        self._verrou = threading.Lock()
+
+    def lancer(self, fonction, nom_fichier, cle_document=None):
+        """
+        Lance fonction(tache) dans un thread et retourne la tâche.
+
+        fonction doit retourner (html, stats), (None, None) en cas d'échec, et transmettre
+        tache.suivre_attente et tache.suivre_etape au planificateur et à la conversion.
+        """
+        tache = TacheConversion(nom_fichier, cle_document)
+        with self._verrou:
+            self._purger()
+            self._taches[tache.id] = tache
+
+        thread = threading.Thread(
+            target=self._executer, args=(fonction, tache),
+            name=f"conversion-{tache.id[:8]}", daemon=True
+        )
+        thread.start()
+        return tache
+
+    def obtenir(self, identifiant):
+        with self._verrou:
+            return self._taches.get(identifiant)
+
+    def _executer(self, fonction, tache):
+        try:
+            tache.html, tache.stats = fonction(tache)
+            tache.etat = 'terminee' if tache.html and tache.stats else 'echouee'
+        except ConversionAnnulee:
+            tache.etat = 'annulee'
+        except Exception as e:
+            logger.exception(f"Erreur lors de la conversion de {tache.nom_fichier}: {e}")
+            tache.erreur = str(e)
+            tache.etat = 'echouee'
+        finally:
+            tache.fin = time.time()
+
+    def _purger(self):
+        """Oublie les tâches terminées trop anciennes ou en surnombre"""
+        limite = time.time() - self.duree_conservation
+        terminees = sorted(
+            (tache.fin, identifiant) for identifiant, tache in self._taches.items() if tache.terminee
+        )
+        en_surnombre = len(terminees) - self.max_terminees
+        for position, (fin, identifiant) in enumerate(terminees):
+            if fin < limite or position < en_surnombre:
+                del self._taches[identifiant]